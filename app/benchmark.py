@@ -0,0 +1,188 @@
+# app/benchmark.py
+
+import json
+import random
+import subprocess
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app.instrumentation import percentiles
+from app.log_schema import SCHEMA_VERSION, ACTION_CODES, TYPE_CODES, decode_log
+
+# Synthetic village for timing the gate: members with 1-4 cars, a staff roster and a year
+# of check-in/check-out pairs whose entry times follow the morning and evening rush.
+# Every seeded plate starts with SEED_PLATE_PREFIX, so a benchmark database is easy to tell
+# apart from a real one.
+SEED_PLATE_PREFIX = "BN"
+BRANDS = ["Toyota", "Honda", "Isuzu", "Mazda", "Nissan", "Ford", "Mitsubishi", "Hyundai"]
+
+# Relative number of entries per hour of the day
+HOUR_WEIGHTS = [1, 1, 1, 1, 2, 4, 10, 18, 20, 12, 7, 6, 8, 7, 6, 8, 12, 20, 18, 10, 6, 4, 2, 1]
+
+# Operations timed by run_benchmarks, in report order
+OPERATIONS = ("get_member_by_plate", "get_last_action", "log_action", "get_logs_by_page", "get_all_members")
+
+
+def _plate(number):
+    return f"{SEED_PLATE_PREFIX}{number:06d}"
+
+
+def seed_dataset(system, members=20000, staff=50, logs=10000000, days=365, guest_share=0.2, batch_size=10000, seed=0, progress=None):
+    """Fill an empty database with a synthetic village and return the number of members, staff and logs written.
+
+    Logs are written straight into their partitions, with presence set from each plate's
+    latest log, so seeding takes minutes rather than the hours log_action would. Run rebuild-rollups
+    afterwards if the reports or log totals are part of what is measured.
+    """
+    rng = random.Random(seed)
+    now = datetime.now()
+
+    staff_documents = [{"_id": ObjectId(), "name": f"Staff {number:03d}"} for number in range(staff)]
+    system.staff_collection.insert_many(staff_documents)
+
+    plates = []  # (plate, owner, house number) of every member car
+    plate_number = 0
+    for first in range(0, members, batch_size):
+        batch = []
+        for number in range(first, min(first + batch_size, members)):
+            name, house_number = f"Member {number:06d}", str(1 + number // 3)
+            cars = []
+            for _ in range(rng.randint(1, 4)):
+                cars.append({"brand": rng.choice(BRANDS), "plate_number": _plate(plate_number)})
+                plates.append((_plate(plate_number), name, house_number))
+                plate_number += 1
+            batch.append({"name": name, "house_number": house_number, "cars": cars, "type": "Member", "updated_at": now})
+        system.members_collection.insert_many(batch, ordered=False)
+    guest_plates = [(_plate(number), f"Guest {number:06d}", str(rng.randint(1, max(1, members // 3))))
+                    for number in range(plate_number, plate_number + max(1, len(plates) // 4))]
+
+    written = 0
+    batch = []
+    latest = {}  # Plate -> its newest log document
+    for _ in range(logs // 2):
+        is_guest = rng.random() < guest_share
+        plate, owner, house_number = rng.choice(guest_plates if is_guest else plates)
+        day = now - timedelta(days=rng.randrange(days))
+        entered_at = day.replace(hour=rng.choices(range(24), HOUR_WEIGHTS)[0], minute=rng.randrange(60), second=rng.randrange(60), microsecond=0)
+        # Guests stay an hour or two, members' cars anything up to a working day
+        exited_at = entered_at + timedelta(minutes=rng.expovariate(1 / (90 if is_guest else 360)))
+        for action, timestamp in (("check-in", entered_at), ("check-out", exited_at)):
+            if timestamp > now:
+                continue  # Still inside
+            document = {
+                "_id": ObjectId(), "v": SCHEMA_VERSION, "p": plate, "o": owner, "h": house_number,
+                "a": ACTION_CODES[action], "ts": timestamp, "t": TYPE_CODES["Guest" if is_guest else "Member"],
+                "s": rng.choice(staff_documents)["_id"],
+            }
+            batch.append(document)
+            if plate not in latest or latest[plate]["ts"] < timestamp:
+                latest[plate] = document
+        if len(batch) >= batch_size:
+            written += _insert_logs(system, batch)
+            batch = []
+            if progress:
+                progress(written)
+    if batch:
+        written += _insert_logs(system, batch)
+        if progress:
+            progress(written)
+
+    system.schema_state_collection.update_one({"_id": "logs"}, {"$set": {"version": SCHEMA_VERSION, "partitioned": True}}, upsert=True)
+    staff_names = {staff_data["_id"]: staff_data["name"] for staff_data in staff_documents}
+    inside = [system._presence_document(decode_log(document, staff_names.get)) for document in latest.values()
+              if document["a"] == ACTION_CODES["check-in"]]
+    system.presence_collection.delete_many({})
+    for first in range(0, len(inside), batch_size):
+        system.presence_collection.insert_many([dict(presence, _id=presence["plate_number"]) for presence in inside[first:first + batch_size]])
+    return {"members": members, "staff": staff, "logs": written}
+
+
+def _insert_logs(system, documents):
+    for collection, group in system.log_partitions.group(documents):
+        collection.insert_many(group, ordered=False)
+    return len(documents)
+
+
+def _time(function, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def run_benchmarks(system, iterations=200, member_list_iterations=5, deep_page_share=0.9, logs_per_page=50, seed=0, operations=OPERATIONS):
+    """Time the System calls behind a gate decision against the seeded data and return the report.
+
+    log_action check-ins and check-outs use plates of their own, so the seeded history is
+    left as it was apart from the logs added.
+    """
+    rng = random.Random(seed)
+    plates = [car["plate_number"] for member_data in system.members_collection.find({}, {"cars.plate_number": 1}).limit(5000)
+              for car in member_data.get("cars", [])]
+    if not plates:
+        raise RuntimeError("No members to benchmark against; seed the database first.")
+    staff = system.staff_collection.find_one() or "Benchmark"
+    log_count = system.get_log_count()
+    # Misses are as common at the gate as hits: every guest is one
+    lookup_plates = [rng.choice(plates) if rng.random() < 0.7 else f"{SEED_PLATE_PREFIX}X{rng.randrange(1000):03d}" for _ in range(iterations)]
+
+    timings = {}
+    if "get_member_by_plate" in operations:
+        lookups = iter(lookup_plates)
+        timings["get_member_by_plate"] = _time(lambda: system.get_member_by_plate(next(lookups)), iterations)
+    if "get_last_action" in operations:
+        lookups = iter(lookup_plates)
+        timings["get_last_action"] = _time(lambda: system.get_last_action(next(lookups)), iterations)
+    if "log_action" in operations:
+        run_id = str(ObjectId())[-6:].upper()  # Short enough to keep the plates valid
+        actions = iter([(f"BL-{run_id}-{number // 2}", "check-in" if number % 2 == 0 else "check-out") for number in range(iterations)])
+
+        def log_action():
+            plate, action = next(actions)
+            system.log_action(plate, "Benchmark", "0", action, datetime.now(), "Guest", staff)
+
+        timings["log_action"] = _time(log_action, iterations)
+    if "get_logs_by_page" in operations:
+        last_page = max(1, log_count // logs_per_page)
+        pages = iter([last_page - rng.randrange(max(1, last_page // 10)) if rng.random() < deep_page_share else 1 + rng.randrange(10)
+                      for _ in range(iterations)])
+        timings["get_logs_by_page"] = _time(lambda: system.get_logs_by_page(next(pages), logs_per_page), iterations)
+    if "get_all_members" in operations:
+        timings["get_all_members"] = _time(system.get_all_members, member_list_iterations)
+
+    return {
+        "commit": git_commit(),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "dataset": {
+            "members": system.members_collection.estimated_document_count(),
+            "staff": system.staff_collection.estimated_document_count(),
+            "logs": log_count,
+        },
+        "operations": {operation: percentiles(timings[operation]) for operation in operations if operation in timings},
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_reports(baseline, current):
+    """Per operation, the change in p50/p95/p99 from a baseline report to the current one, as a ratio."""
+    changes = {}
+    for operation, stats in current["operations"].items():
+        before = baseline["operations"].get(operation)
+        if before:
+            changes[operation] = {key: round(stats[key] / before[key], 3) if before[key] else None for key in ("p50_ms", "p95_ms", "p99_ms")}
+    return changes
+
+
+def write_report(report, path):
+    with open(path, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=2)
@@ -1,6 +1,27 @@
 # app/car.py
 
+import re
+
 class Car:
     def __init__(self, brand, plate_number):
         self.brand = brand
         self.plate_number = plate_number
+
+# Letters (any script), digits, spaces and hyphens, as printed on plates
+PLATE_PATTERN = re.compile(r"^[^\W_](?:[\w -]*[^\W_])?$")
+MAX_PLATE_LENGTH = 15
+
+
+def plate_key(plate_number):
+    """Return the plate in upper case with single spaces, the form plates are stored and looked up in."""
+    return " ".join(str(plate_number).split()).upper()
+
+
+def normalize_plate(plate_number):
+    """Return the plate in upper case with single spaces, or raise ValueError if it cannot be a plate."""
+    plate_number = plate_key(plate_number)
+    if not plate_number:
+        raise ValueError("missing plate number")
+    if len(plate_number) > MAX_PLATE_LENGTH or not PLATE_PATTERN.match(plate_number):
+        raise ValueError(f"invalid plate number {plate_number!r}")
+    return plate_number
@@ -1,11 +1,111 @@
 # app/database.py
 
+import threading
+import time
+from datetime import datetime
+
+import pymongo
 from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from config import config
+
+
+def client_options():
+    """MongoClient keyword arguments built from config/config.py (and its environment overrides)."""
+    write_concern = config.MONGO_WRITE_CONCERN
+    options = {
+        "maxPoolSize": config.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": config.MONGO_MIN_POOL_SIZE,
+        "connectTimeoutMS": config.MONGO_CONNECT_TIMEOUT_MS,
+        "socketTimeoutMS": config.MONGO_SOCKET_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "w": int(write_concern) if str(write_concern).isdigit() else write_concern,
+        "readConcernLevel": config.MONGO_READ_CONCERN,
+        "readPreference": config.MONGO_READ_PREFERENCE,
+        "retryWrites": config.MONGO_RETRY_WRITES,
+        "appname": config.MONGO_APP_NAME,
+    }
+    if config.MONGO_COMPRESSORS:
+        options["compressors"] = config.MONGO_COMPRESSORS
+    return options
+
 
 class Database:
-    def __init__(self, uri="mongodb://localhost:27017/", db_name="village_system"):
-        self.client = MongoClient(uri)
-        self.db = self.client[db_name]
+    """MongoDB client configured from config/config.py.
+
+    The client connects lazily: nothing touches the network until the first operation, so
+    creating it never holds up the window. ConnectionHealth makes that first contact in the
+    background.
+    """
+
+    def __init__(self, uri=None, db_name=None, **options):
+        self.uri = uri or config.MONGO_URI
+        self.client = MongoClient(self.uri, connect=False, **dict(client_options(), **options))
+        self.db = self.client[db_name or config.DATABASE_NAME]
 
     def get_db(self):
         return self.db
+
+    def close(self):
+        self.client.close()
+
+
+class ConnectionHealth(threading.Thread):
+    """Probe MongoDB in the background and keep the live connection state for the UI.
+
+    on_connected(db) runs after the first successful probe, for start-up work such as
+    ensure_indexes that used to hold up the window.
+    """
+
+    def __init__(self, database, interval=5.0, on_connected=None):
+        super().__init__(daemon=True, name="connection-health")
+        self.database = database
+        self.interval = interval
+        self.on_connected = on_connected
+        self.stopping = threading.Event()
+        self.state = "connecting"  # "connecting", "connected" or "unreachable"
+        self.latency_ms = None  # Round trip of the last successful ping
+        self.last_error = None
+        self.checked_at = None
+        self.connected_once = False
+
+    def run(self):
+        while not self.stopping.is_set():
+            self.probe()
+            self.stopping.wait(self.interval)
+
+    def probe(self):
+        started = time.perf_counter()
+        try:
+            with pymongo.timeout(self.database.client.options.server_selection_timeout):
+                self.database.client.admin.command("ping")
+        except PyMongoError as e:
+            self.state = "unreachable"
+            self.last_error = str(e)
+        else:
+            self.latency_ms = round((time.perf_counter() - started) * 1000, 1)
+            self.state = "connected"
+            self.last_error = None
+            if not self.connected_once:
+                self.connected_once = True
+                if self.on_connected:
+                    try:
+                        self.on_connected(self.database.get_db())
+                    except PyMongoError as e:
+                        self.last_error = str(e)
+                        self.connected_once = False  # Try again after the next successful probe
+        self.checked_at = datetime.now()
+
+    def status(self):
+        """One line describing the connection, for a status bar."""
+        if self.state == "connected":
+            return f"Database: connected ({self.latency_ms:g} ms)"
+        if self.state == "unreachable":
+            return "Database: unreachable"
+        return "Database: connecting..."
+
+    def stop(self):
+        self.stopping.set()
+        if self.is_alive():
+            self.join()
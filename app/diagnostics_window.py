@@ -0,0 +1,179 @@
+# app/diagnostics_window.py
+
+import os
+import sys
+import threading
+import time
+
+from PyQt5.QtWidgets import QMainWindow, QTableWidget, QTableWidgetItem, QVBoxLayout, QWidget, QLabel
+from PyQt5.QtCore import QObject, QTimer
+
+# Frames of these files are the detector itself or Qt plumbing, not the handler that blocked
+SKIPPED_FILES = ("instrumentation.py", "diagnostics_window.py", "workers.py")
+
+
+class StallDetector(QObject):
+    """Flag Qt handlers that keep the event loop busy for longer than threshold seconds.
+
+    A timer on the GUI thread stamps a heartbeat; a watchdog thread notices when the stamp
+    is late and looks at the GUI thread's stack to name the handler that is running. The
+    stall is recorded once the event loop is free again, with its full duration.
+    """
+
+    def __init__(self, instrumentation, threshold=0.25, parent=None):
+        super().__init__(parent)
+        self.instrumentation = instrumentation
+        self.threshold = threshold
+        self.gui_thread_id = threading.get_ident()
+        self.heartbeat = time.perf_counter()
+        self.stalled_in = None  # Handler seen running while the current stall went on
+        self.stall_started = None
+        self.lock = threading.Lock()
+        self.timer = QTimer(self)
+        self.timer.setInterval(max(10, int(threshold * 1000 / 4)))
+        self.timer.timeout.connect(self.beat)
+        self.stopping = threading.Event()
+        self.watchdog = threading.Thread(target=self.watch, daemon=True, name="event-loop-watchdog")
+
+    def start(self):
+        self.heartbeat = time.perf_counter()
+        self.timer.start()
+        self.watchdog.start()
+
+    def stop(self):
+        self.timer.stop()
+        self.stopping.set()
+        if self.watchdog.is_alive():
+            self.watchdog.join()
+
+    def beat(self):
+        now = time.perf_counter()
+        with self.lock:
+            stalled_in, stall_started = self.stalled_in, self.stall_started
+            self.stalled_in = self.stall_started = None
+            self.heartbeat = now
+        if stalled_in:
+            handler, location = stalled_in
+            self.instrumentation.record("event-loop", handler, now - stall_started, detail=location)
+
+    def watch(self):
+        while not self.stopping.wait(self.threshold / 4):
+            with self.lock:
+                late = time.perf_counter() - self.heartbeat - self.timer.interval() / 1000
+                if late >= self.threshold and self.stalled_in is None:
+                    self.stalled_in = self.blocking_handler()
+                    self.stall_started = self.heartbeat + self.timer.interval() / 1000
+
+    def blocking_handler(self):
+        """(function, file:line) of the outermost app frame on the GUI thread's stack."""
+        frame = sys._current_frames().get(self.gui_thread_id)
+        handler = ("unknown", None)
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            if os.sep + "app" + os.sep in filename and not filename.endswith(SKIPPED_FILES):
+                handler = (frame.f_code.co_name, f"{os.path.basename(filename)}:{frame.f_lineno}")
+            frame = frame.f_back
+        return handler
+
+
+class DiagnosticsWindow(QMainWindow):
+    """Rolling view of System call latencies, event-loop stalls and the latest slow operations."""
+
+    def __init__(self, system, refresh_interval=1000):
+        super().__init__()
+        self.system = system
+        self.initUI()
+        self.timer = QTimer(self)
+        self.timer.setInterval(refresh_interval)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start()
+        self.refresh()
+
+    def initUI(self):
+        self.setWindowTitle("Diagnostics")
+        self.setGeometry(100, 100, 900, 600)
+
+        self.operations_table = QTableWidget(0, 8, self)
+        self.operations_table.setHorizontalHeaderLabels(["Source", "Operation", "Calls", "Errors", "Documents", "p50 ms", "p99 ms", "Max ms"])
+        self.slow_table = QTableWidget(0, 5, self)
+        self.slow_table.setHorizontalHeaderLabels(["Time", "Source", "Operation", "ms", "Detail"])
+        self.conflicts_table = QTableWidget(0, 5, self)
+        self.conflicts_table.setHorizontalHeaderLabels(["Time", "Action", "Plate", "Owner", "Reason"])
+        self.status_label = QLabel("", self)
+        self.queue_label = QLabel("", self)
+        self.plate_index_label = QLabel("", self)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.queue_label)
+        layout.addWidget(self.plate_index_label)
+        layout.addWidget(QLabel("Operations (percentiles over the latest calls)", self))
+        layout.addWidget(self.operations_table)
+        layout.addWidget(QLabel("Slow operations and event-loop stalls", self))
+        layout.addWidget(self.slow_table)
+        layout.addWidget(QLabel("Offline check-ins and check-outs rejected on reconnect (manage.py offline-conflicts --clear)", self))
+        layout.addWidget(self.conflicts_table)
+        layout.addWidget(self.status_label)
+
+        container = QWidget()
+        container.setLayout(layout)
+        self.setCentralWidget(container)
+
+    def refresh(self):
+        """Redraw the tables from the in-memory stats and the local offline store; nothing here touches MongoDB."""
+        self.show_conflicts()
+        self.show_background_health()
+        stats = self.system.get_instrumentation_stats()
+        if stats is None:
+            self.status_label.setText("Instrumentation is disabled (INSTRUMENTATION in config/config.py).")
+            return
+        operations, slow_operations = stats
+        rows = sorted(operations.items(), key=lambda item: item[1]["total_seconds"], reverse=True)
+        self.operations_table.setRowCount(len(rows))
+        for row, ((source, name), operation) in enumerate(rows):
+            values = [source, name, operation["calls"], operation["errors"], operation["documents"],
+                      operation["p50_ms"], operation["p99_ms"], operation["max_ms"]]
+            for column, value in enumerate(values):
+                self.operations_table.setItem(row, column, QTableWidgetItem("" if value is None else str(value)))
+        self.slow_table.setRowCount(len(slow_operations))
+        for row, entry in enumerate(reversed(slow_operations)):
+            detail = entry["error"] or entry["detail"] or ""
+            values = [entry["at"].strftime("%H:%M:%S"), entry["source"], entry["operation"], entry["ms"], detail]
+            for column, value in enumerate(values):
+                self.slow_table.setItem(row, column, QTableWidgetItem(str(value)))
+        instrumentation = self.system.instrumentation
+        slow_log = f", logged to {instrumentation.slow_log_path}" if instrumentation.slow_log_path else ""
+        self.status_label.setText(f"Calls slower than {instrumentation.slow_threshold * 1000:g} ms are listed as slow{slow_log}.")
+
+    def show_background_health(self):
+        """Summarize the write-behind queue and the plate index, which otherwise fail silently."""
+        queue = self.system.get_log_queue_stats()
+        if queue is None:
+            self.queue_label.setText("Write-behind logging is disabled; logs are written directly.")
+        else:
+            text = f"Write-behind queue: {queue['queue_depth']} entries waiting {queue['flush_lag']:.1f} s, {queue['flushed_total']} flushed"
+            if queue["last_flush_latency"] is not None:
+                text += f", last flush {queue['last_flush_latency'] * 1000:.0f} ms"
+            if queue["last_error"]:
+                text += f", {queue['failed_flushes']} failed passes in a row: {queue['last_error']}"
+            self.queue_label.setText(text)
+        plate_index = self.system.get_plate_index_stats(approx_size=False)
+        if plate_index is None:
+            self.plate_index_label.setText("The plate index is disabled; plates are looked up in MongoDB.")
+        else:
+            synced = f"current as of {plate_index['sync_age']:.1f} s ago" if plate_index["sync_age"] is not None else "not synced yet"
+            complete = "" if plate_index["complete"] else ", incomplete (max_plates reached)"
+            self.plate_index_label.setText(
+                f"Plate index: {plate_index['mode']}, {plate_index['plates']} plates{complete}, {synced}")
+
+    def show_conflicts(self):
+        """List the offline entries that another gate's changes made inconsistent, newest first."""
+        conflicts = self.system.get_offline_conflicts()
+        self.conflicts_table.setRowCount(len(conflicts))
+        for row, (reason, log_data) in enumerate(reversed(conflicts)):
+            values = [log_data["timestamp"].strftime("%Y-%m-%d %H:%M:%S"), log_data["action"], log_data["plate_number"], log_data["owner"], reason]
+            for column, value in enumerate(values):
+                self.conflicts_table.setItem(row, column, QTableWidgetItem(str(value)))
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        super().closeEvent(event)
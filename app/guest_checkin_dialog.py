@@ -2,6 +2,9 @@
 
 from PyQt5.QtWidgets import QDialog, QLabel, QLineEdit, QVBoxLayout, QPushButton, QDateTimeEdit, QMessageBox
 from PyQt5.QtCore import QDateTime
+from app.workers import TaskRunner
+from app.system import GateStateError
+from app.car import normalize_plate
 
 class GuestCheckInDialog(QDialog):
     def __init__(self, plate_number, active_staff, system):
@@ -9,6 +12,8 @@ class GuestCheckInDialog(QDialog):
         self.system = system
         self.plate_number = plate_number
         self.active_staff = active_staff
+        self.runner = TaskRunner(self)  # Runs System calls off the GUI thread
+        self.runner.failed.connect(lambda message: QMessageBox.warning(self, "Database Error", message))
         self.initUI()
 
     def initUI(self):
@@ -47,8 +52,9 @@ class GuestCheckInDialog(QDialog):
         self.staff_input.setReadOnly(True)
 
         # Submit button
-        submit_button = QPushButton("Submit", self)
-        submit_button.clicked.connect(self.submit)
+        self.submit_button = QPushButton("Submit", self)
+        self.submit_button.clicked.connect(self.submit)
+        self.runner.busy_changed.connect(lambda busy: self.submit_button.setEnabled(not busy))
 
         # Layout
         layout = QVBoxLayout()
@@ -66,7 +72,7 @@ class GuestCheckInDialog(QDialog):
         layout.addWidget(self.type_input)
         layout.addWidget(staff_label)
         layout.addWidget(self.staff_input)
-        layout.addWidget(submit_button)
+        layout.addWidget(self.submit_button)
 
         self.setLayout(layout)
 
@@ -83,9 +89,25 @@ class GuestCheckInDialog(QDialog):
         if not owner or not house_number:
             QMessageBox.warning(self, "Input Error", "Please fill in all the required fields.")
             return
+        try:
+            plate_number = normalize_plate(plate_number)
+        except ValueError as e:
+            QMessageBox.warning(self, "Input Error", f"Not a license plate: {e}.")
+            return
 
-        # Log the guest check-in action
-        self.system.log_action(plate_number, owner, house_number, action, timestamp, car_type, staff)
+        # Log the guest check-in action in the background and close once it is stored
+        self.runner.submit(self.system.log_action, plate_number, owner, house_number, action, timestamp, car_type, self.active_staff,
+                           on_result=lambda _: self.finish_submit(plate_number, staff), on_error=self.show_submit_error)
 
+    def finish_submit(self, plate_number, staff):
+        """Confirm the stored check-in and close the dialog."""
         QMessageBox.information(self, "Check-in Complete", f"Guest {plate_number} checked in by {staff}.")
         self.accept()  # Close the dialog
+
+    def show_submit_error(self, error):
+        """Report a failed check-in; close the dialog if another gate already checked the guest in."""
+        if isinstance(error, GateStateError):
+            QMessageBox.warning(self, "Guest Check-in", str(error))
+            self.reject()
+        else:
+            QMessageBox.warning(self, "Database Error", str(error))
@@ -1,17 +1,24 @@
 # app/gui.py
 
 from PyQt5.QtWidgets import QMainWindow, QPushButton, QVBoxLayout, QWidget, QHBoxLayout, QLineEdit, QLabel, QMessageBox
-from app.member_menu import MemberMenu
-from app.staff_menu import StaffMenu
-from app.system import System
+from PyQt5.QtCore import QTimer
+from app.system import System, GateStateError
+from app.car import normalize_plate
 from datetime import datetime
-from app.guest_checkin_dialog import GuestCheckInDialog
-from app.log_table import LogTable
+from app.workers import TaskRunner
 
 class MainMenu(QMainWindow):
-    def __init__(self, system):
+    def __init__(self, system, connection_health=None):
         super().__init__()
         self.system = system
+        self.connection_health = connection_health  # Background probe behind the connection label
+        self.runner = TaskRunner(self)  # Runs System calls off the GUI thread
+        self.runner.busy_changed.connect(self.show_loading)
+        self.runner.failed.connect(self.show_error)
+        # Secondary windows are imported and built the first time they are opened, so the
+        # gate window is up and scanning as soon as possible after a reboot
+        self.member_menu_window = None
+        self.staff_menu_window = None
         self.initUI()
 
     def initUI(self):
@@ -28,9 +35,16 @@ class MainMenu(QMainWindow):
         manage_staff_button = QPushButton("Manage Staff", self)
         manage_staff_button.clicked.connect(self.manage_staff)
 
+        reports_button = QPushButton("Reports", self)
+        reports_button.clicked.connect(self.open_reports)
+
+        diagnostics_button = QPushButton("Diagnostics", self)
+        diagnostics_button.clicked.connect(self.open_diagnostics)
+
         # Create a label and text input for license plate search
         plate_label = QLabel("Enter License Plate:")
         self.plate_input = QLineEdit(self)
+        self.plate_input.returnPressed.connect(self.search_car)
 
         # Create a search button
         search_button = QPushButton("Search", self)
@@ -41,6 +55,8 @@ class MainMenu(QMainWindow):
         button_layout.addWidget(member_button)
         button_layout.addWidget(log_table_button)
         button_layout.addWidget(manage_staff_button)
+        button_layout.addWidget(reports_button)
+        button_layout.addWidget(diagnostics_button)
 
         main_layout = QVBoxLayout()
         main_layout.addLayout(button_layout)
@@ -53,54 +69,84 @@ class MainMenu(QMainWindow):
         container.setLayout(main_layout)
         self.setCentralWidget(container)
 
+        # Live connection state, read from the background probe; nothing here waits on MongoDB
+        self.connection_label = QLabel("", self)
+        self.statusBar().addPermanentWidget(self.connection_label)
+        self.connection_timer = QTimer(self)
+        self.connection_timer.setInterval(1000)
+        self.connection_timer.timeout.connect(self.show_connection_state)
+        self.connection_timer.start()
+        self.show_connection_state()
+
     def open_member_menu(self):
         """Open the Member Menu"""
-        self.member_menu_window = MemberMenu(self.system, self)
-        self.member_menu_window.show()
+        if self.member_menu_window is None:
+            from app.member_menu import MemberMenu
+            self.member_menu_window = MemberMenu(self.system, self)
+        self.member_menu_window.show()  # Reloads the member list
         self.hide()
 
     def open_log_table(self):
         """Open the Log Table window."""
+        from app.log_table import LogTable
         self.log_table_window = LogTable(self.system)  # Create LogTable instance
         self.log_table_window.show()  # Show LogTable window
 
+    def open_reports(self):
+        """Open the gate traffic reports."""
+        from app.reports_window import ReportsWindow
+        self.reports_window = ReportsWindow(self.system)
+        self.reports_window.show()
+
+    def open_diagnostics(self):
+        """Open the latency and slow-operation panel."""
+        from app.diagnostics_window import DiagnosticsWindow
+        self.diagnostics_window = DiagnosticsWindow(self.system)
+        self.diagnostics_window.show()
+
     def manage_staff(self):
         """Open the Staff Menu"""
-        self.staff_menu_window = StaffMenu(self.system, self)
-        self.staff_menu_window.show()
+        if self.staff_menu_window is None:
+            from app.staff_menu import StaffMenu
+            self.staff_menu_window = StaffMenu(self.system, self)
+        self.staff_menu_window.show()  # Reloads the staff list
         self.hide()
 
     def search_car(self):
         """Search for a car by license plate and determine whether to show check-in or check-out for members or non-members."""
-        plate_number = self.plate_input.text()
+        try:
+            plate_number = normalize_plate(self.plate_input.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "Input Error", f"Not a license plate: {e}.")
+            return
 
         # Clear any existing buttons before adding new ones
         self.clear_layout()
 
-        # Check if the car belongs to a member
-        car_data = self.system.get_member_by_plate(plate_number)
+        # Look the plate up in the background; a newer search supersedes this one
+        self.runner.submit(self.system.lookup_plate, plate_number, key="plate_search",
+                           on_result=lambda result: self.show_plate_decision(plate_number, *result))
 
+    def show_plate_decision(self, plate_number, car_data, presence):
+        """Offer check-in or check-out depending on whether the car belongs to a member and whether it is inside."""
         if car_data:
-            # Handle member case: check the last action for the member
-            last_action = self.system.get_last_action(plate_number)
-            if last_action == "check-in":
+            # Handle member case
+            if presence:
                 self.confirm_checkout(plate_number, car_data['name'], car_data['house_number'])
             else:
                 self.confirm_checkin(plate_number, car_data['name'], car_data['house_number'])
         else:
             # Handle non-member (guest) case
-            last_action = self.system.get_last_log_for_guest(plate_number)
-
-            if last_action and last_action["action"] == "Check-in":
-                self.confirm_guest_checkout(last_action)
+            if presence:
+                self.confirm_guest_checkout(presence)
             else:
-                self.register_car()
+                self.register_car(plate_number)
 
-    def confirm_guest_checkout(self, last_log):
+    def confirm_guest_checkout(self, presence):
         """Confirm Check-out action for non-member and clear UI afterward"""
-        plate_number = last_log["plate_number"]
-        owner = last_log["owner"]
-        house_number = last_log["house_number"]
+        plate_number = presence["plate_number"]
+        owner = presence["owner"]
+        house_number = presence["house_number"]
         
         reply = QMessageBox.question(self, 'Confirm Guest Check-out', f"Do you want to check-out guest {plate_number} for {owner}?", QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         if reply == QMessageBox.Yes:
@@ -112,7 +158,7 @@ class MainMenu(QMainWindow):
         """Confirm Check-in action and clear UI afterward"""
         reply = QMessageBox.question(self, 'Confirm Check-in', f"Do you want to check-in {plate_number} for {owner}?", QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         if reply == QMessageBox.Yes:
-            self.check_in_car(plate_number, owner, house_number, "Guest")
+            self.check_in_car(plate_number, owner, house_number, "Member")
         self.clear_layout()
         self.plate_input.clear()  # Clear the search input field
         
@@ -128,29 +174,66 @@ class MainMenu(QMainWindow):
     def check_in_car(self, plate_number, owner, house_number, car_type):
         """Log the check-in action"""
         timestamp = datetime.now()
-        active_staff = self.system.get_active_staff()
-        self.system.log_action(plate_number, owner, house_number, "check-in", timestamp, car_type, active_staff)
-        QMessageBox.information(self, "Check-in", f"{plate_number} checked in by {active_staff}.")
+
+        def check_in():
+            active_staff = self.system.get_active_staff()
+            self.system.log_action(plate_number, owner, house_number, "check-in", timestamp, car_type, active_staff)
+            return active_staff
+
+        self.runner.submit(check_in, on_error=self.show_gate_error, on_result=lambda active_staff: QMessageBox.information(
+            self, "Check-in", f"{plate_number} checked in by {active_staff}."))
 
     def check_out_car(self, plate_number, owner, house_number, car_type):
         """Log the check-out action for the guest"""
         timestamp = datetime.now()
-        active_staff = self.system.get_active_staff()
-        self.system.log_action(plate_number, owner, house_number, "check-out", timestamp, car_type, active_staff)
-        QMessageBox.information(self, "Check-out", f"{plate_number} (Guest) checked out by {active_staff}.")
 
-    def register_car(self):
+        def check_out():
+            active_staff = self.system.get_active_staff()
+            self.system.log_action(plate_number, owner, house_number, "check-out", timestamp, car_type, active_staff)
+            return active_staff
+
+        self.runner.submit(check_out, on_error=self.show_gate_error, on_result=lambda active_staff: QMessageBox.information(
+            self, "Check-out", f"{plate_number} (Guest) checked out by {active_staff}."))
+
+    def register_car(self, plate_number):
         """Open guest registration form for a non-member."""
-        active_staff = self.system.get_active_staff()
-        plate_number = self.plate_input.text()
+        self.runner.submit(self.system.get_active_staff, key="plate_search",
+                           on_result=lambda active_staff: self.open_guest_dialog(plate_number, active_staff))
 
-        # Open the guest check-in dialog
+    def open_guest_dialog(self, plate_number, active_staff):
+        """Show the guest check-in dialog once the active staff member is known."""
+        from app.guest_checkin_dialog import GuestCheckInDialog
         dialog = GuestCheckInDialog(plate_number, active_staff, self.system)
         dialog.exec_()  # Block the main window until the dialog is closed
 
         self.clear_layout()
         self.plate_input.clear()
 
+    def show_loading(self, busy):
+        """Show a loading message while database calls are in flight."""
+        if busy:
+            self.statusBar().showMessage("Loading...")
+        else:
+            self.statusBar().clearMessage()
+
+    def show_connection_state(self):
+        """Show whether MongoDB is reachable and, while it is not, how many check-ins wait to be synced."""
+        text = self.connection_health.status() if self.connection_health else ""
+        if self.system.offline and self.system.offline_store:
+            text = f"Working offline ({self.system.offline_store.pending_log_count()} logs queued)"
+        self.connection_label.setText(text)
+
+    def show_error(self, message):
+        """Report a failed database call."""
+        QMessageBox.warning(self, "Database Error", message)
+
+    def show_gate_error(self, error):
+        """Report a check-in or check-out that another gate already made, or any other failure."""
+        if isinstance(error, GateStateError):
+            QMessageBox.warning(self, "Gate", str(error))
+        else:
+            self.show_error(str(error))
+
     def clear_layout(self):
         """Clear dynamic buttons after check-in/check-out"""
         main_layout = self.centralWidget().layout()
@@ -160,8 +243,3 @@ class MainMenu(QMainWindow):
                 widget = item.widget()
                 if widget:
                     widget.deleteLater()
-                    
-    def open_log_table(self):
-        """Open the Log Table window."""
-        self.log_table_window = LogTable(self.system)
-        self.log_table_window.show() 
@@ -0,0 +1,195 @@
+# app/indexes.py
+
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from app.log_schema import SCHEMA_VERSION
+
+# Indexes matched to the queries issued by System, keyed by collection name
+INDEXES = {
+    "members": [
+        IndexModel([("cars.plate_number", ASCENDING)], name="cars_plate_number"),
+        IndexModel([("name", ASCENDING)], name="name"),
+        IndexModel([("house_number", ASCENDING)], name="house_number"),
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+    ],
+    "member_deletions": [
+        # Tombstones only need to outlive the plate index poll interval
+        IndexModel([("deleted_at", ASCENDING)], name="deleted_at_ttl", expireAfterSeconds=86400),
+    ],
+    "staff": [
+        IndexModel([("name", ASCENDING)], name="name"),
+    ],
+    "logs": [
+        # Compact (version 2) field names, see app/log_schema.py
+        IndexModel([("p", ASCENDING), ("t", ASCENDING), ("ts", DESCENDING)], name="p_t_ts"),
+        IndexModel([("ts", DESCENDING), ("_id", DESCENDING)], name="ts_id"),
+        # Log search: one (field, ts, _id) index per filter field
+        IndexModel([("p", ASCENDING), ("ts", DESCENDING), ("_id", DESCENDING)], name="p_ts_id"),
+        IndexModel([("o", ASCENDING), ("ts", DESCENDING), ("_id", DESCENDING)], name="o_ts_id"),
+        IndexModel([("h", ASCENDING), ("ts", DESCENDING), ("_id", DESCENDING)], name="h_ts_id"),
+        IndexModel([("a", ASCENDING), ("ts", DESCENDING), ("_id", DESCENDING)], name="a_ts_id"),
+        IndexModel([("t", ASCENDING), ("ts", DESCENDING), ("_id", DESCENDING)], name="t_ts_id"),
+        IndexModel([("s", ASCENDING), ("ts", DESCENDING), ("_id", DESCENDING)], name="s_ts_id"),
+        IndexModel([("sn", ASCENDING), ("ts", DESCENDING), ("_id", DESCENDING)], name="sn_ts_id"),
+    ],
+    "presence": [
+        IndexModel([("checked_in_at", DESCENDING)], name="checked_in_at"),
+    ],
+    "traffic_rollups": [
+        # The rollup upserts match on all four fields; reports read a period and dimension in start order
+        IndexModel([("period", ASCENDING), ("dimension", ASCENDING), ("start", ASCENDING), ("key", ASCENDING)],
+                   name="period_dimension_start_key", unique=True),
+    ],
+    "visits": [
+        IndexModel([("plate_number", ASCENDING), ("exited_at", DESCENDING)], name="plate_exited_at"),
+        IndexModel([("house_number", ASCENDING), ("exited_at", DESCENDING)], name="house_exited_at"),
+        IndexModel([("exited_at", DESCENDING)], name="exited_at"),
+    ],
+}
+
+# Indexes on the version 1 log fields, kept until migrate-logs has converted every log
+LEGACY_INDEXES = {
+    "logs": [
+        IndexModel([("plate_number", ASCENDING), ("type", ASCENDING), ("timestamp", DESCENDING)], name="plate_type_timestamp"),
+        IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)], name="timestamp_id"),
+        IndexModel([("plate_number", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="plate_timestamp_id"),
+        IndexModel([("owner", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="owner_timestamp_id"),
+        IndexModel([("house_number", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="house_timestamp_id"),
+        IndexModel([("action", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="action_timestamp_id"),
+        IndexModel([("type", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="type_timestamp_id"),
+        IndexModel([("staff.name", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="staff_name_timestamp_id"),
+        IndexModel([("staff", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="staff_timestamp_id"),
+    ],
+}
+
+# Indexes earlier versions created that are now covered by the ones above
+OBSOLETE_INDEXES = {
+    "logs": ["plate_action_status", "plate_timestamp", "timestamp"],
+    "staff": ["active"],
+}
+
+
+def ensure_indexes(db):
+    """Create every index System relies on and drop superseded ones. Safe to run on each startup."""
+    created = {}
+    for collection_name, models in INDEXES.items():
+        created[collection_name] = db[collection_name].create_indexes(models)
+    obsolete = dict(OBSOLETE_INDEXES)
+    logs_state = db["schema_state"].find_one({"_id": "logs"})
+    if logs_state and logs_state.get("version") == SCHEMA_VERSION:
+        for collection_name, models in LEGACY_INDEXES.items():
+            obsolete[collection_name] = obsolete.get(collection_name, []) + [model.document["name"] for model in models]
+    else:
+        for collection_name, models in LEGACY_INDEXES.items():
+            created[collection_name] += db[collection_name].create_indexes(models)
+    # Every monthly log partition carries the log indexes
+    for collection_name in db.list_collection_names(filter={"name": {"$regex": r"^logs_\d{4}_\d{2}$"}}):
+        created[collection_name] = db[collection_name].create_indexes(INDEXES["logs"])
+    for collection_name, names in obsolete.items():
+        existing = db[collection_name].index_information()
+        for name in names:
+            if name in existing:
+                db[collection_name].drop_index(name)
+    return created
+
+
+def system_queries(system):
+    """Build a cursor for each query shape System sends to MongoDB."""
+    plate = "EXPLAIN-0000"
+    now = datetime.now()
+    queries = [
+        ("get_member_by_plate", system.members_collection.find({"cars.plate_number": plate}).limit(1)),
+        ("get_plate_owners", system.members_collection.find({"cars.plate_number": {"$in": [plate, plate + "-1"]}}, {"name": 1, "cars.plate_number": 1})),
+        ("get_member_by_name", system.members_collection.find({"name": plate}).limit(1)),
+        ("search_members", system.members_collection.find({}, system.MEMBER_LIST_PROJECTION).sort("name", 1).limit(100)),
+        ("search_members next page", system.members_collection.find({"$and": [{"name": {"$gt": plate}}]}, system.MEMBER_LIST_PROJECTION).sort("name", 1).limit(100)),
+        ("plate index poll", system.members_collection.find({"updated_at": {"$gte": now}})),
+        ("plate index deletions poll", system.member_deletions_collection.find({"deleted_at": {"$gte": now}})),
+        ("get_staff_by_name", system.staff_collection.find({"name": plate}).limit(1)),
+        ("get_active_staff", system.gate_state_collection.find({"_id": system.gate_id}).limit(1)),
+        ("get_active_staff staff lookup", system.staff_collection.find({"_id": ObjectId()}).limit(1)),
+        ("get_presence", system.presence_collection.find({"_id": plate}).limit(1)),
+        ("get_vehicles_inside", system.presence_collection.find().sort("checked_in_at", -1)),
+        ("get_traffic_report", system.rollups_collection.find({"period": "day", "dimension": "house", "start": {"$gte": now, "$lt": now}}).sort([("start", 1), ("key", 1)])),
+        ("get_stays by plate", system.visits_collection.find({"plate_number": plate}).sort("exited_at", -1).limit(100)),
+        ("get_stays by house", system.visits_collection.find({"house_number": plate}).sort("exited_at", -1).limit(100)),
+        ("get_stays by time range", system.visits_collection.find({"exited_at": {"$gte": now, "$lte": now}}).sort("exited_at", -1).limit(100)),
+    ]
+    for field, index in system.MEMBER_SEARCH_INDEXES.items():
+        queries.append((f"search_members by {field} prefix", system.members_collection.find(
+            {"$and": [{"name": {"$gt": plate}}, {field: {"$regex": "^EX"}}]}, system.MEMBER_LIST_PROJECTION).sort("name", 1).limit(100).hint(index)))
+    # Log queries run against each monthly partition, and against the unpartitioned logs
+    # once per stored schema version until partition-logs has emptied them
+    log_shapes = [
+        ("get_last_action", {"plate_number": plate}, None, None),
+        ("get_last_log_for_guest", {"plate_number": plate, "type": "Guest"}, None, None),
+        ("get_logs_before", None, (now, ObjectId()), "$lt"),
+        ("get_logs_after", None, (now, ObjectId()), "$gt"),
+        ("search_logs by plate", {"plate_number": plate}, None, None),
+        ("search_logs by plate prefix", {"plate_prefix": plate}, None, None),
+        ("search_logs by owner", {"owner": plate}, None, None),
+        ("search_logs by house", {"house_number": plate}, None, None),
+        ("search_logs by action", {"action": "check-out"}, None, None),
+        ("search_logs by type", {"type": "Guest"}, None, None),
+        ("search_logs by staff", {"staff": plate}, None, None),
+        ("search_logs by time range", {"start": now, "end": now}, None, None),
+        ("get_logs_from_date", {"end": now}, None, None),
+    ]
+    partition = system.log_partitions.collection_for(now)
+    for name, filters, anchor, operator in log_shapes:
+        queries.append((name, system._log_cursor(partition, filters, anchor, operator, 20)))
+    queries.append(("count_logs removed staff check", partition.find({"sn": plate}, {"_id": 1}).limit(1)))
+    for version in system._legacy_log_versions():
+        for name, filters, anchor, operator in log_shapes:
+            queries.append((f"{name} (unpartitioned version {version} logs)", system._log_cursor(system.logs_collection, filters, anchor, operator, 20, version)))
+    return queries
+
+
+def _plan_stages(plan):
+    """Yield every stage name found in an explain() plan tree."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+
+def _full_index_scans(plan):
+    """Yield the index name of every IXSCAN in a plan tree whose leading key is not bounded at all."""
+    if isinstance(plan, dict):
+        if plan.get("stage") == "IXSCAN":
+            bounds = list(plan.get("indexBounds", {}).values())
+            if bounds and bounds[0] in (["[MinKey, MaxKey]"], ["[MaxKey, MinKey]"]):
+                yield plan.get("indexName")
+        for value in plan.values():
+            yield from _full_index_scans(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _full_index_scans(item)
+
+
+# Queries without a filter, which read an index in order and stop at their limit
+UNFILTERED_QUERIES = {"search_members", "get_vehicles_inside"}
+
+
+def check_query_plans(system):
+    """Explain every System query and return the names of those that still scan a whole collection or index.
+
+    Returns (collection scans, full index scans); a filtered query that walks a whole index
+    only looks index-backed.
+    """
+    collection_scans = []
+    full_index_scans = []
+    for name, cursor in system_queries(system):
+        winning_plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        if "COLLSCAN" in set(_plan_stages(winning_plan)):
+            collection_scans.append(name)
+        elif name not in UNFILTERED_QUERIES and any(_full_index_scans(winning_plan)):
+            full_index_scans.append(name)
+    return collection_scans, full_index_scans
@@ -0,0 +1,260 @@
+# app/instrumentation.py
+
+import functools
+import inspect
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# Per-call latency, document counts and errors for System, plus the Qt event-loop stalls
+# reported by app/diagnostics_window.StallDetector. Calls slower than the threshold go to
+# the slow-operation log; the totals are written as a Prometheus textfile for a local
+# node exporter's textfile collector. Both files are written by MetricsWriter, so a slow
+# disk never holds up the calls being measured.
+
+METRIC_PREFIX = "village_gate"
+
+# System methods that are not gate operations and are left unwrapped; ping is the connection probes
+NOT_INSTRUMENTED = {"close", "ping", "add_count_listener", "remove_count_listener", "get_instrumentation_stats",
+                    "get_offline_conflicts", "get_log_queue_stats", "get_plate_index_stats"}
+
+
+def percentiles(samples):
+    """Summarize timings in seconds as milliseconds, with nearest-rank p50/p95/p99."""
+    ordered = sorted(samples)
+
+    def rank(percent):
+        return round(ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)] * 1000, 3)
+
+    return {
+        "n": len(ordered),
+        "p50_ms": rank(50),
+        "p95_ms": rank(95),
+        "p99_ms": rank(99),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def document_count(result):
+    """How many documents a System call returned, or None for results that are not documents."""
+    if result is None:
+        return 0
+    if isinstance(result, dict):
+        return 1
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple):
+        counts = [document_count(item) for item in result]
+        return sum(counts) if None not in counts else None
+    return None
+
+
+class OperationStats:
+    """Totals for one operation since start-up, and its latencies over the rolling window."""
+
+    def __init__(self, window):
+        self.calls = 0
+        self.errors = 0
+        self.documents = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_error = None
+        self.recent = deque(maxlen=window)  # Latest call durations, in seconds
+
+    def snapshot(self):
+        summary = percentiles(self.recent) if self.recent else {}
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "documents": self.documents,
+            "total_seconds": self.total_seconds,
+            "max_ms": round(self.max_seconds * 1000, 3),
+            "p50_ms": summary.get("p50_ms"),
+            "p95_ms": summary.get("p95_ms"),
+            "p99_ms": summary.get("p99_ms"),
+            "last_error": self.last_error,
+        }
+
+
+class Instrumentation:
+    """Thread-safe collector of operation timings, shared by System, the GUI and the metrics writer."""
+
+    def __init__(self, slow_threshold=0.2, slow_log_path=None, window=500, gate_id="main"):
+        self.slow_threshold = slow_threshold  # Seconds after which a call is logged as slow
+        self.slow_log_path = slow_log_path
+        self.gate_id = gate_id
+        self.window = window
+        self.lock = threading.Lock()
+        self.operations = {}  # (source, name) -> OperationStats
+        self.slow_operations = deque(maxlen=200)  # Latest slow calls and stalls, for the diagnostics panel
+        self.slow_lines = deque(maxlen=10000)  # Slow-operation log lines not yet written to slow_log_path
+        self.calls = threading.local()  # depth: instrumented System calls in progress on this thread
+        self.gauge_sources = []  # Functions returning (metric, type, help, value) for the metrics file
+        if slow_log_path and os.path.dirname(slow_log_path):
+            os.makedirs(os.path.dirname(slow_log_path), exist_ok=True)
+
+    def record(self, source, name, seconds, documents=None, error=None, detail=None):
+        """Add one call of source ("system" or "event-loop") operation name that took seconds."""
+        with self.lock:
+            stats = self.operations.get((source, name))
+            if stats is None:
+                stats = self.operations[(source, name)] = OperationStats(self.window)
+            stats.calls += 1
+            stats.total_seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.recent.append(seconds)
+            if documents:
+                stats.documents += documents
+            if error is not None:
+                stats.errors += 1
+                stats.last_error = f"{type(error).__name__}: {error}"
+            if seconds >= self.slow_threshold or source == "event-loop":
+                self._log_slow(source, name, seconds, documents, stats.last_error if error is not None else None, detail)
+
+    def _log_slow(self, source, name, seconds, documents, error, detail):
+        entry = {"at": datetime.now(), "source": source, "operation": name, "ms": round(seconds * 1000, 1),
+                 "documents": documents, "error": error, "detail": detail}
+        self.slow_operations.append(entry)
+        if self.slow_log_path:
+            line = f"{entry['at'].isoformat(timespec='milliseconds')} {source} {name} {entry['ms']} ms"
+            if documents is not None:
+                line += f" documents={documents}"
+            if detail:
+                line += f" at={detail}"
+            if error:
+                line += f" error={error!r}"
+            self.slow_lines.append(line)
+
+    def write_slow_log(self):
+        """Append the buffered slow-operation lines to slow_log_path."""
+        with self.lock:
+            lines = list(self.slow_lines)
+            self.slow_lines.clear()
+        if lines:
+            with open(self.slow_log_path, "a", encoding="utf-8") as slow_log:
+                slow_log.write("\n".join(lines) + "\n")
+
+    def wrap(self, name, function):
+        """Return function recording each call as the System operation name.
+
+        Only the outermost call on a thread is recorded; the System calls it makes itself
+        (lookup_plate calling get_member_by_plate) are part of its time, not operations of their own.
+        """
+        @functools.wraps(function)
+        def instrumented(*args, **kwargs):
+            depth = getattr(self.calls, "depth", 0)
+            if depth:
+                return function(*args, **kwargs)
+            self.calls.depth = 1
+            started = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except Exception as e:
+                self.record("system", name, time.perf_counter() - started, error=e)
+                raise
+            finally:
+                self.calls.depth = 0
+            if inspect.isgenerator(result):
+                return result  # Lazy results (iter_logs) do their work after the call returns
+            self.record("system", name, time.perf_counter() - started, documents=document_count(result))
+            return result
+        return instrumented
+
+    def instrument(self, system):
+        """Wrap every public method of a System instance."""
+        for name, member in inspect.getmembers(type(system), inspect.isfunction):
+            if name.startswith("_") or name.startswith("enable_") or name in NOT_INSTRUMENTED:
+                continue
+            if isinstance(inspect.getattr_static(type(system), name), staticmethod):
+                continue  # Helpers such as log_anchor, called per log rather than per operation
+            setattr(system, name, self.wrap(name, getattr(system, name)))
+
+    def snapshot(self):
+        """Stats of every operation and the latest slow operations, for the diagnostics panel."""
+        with self.lock:
+            operations = {key: stats.snapshot() for key, stats in self.operations.items()}
+            slow_operations = list(self.slow_operations)
+        return operations, slow_operations
+
+    def prometheus_text(self):
+        """Render the totals in the Prometheus text exposition format."""
+        operations, _ = self.snapshot()
+        metrics = [
+            ("operation_calls_total", "counter", "Calls per operation", "calls", 1),
+            ("operation_errors_total", "counter", "Calls that raised, per operation", "errors", 1),
+            ("operation_documents_total", "counter", "Documents returned, per operation", "documents", 1),
+            ("operation_seconds_total", "counter", "Seconds spent, per operation", "total_seconds", 1),
+            ("operation_max_seconds", "gauge", "Slowest call since start-up, per operation", "max_ms", 0.001),
+        ]
+        lines = []
+        for metric, metric_type, help_text, field, scale in metrics:
+            lines.append(f"# HELP {METRIC_PREFIX}_{metric} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{metric} {metric_type}")
+            for (source, name), stats in sorted(operations.items()):
+                lines.append(f"{METRIC_PREFIX}_{metric}{{{self._labels(source, name)}}} {stats[field] * scale:g}")
+        lines.append(f"# HELP {METRIC_PREFIX}_operation_latency_seconds Latency over the latest calls, per operation")
+        lines.append(f"# TYPE {METRIC_PREFIX}_operation_latency_seconds summary")
+        for (source, name), stats in sorted(operations.items()):
+            for quantile, field in (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms")):
+                if stats[field] is not None:
+                    lines.append(f"{METRIC_PREFIX}_operation_latency_seconds{{{self._labels(source, name)},quantile=\"{quantile}\"}} {stats[field] / 1000:g}")
+        for gauge_source in self.gauge_sources:
+            for metric, metric_type, help_text, value in gauge_source():
+                if value is None:
+                    continue
+                lines.append(f"# HELP {METRIC_PREFIX}_{metric} {help_text}")
+                lines.append(f"# TYPE {METRIC_PREFIX}_{metric} {metric_type}")
+                lines.append(f'{METRIC_PREFIX}_{metric}{{gate="{self.gate_id}"}} {float(value):g}')
+        return "\n".join(lines) + "\n"
+
+    def add_gauge_source(self, source):
+        """Add source() -> [(metric, type, help, value)] to the metrics file; a None value is left out."""
+        self.gauge_sources.append(source)
+
+    def _labels(self, source, name):
+        return f'gate="{self.gate_id}",source="{source}",operation="{name}"'
+
+    def write_prometheus(self, path):
+        """Replace the metrics file in one step, so the exporter never reads half of it."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as metrics_file:
+            metrics_file.write(self.prometheus_text())
+        os.replace(path + ".tmp", path)
+
+
+class MetricsWriter(threading.Thread):
+    """Every interval seconds, append the buffered slow operations to their log and, with path, rewrite the Prometheus metrics file."""
+
+    def __init__(self, instrumentation, path=None, interval=15.0):
+        super().__init__(daemon=True, name="metrics-writer")
+        self.instrumentation = instrumentation
+        self.path = path
+        self.interval = interval
+        self.stopping = threading.Event()
+        self.last_error = None
+
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            self.write()
+
+    def write(self):
+        try:
+            if self.instrumentation.slow_log_path:
+                self.instrumentation.write_slow_log()
+            if self.path:
+                self.instrumentation.write_prometheus(self.path)
+            self.last_error = None
+        except OSError as e:
+            self.last_error = str(e)  # Try again on the next pass
+
+    def stop(self):
+        self.stopping.set()
+        if self.is_alive():
+            self.join()
+        self.write()  # Leave the final totals and slow operations behind
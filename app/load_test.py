@@ -0,0 +1,193 @@
+# app/load_test.py
+
+import random
+import threading
+import time
+from datetime import datetime
+
+from pymongo.errors import PyMongoError
+
+from app.benchmark import git_commit
+from app.instrumentation import percentiles
+from app.system import System, GateStateError
+
+# Headless stand-in for several gate terminals sharing one database. Each simulated gate is a
+# thread with its own System, working through its share of an arrival schedule the way a
+# terminal does: look the plate up, ask for its last action, then log the opposite one.
+# pymongo releases the GIL while it waits on the server, so threads are enough to keep the
+# database as busy as separate terminals would.
+
+# Relative arrival rate per hour of the day, the same rush-hour shape the benchmark seeds
+HOUR_WEIGHTS = [1, 1, 1, 1, 2, 4, 10, 18, 20, 12, 7, 6, 8, 7, 6, 8, 12, 20, 18, 10, 6, 4, 2, 1]
+
+STEPS = ("get_member_by_plate", "get_last_action", "log_action")
+
+
+class Arrival:
+    """A plate scanned at a gate, offset seconds after the start of the run."""
+
+    def __init__(self, offset, gate, plate_number):
+        self.offset = offset
+        self.gate = gate
+        self.plate_number = plate_number
+
+
+def synthetic_arrivals(plates, gates=4, duration=60.0, rate=20.0, day_hours=24, double_scan_share=0.05, seed=0):
+    """Arrivals over duration seconds averaging rate per second, shaped like day_hours hours of rush-hour traffic.
+
+    A day is compressed into the run, so the morning and evening peaks arrive as bursts.
+    double_scan_share of the arrivals are also scanned at a second gate a moment later,
+    as happens when a car is seen by the cameras of two lanes.
+    """
+    rng = random.Random(seed)
+    weights = HOUR_WEIGHTS[:day_hours]
+    slot = duration / len(weights)
+    mean_weight = sum(weights) / len(weights)
+    arrivals = []
+    for hour, weight in enumerate(weights):
+        for _ in range(round(rate * slot * weight / mean_weight)):
+            arrival = Arrival(hour * slot + rng.random() * slot, rng.randrange(gates), rng.choice(plates))
+            arrivals.append(arrival)
+            if gates > 1 and rng.random() < double_scan_share:
+                other_gate = (arrival.gate + rng.randrange(1, gates)) % gates
+                arrivals.append(Arrival(arrival.offset + rng.random() * 0.05, other_gate, arrival.plate_number))
+    return sorted(arrivals, key=lambda arrival: arrival.offset)
+
+
+def load_test_plates(system, count=2000, guest_share=0.2, seed=0):
+    """Plates for synthetic arrivals: member plates from the database and some unknown guest plates."""
+    rng = random.Random(seed)
+    member_plates = [car["plate_number"] for member_data in system.members_collection.find({}, {"cars.plate_number": 1}).limit(count)
+                     for car in member_data.get("cars", [])]
+    guest_count = max(1, round(count * guest_share)) if member_plates else count
+    plates = rng.sample(member_plates, min(len(member_plates), count - guest_count)) if member_plates else []
+    return plates + [f"LT{number:05d}" for number in range(guest_count)]
+
+
+def recorded_arrivals(system, start, end, gates=4, speedup=60.0):
+    """Replay the stored logs between start and end as arrivals, speedup times faster than they happened.
+
+    Each staff member's logs go to one simulated gate, as a staff member works one gate.
+    """
+    arrivals = []
+    gate_of = {}
+    for log_data in system.iter_logs({"start": start, "end": end}):
+        gate = gate_of.setdefault(log_data["staff_id"] or log_data["staff"], len(gate_of) % gates)
+        arrivals.append(Arrival((log_data["timestamp"] - start).total_seconds() / speedup, gate, log_data["plate_number"]))
+    return arrivals
+
+
+class GateWorker(threading.Thread):
+    """One simulated gate terminal working through its arrivals on schedule."""
+
+    def __init__(self, system, arrivals, started, staff):
+        super().__init__(daemon=True, name=f"load-gate-{system.gate_id}")
+        self.system = system
+        self.arrivals = arrivals
+        self.started = started  # time.perf_counter() of the run start, shared by every gate
+        self.staff = staff
+        self.timings = {step: [] for step in STEPS + ("decision",)}
+        self.lag = []  # Seconds each arrival waited for the gate to be free
+        self.rejected = 0  # log_action refused because another gate got there first
+        self.errors = []
+
+    def run(self):
+        for arrival in self.arrivals:
+            wait = self.started + arrival.offset - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            else:
+                self.lag.append(-wait)
+            try:
+                self.decide(arrival.plate_number)
+            except GateStateError:
+                self.rejected += 1
+            except PyMongoError as e:
+                self.errors.append(str(e))
+
+    def decide(self, plate_number):
+        decision_started = time.perf_counter()
+        member_data = self._timed("get_member_by_plate", self.system.get_member_by_plate, plate_number)
+        last_action = self._timed("get_last_action", self.system.get_last_action, plate_number)
+        action = "check-out" if last_action and last_action.lower() == "check-in" else "check-in"
+        if member_data:
+            owner, house_number, car_type = member_data["name"], member_data["house_number"], member_data.get("type", "Member")
+        else:
+            owner, house_number, car_type = "Load test guest", "0", "Guest"
+        try:
+            self._timed("log_action", self.system.log_action, plate_number, owner, house_number, action, datetime.now(), car_type, self.staff)
+        finally:
+            self.timings["decision"].append(time.perf_counter() - decision_started)
+
+    def _timed(self, step, function, *args):
+        started = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self.timings[step].append(time.perf_counter() - started)
+
+
+def check_consistency(system, plates, inside_before, since):
+    """Find plates whose logs since the run started do not alternate or disagree with presence.
+
+    inside_before is the set of those plates that were inside when the run started.
+    """
+    last_actions = {plate_number: ("check-in" if plate_number in inside_before else "check-out") for plate_number in plates}
+    violations = []
+    for log_data in system.iter_logs({"start": since}):
+        plate_number = log_data["plate_number"]
+        if plate_number not in last_actions:
+            continue
+        if log_data["action"] == last_actions[plate_number]:
+            kind = "two active check-ins" if log_data["action"] == "check-in" else "check-out while outside"
+            violations.append({"plate_number": plate_number, "violation": kind, "log_id": str(log_data["_id"]), "timestamp": log_data["timestamp"].isoformat()})
+        last_actions[plate_number] = log_data["action"]
+    inside_now = {presence["_id"] for presence in system.presence_collection.find({"_id": {"$in": list(plates)}}, {"_id": 1})}
+    for plate_number, last_action in last_actions.items():
+        if (last_action == "check-in") != (plate_number in inside_now):
+            violations.append({"plate_number": plate_number, "violation": "presence disagrees with the last log"})
+    return violations
+
+
+def run_load_test(db, arrivals, gates=4, configure=None):
+    """Drive the arrivals through gates simulated terminals on db and return the report.
+
+    configure(system) is called on each gate's System before the run, to enable the plate
+    index, write-behind logging or whatever else is being sized.
+    """
+    systems = [System(db, gate_id=f"load-{gate}") for gate in range(gates)]
+    for system in systems:
+        if configure:
+            configure(system)
+    staff = systems[0].staff_collection.find_one() or "Load test"
+    plates = {arrival.plate_number for arrival in arrivals}
+    inside_before = {presence["_id"] for presence in systems[0].presence_collection.find({"_id": {"$in": list(plates)}}, {"_id": 1})}
+
+    since = datetime.now()
+    started = time.perf_counter()
+    workers = [GateWorker(system, [arrival for arrival in arrivals if arrival.gate == gate], started, staff) for gate, system in enumerate(systems)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    for system in systems:
+        system.close()  # Flushes write-behind journals before the logs are checked
+
+    timings = {step: [sample for worker in workers for sample in worker.timings[step]] for step in STEPS + ("decision",)}
+    lag = [sample for worker in workers for sample in worker.lag]
+    decisions = len(timings["decision"])
+    violations = check_consistency(systems[0], plates, inside_before, since)
+    return {
+        "commit": git_commit(),
+        "started_at": since.isoformat(timespec="seconds"),
+        "gates": gates,
+        "arrivals": len(arrivals),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(decisions / elapsed, 2) if elapsed else None,
+        "rejected": sum(worker.rejected for worker in workers),
+        "errors": sum(len(worker.errors) for worker in workers),
+        "behind_schedule": percentiles(lag) if lag else None,
+        "latency": {step: percentiles(samples) for step, samples in timings.items() if samples},
+        "violations": violations,
+    }
@@ -0,0 +1,117 @@
+# app/log_export.py
+
+import csv
+import json
+import os
+
+# pyarrow is optional and slow to import, so it is only imported once a Parquet export starts
+
+FORMATS = ("csv", "jsonl", "parquet")
+
+# Exported log fields, in column order
+EXPORT_FIELDS = ["_id", "timestamp", "plate_number", "owner", "house_number", "action", "type", "staff"]
+
+
+class ExportCancelled(Exception):
+    """Raised when an export is cancelled; the partial file has been removed."""
+
+
+def _export_row(log):
+    row = {field: log.get(field) for field in EXPORT_FIELDS}
+    row["_id"] = str(row["_id"])
+    return row
+
+
+class _CsvWriter:
+    def __init__(self, path):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.file, EXPORT_FIELDS)
+        self.writer.writeheader()
+
+    def write(self, rows):
+        for row in rows:
+            row["timestamp"] = row["timestamp"].isoformat()
+            self.writer.writerow(row)
+
+    def close(self):
+        self.file.close()
+
+
+class _JsonLinesWriter:
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8")
+
+    def write(self, rows):
+        for row in rows:
+            row["timestamp"] = row["timestamp"].isoformat()
+            self.file.write(json.dumps(row) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetWriter:
+    """Writes each batch as one row group, so only one batch is ever held in memory."""
+
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet export needs the pyarrow package.")
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema(
+            [(field, pyarrow.timestamp("us") if field == "timestamp" else pyarrow.string()) for field in EXPORT_FIELDS])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        columns = {field: [row[field] for row in rows] for field in EXPORT_FIELDS}
+        self.writer.write_table(self.pyarrow.Table.from_pydict(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {"csv": _CsvWriter, "jsonl": _JsonLinesWriter, "parquet": _ParquetWriter}
+
+
+def export_logs(system, path, file_format, filters=None, batch_size=5000, progress=None, cancelled=None):
+    """Stream the logs matching the filters, oldest first, into a CSV, JSON Lines or Parquet file.
+
+    Logs are read from one cursor and written a batch at a time, so memory use does not grow
+    with the size of the export. progress(written, total) is called after every batch and
+    cancelled() is checked before each one. total comes from the traffic rollups, and is
+    None when only counting the logs themselves could give it. Returns the number of logs written.
+    """
+    total = None
+    if progress:
+        count = system.count_logs(filters, scan=False)
+        total = count["count"] if count else None
+    partial_path = path + ".part"
+    writer = WRITERS[file_format](partial_path)
+    written = 0
+    try:
+        batch = []
+        for log in system.iter_logs(filters, batch_size):
+            batch.append(_export_row(log))
+            if len(batch) >= batch_size:
+                if cancelled and cancelled():
+                    raise ExportCancelled()
+                writer.write(batch)
+                written += len(batch)
+                batch = []
+                if progress:
+                    progress(written, total)
+        if batch:
+            writer.write(batch)
+            written += len(batch)
+        writer.close()
+    except BaseException:
+        writer.close()
+        os.remove(partial_path)
+        raise
+    # Only a finished export appears under the requested name
+    os.replace(partial_path, path)
+    if progress:
+        progress(written, total)
+    return written
@@ -0,0 +1,197 @@
+# app/log_journal.py
+
+import os
+import threading
+import time
+
+from bson import json_util
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from app.log_schema import SCHEMA_VERSION, encode_log, decode_log
+from app.rollups import rollup_updates
+
+DUPLICATE_KEY = 11000
+
+
+class LogJournal:
+    """Append-only, fsync'd file of log entries that have not reached MongoDB yet.
+
+    Entries are JSON lines. A checkpoint file next to the journal records the byte offset
+    up to which entries have been flushed, so a restart resumes with whatever is left.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.checkpoint_path = path + ".checkpoint"
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.flushed_offset = self._read_checkpoint()
+        self.pending = self._read_pending()  # List of (log_data, end offset in the journal)
+        self.file = open(self.path, "ab")
+
+    def _read_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_checkpoint(self, offset):
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+        self.flushed_offset = offset
+
+    def _read_pending(self):
+        pending = []
+        if not os.path.exists(self.path):
+            return pending
+        with open(self.path, "r+b") as f:
+            f.seek(self.flushed_offset)
+            offset = self.flushed_offset
+            for line in iter(f.readline, b""):
+                if not line.endswith(b"\n"):
+                    # Torn write from a crash; the entry was never acknowledged, so drop it
+                    f.truncate(offset)
+                    break
+                offset += len(line)
+                pending.append((json_util.loads(line.decode()), offset))
+        return pending
+
+    def append(self, log_data):
+        """Durably record a log entry. Returns once it is on disk."""
+        line = json_util.dumps(log_data, json_options=json_util.CANONICAL_JSON_OPTIONS).encode() + b"\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending.append((log_data, self.file.tell()))
+
+    def peek(self, limit):
+        """Return up to limit of the oldest unflushed entries."""
+        with self.lock:
+            return [log_data for log_data, _ in self.pending[:limit]]
+
+    def mark_flushed(self, count):
+        """Forget the oldest count entries once they are stored in MongoDB."""
+        with self.lock:
+            if not count:
+                return
+            offset = self.pending[count - 1][1]
+            del self.pending[:count]
+            if self.pending:
+                self._write_checkpoint(offset)
+            else:
+                # Everything is flushed: start the journal over instead of letting it grow.
+                # The checkpoint goes first: a crash before the truncate only replays entries
+                # that are already stored, which the client _ids turn into duplicates
+                self._write_checkpoint(0)
+                self.file.truncate(0)
+                self.file.seek(0)
+                os.fsync(self.file.fileno())
+
+    def depth(self):
+        with self.lock:
+            return len(self.pending)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class LogFlusher(threading.Thread):
+    """Background thread that moves journaled log entries into the logs collection in batches."""
+
+    def __init__(self, journal, log_partitions, batch_size=500, interval=1.0, rollups_collection=None):
+        super().__init__(daemon=True, name="log-flusher")
+        self.journal = journal
+        self.log_partitions = log_partitions  # Routes each entry to the collection for its month
+        self.rollups_collection = rollups_collection  # Traffic rollups to count each flushed batch into
+        self.batch_size = batch_size
+        self.interval = interval
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.last_flush_latency = None  # Seconds taken by the last successful insert_many
+        self.last_flush_size = 0
+        self.flushed_total = 0
+        self.last_error = None
+        self.failed_flushes = 0  # Flush passes in a row that could not reach MongoDB
+        self.drained_at = time.monotonic()  # When the journal was last seen empty
+
+    def run(self):
+        while not self.stopping.is_set():
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def notify(self):
+        """Flush early, e.g. once a full batch is waiting."""
+        self.wakeup.set()
+
+    def flush(self):
+        """Send every pending entry to MongoDB. Returns the number of entries written."""
+        written = 0
+        while True:
+            batch = self.journal.peek(self.batch_size)
+            if not batch:
+                self.failed_flushes = 0
+                self.drained_at = time.monotonic()
+                return written
+            started = time.perf_counter()
+            # Journals written before the compact log schema hold version 1 entries
+            documents = [document if document.get("v") == SCHEMA_VERSION else encode_log(decode_log(document)) for document in batch]
+            self.last_error = None
+            try:
+                for collection, group in self.log_partitions.group(documents):
+                    self._insert(collection, group)
+            except PyMongoError as e:
+                self.last_error = str(e)  # Keep the entries journaled and retry on the next pass
+                self.failed_flushes += 1
+                return written
+            self.last_flush_latency = time.perf_counter() - started
+            self.last_flush_size = len(batch)
+            self.journal.mark_flushed(len(batch))
+            self.flushed_total += len(batch)
+            written += len(batch)
+
+    def _insert(self, collection, documents):
+        inserted = documents
+        try:
+            collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            # Entries carry client-generated _ids, so a replay after a crash only hits duplicates
+            if any(error["code"] != DUPLICATE_KEY for error in e.details["writeErrors"]):
+                raise
+            duplicates = {error["index"] for error in e.details["writeErrors"]}
+            inserted = [document for index, document in enumerate(documents) if index not in duplicates]
+        if self.rollups_collection is not None and inserted:
+            try:
+                self.rollups_collection.bulk_write(rollup_updates(inserted), ordered=False)
+            except PyMongoError as e:
+                # The logs are stored; a missed count is corrected by manage.py rebuild-rollups
+                self.last_error = str(e)
+
+    def stop(self):
+        """Flush what is left and stop the thread."""
+        self.stopping.set()
+        self.wakeup.set()
+        if self.is_alive():
+            self.join()
+        self.flush()
+
+    def stats(self):
+        depth = self.journal.depth()
+        return {
+            "queue_depth": depth,
+            "flush_lag": time.monotonic() - self.drained_at if depth else 0.0,  # Seconds entries have been waiting
+            "failed_flushes": self.failed_flushes,
+            "last_flush_latency": self.last_flush_latency,
+            "last_flush_size": self.last_flush_size,
+            "flushed_total": self.flushed_total,
+            "last_error": self.last_error
+        }
@@ -0,0 +1,133 @@
+# app/log_model.py
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal
+
+# (header, log field) for each column of the log view
+COLUMNS = [
+    ("Plate Number", "plate_number"),
+    ("Owner", "owner"),
+    ("House Number", "house_number"),
+    ("Action", "action"),
+    ("Timestamp", "timestamp"),
+    ("Staff", "staff"),
+]
+
+
+class LogTableModel(QAbstractTableModel):
+    """Sliding window over the logs, newest first, fetched from MongoDB in batches while the operator scrolls.
+
+    Older rows are appended through canFetchMore/fetchMore and newer rows are prepended by
+    fetch_newer. Once the window holds more than max_rows, rows at the far end are dropped,
+    so memory stays bounded however far the operator scrolls.
+    """
+    rows_trimmed = pyqtSignal(int)  # Rows dropped from the top, so the view can keep its place
+    rows_prepended = pyqtSignal(int)  # Rows inserted at the top, so the view can keep its place
+
+    def __init__(self, system, runner, batch_size=200, max_rows=2000, parent=None):
+        super().__init__(parent)
+        self.system = system
+        self.runner = runner
+        self.batch_size = batch_size
+        self.max_rows = max_rows
+        self.rows = []  # (anchor, display strings) per row
+        self.filters = {}  # Server-side filters passed to System (see System._log_filter_clauses)
+        self.at_start = True  # The first row is the newest log in range
+        self.at_end = False  # The last row is the oldest log in range
+        self.fetching = False
+
+    # --- Qt model interface ---
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        return self.rows[index.row()][1][index.column()]
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return COLUMNS[section][0]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.at_end and not self.fetching and bool(self.rows)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        self.fetching = True
+        self.runner.submit(self.system.get_logs_before, self.rows[-1][0], self.batch_size, self.filters,
+                           key="logs", on_result=self._append_older, on_error=self._fetch_failed)
+
+    # --- Loading ---
+    def reset(self, fetch, *args, at_start=False):
+        """Replace the window with the batch returned by fetch(*args, batch_size, filters).
+
+        at_start says the batch begins with the newest log in range, as it does for the
+        latest logs; after a date jump the logs above are fetched as the operator scrolls up.
+        """
+        self.fetching = True
+        self.runner.submit(fetch, *args, self.batch_size, self.filters, key="logs",
+                           on_result=lambda logs: self._replace(logs, at_start), on_error=self._fetch_failed)
+
+    def fetch_newer(self):
+        """Fetch the batch just above the first row, if the window has scrolled away from the newest logs."""
+        if self.at_start or self.fetching or not self.rows:
+            return
+        self.fetching = True
+        self.runner.submit(self.system.get_logs_after, self.rows[0][0], self.batch_size, self.filters,
+                           key="logs", on_result=self._prepend_newer, on_error=self._fetch_failed)
+
+    @staticmethod
+    def _row(log):
+        return (log["timestamp"], log["_id"]), tuple(str(log[field]) for _, field in COLUMNS)
+
+    def _replace(self, logs, at_start):
+        self.beginResetModel()
+        self.rows = [self._row(log) for log in logs]
+        self.at_start = at_start
+        self.at_end = len(logs) < self.batch_size
+        self.endResetModel()
+        self.fetching = False
+        # The view starts at the top, where scrolling up cannot move the scroll bar, so fetch
+        # the batch above now; rows_prepended keeps the jumped-to log in place
+        self.fetch_newer()
+
+    def _append_older(self, logs):
+        self.fetching = False
+        if len(logs) < self.batch_size:
+            self.at_end = True
+        if logs:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(logs) - 1)
+            self.rows.extend(self._row(log) for log in logs)
+            self.endInsertRows()
+        excess = len(self.rows) - self.max_rows
+        if excess > 0:
+            self.beginRemoveRows(QModelIndex(), 0, excess - 1)
+            del self.rows[:excess]
+            self.endRemoveRows()
+            self.at_start = False
+            self.rows_trimmed.emit(excess)
+
+    def _prepend_newer(self, logs):
+        self.fetching = False
+        if len(logs) < self.batch_size:
+            self.at_start = True
+        if logs:
+            self.beginInsertRows(QModelIndex(), 0, len(logs) - 1)
+            self.rows[:0] = [self._row(log) for log in logs]
+            self.endInsertRows()
+            self.rows_prepended.emit(len(logs))
+        excess = len(self.rows) - self.max_rows
+        if excess > 0:
+            self.beginRemoveRows(QModelIndex(), len(self.rows) - excess, len(self.rows) - 1)
+            del self.rows[-excess:]
+            self.endRemoveRows()
+            self.at_end = False
+
+    def _fetch_failed(self, error):
+        self.fetching = False
+        self.runner.failed.emit(str(error))
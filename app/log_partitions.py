@@ -0,0 +1,141 @@
+# app/log_partitions.py
+
+import gzip
+import os
+import re
+import time
+from datetime import datetime
+
+from bson import json_util
+
+from app.car import plate_key
+from app.indexes import INDEXES
+
+# Logs are stored in one collection per month, named logs_YYYY_MM after the month of
+# their timestamp. Old months can be moved out of MongoDB into gzipped JSON Lines files.
+PARTITION_PREFIX = "logs_"
+PARTITION_PATTERN = re.compile(r"^logs_(\d{4})_(\d{2})$")
+
+
+def partition_name(timestamp):
+    return f"{PARTITION_PREFIX}{timestamp.year:04d}_{timestamp.month:02d}"
+
+
+def partition_month(name):
+    """(year, month) of a partition name, or None if it is not one."""
+    match = PARTITION_PATTERN.match(name)
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+def _month(timestamp):
+    return (timestamp.year, timestamp.month) if timestamp else None
+
+
+def _in_range(month, start, end):
+    return (start is None or month >= _month(start)) and (end is None or month <= _month(end))
+
+
+class LogPartitions:
+    """Routes log documents to their monthly collection and finds the partitions a time range touches."""
+
+    def __init__(self, db, refresh_interval=60.0):
+        self.db = db
+        self.refresh_interval = refresh_interval  # Seconds before partitions made by other terminals are noticed
+        self._names = None
+        self._listed_at = 0.0
+        self._indexed = set()  # Partitions this process has made sure have the log indexes
+
+    def names(self):
+        """Names of the existing partitions, oldest first."""
+        if self._names is None or time.monotonic() - self._listed_at > self.refresh_interval:
+            names = self.db.list_collection_names(filter={"name": {"$regex": PARTITION_PATTERN.pattern}})
+            self._names = sorted(names)
+            self._listed_at = time.monotonic()
+        return self._names
+
+    def refresh(self):
+        self._names = None
+
+    def collection_for(self, timestamp):
+        """The partition a log with this timestamp belongs in, created with its indexes on first use."""
+        name = partition_name(timestamp)
+        if name not in self._indexed:
+            self.db[name].create_indexes(INDEXES["logs"])
+            self._indexed.add(name)
+            if self._names is not None and name not in self._names:
+                self._names = sorted(self._names + [name])
+        return self.db[name]
+
+    def group(self, documents):
+        """Split version 2 log documents into (partition, documents) pairs."""
+        groups = {}
+        for document in documents:
+            groups.setdefault(partition_name(document["ts"]), []).append(document)
+        return [(self.collection_for(documents[0]["ts"]), documents) for documents in groups.values()]
+
+    def collections(self, start=None, end=None, newest_first=True):
+        """Partitions holding logs between start and end (either may be None), in time order."""
+        names = set(self.names())
+        names.add(partition_name(datetime.now()))  # May have been created since the last listing
+        names = sorted((name for name in names if _in_range(partition_month(name), start, end)), reverse=newest_first)
+        return [self.db[name] for name in names]
+
+
+class LogArchive:
+    """Cold log partitions as gzipped JSON Lines files, one per month, that can still be searched."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path_for(self, name):
+        return os.path.join(self.directory, name + ".jsonl.gz")
+
+    def names(self, start=None, end=None):
+        """Archived partition names between start and end, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        names = [file_name[:-len(".jsonl.gz")] for file_name in os.listdir(self.directory) if file_name.endswith(".jsonl.gz")]
+        return sorted(name for name in names if partition_month(name) and _in_range(partition_month(name), start, end))
+
+    def write(self, name, documents):
+        """Write a partition's documents to its archive file and return how many were written."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path_for(name)
+        written = 0
+        try:
+            with gzip.open(path + ".part", "wt", encoding="utf-8") as file:
+                for document in documents:
+                    file.write(json_util.dumps(document, json_options=json_util.CANONICAL_JSON_OPTIONS) + "\n")
+                    written += 1
+        except BaseException:
+            os.remove(path + ".part")
+            raise
+        os.replace(path + ".part", path)
+        return written
+
+    def read(self, name):
+        """Yield the documents of an archived partition, in the order they were archived."""
+        with gzip.open(self.path_for(name), "rt", encoding="utf-8") as file:
+            for line in file:
+                yield json_util.loads(line)
+
+
+def log_matches(log, filters):
+    """Apply System log filters (see System._log_filter_clauses) to a decoded log, for archives searched outside MongoDB."""
+    if not filters:
+        return True
+    for field in ("owner", "house_number", "type", "staff"):
+        if filters.get(field) and log.get(field) != filters[field]:
+            return False
+    # Archived logs may predate plate normalization, so both sides are compared normalized
+    if filters.get("plate_number") and plate_key(log["plate_number"]) != plate_key(filters["plate_number"]):
+        return False
+    if filters.get("plate_prefix") and not plate_key(log["plate_number"]).startswith(plate_key(filters["plate_prefix"])):
+        return False
+    if filters.get("action") and log["action"] != filters["action"].lower():
+        return False
+    if filters.get("start") and log["timestamp"] < filters["start"]:
+        return False
+    if filters.get("end") and log["timestamp"] > filters["end"]:
+        return False
+    return True
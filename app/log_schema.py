@@ -0,0 +1,90 @@
+# app/log_schema.py
+
+# Stored log documents, version 2:
+#   {"_id", "v": 2, "p": plate, "o": owner, "h": house number, "a": action code,
+#    "ts": timestamp, "t": type code, "s": staff ObjectId, "sn": staff name}
+# "sn" is only set once the staff member is no longer on record.
+# Version 1 documents (no "v") used the long field names and embedded the whole staff
+# document, or the staff name from the guest dialog, under "staff".
+#
+# The rest of the app works with decoded entries: the long field names, the action and
+# type spelled out, and the staff member as "staff" (name) plus "staff_id".
+
+SCHEMA_VERSION = 2
+
+ACTION_CODES = {"check-in": 1, "check-out": 2}
+TYPE_CODES = {"Member": 1, "Guest": 2}
+ACTIONS = {code: action for action, code in ACTION_CODES.items()}
+TYPES = {code: car_type for car_type, code in TYPE_CODES.items()}
+
+# Decoded field -> version 2 field
+FIELDS = {
+    "plate_number": "p",
+    "owner": "o",
+    "house_number": "h",
+    "action": "a",
+    "timestamp": "ts",
+    "type": "t",
+    "staff_id": "s",
+}
+
+
+def action_code(action):
+    """Code for an action; the guest dialog spells it "Check-in"."""
+    return ACTION_CODES.get(action.lower(), action)
+
+
+def type_code(car_type):
+    return TYPE_CODES.get(car_type, car_type)
+
+
+def encode_log(log_entry):
+    """Build the version 2 document for a decoded log entry."""
+    document = {
+        "_id": log_entry["_id"],
+        "v": SCHEMA_VERSION,
+        "p": log_entry["plate_number"],
+        "o": log_entry["owner"],
+        "h": log_entry["house_number"],
+        "a": action_code(log_entry["action"]),
+        "ts": log_entry["timestamp"],
+        "t": type_code(log_entry["type"]),
+    }
+    if log_entry.get("staff_id") is not None:
+        document["s"] = log_entry["staff_id"]
+    elif log_entry.get("staff"):
+        document["sn"] = log_entry["staff"]  # Staff member not on record; keep the name
+    return document
+
+
+def decode_log(document, staff_name=None):
+    """Turn a stored log document of either version into a decoded entry.
+
+    staff_name maps a staff ObjectId to a name for version 2 documents.
+    """
+    if document.get("v") == SCHEMA_VERSION:
+        staff_id = document.get("s")
+        return {
+            "_id": document["_id"],
+            "plate_number": document["p"],
+            "owner": document["o"],
+            "house_number": document["h"],
+            "action": ACTIONS.get(document["a"], document["a"]),
+            "timestamp": document["ts"],
+            "type": TYPES.get(document["t"], document["t"]),
+            "staff": (staff_name(staff_id) if staff_id is not None and staff_name else None) or document.get("sn"),
+            "staff_id": staff_id,
+        }
+    staff = document.get("staff")
+    return {
+        "_id": document["_id"],
+        "plate_number": document["plate_number"],
+        "owner": document["owner"],
+        "house_number": document["house_number"],
+        "action": document["action"].lower(),
+        "timestamp": document["timestamp"],
+        "type": document["type"],
+        "staff": staff.get("name") if isinstance(staff, dict) else staff,
+        "staff_id": staff.get("_id") if isinstance(staff, dict) else None,
+    }
+
@@ -1,84 +1,242 @@
 # app/log_table.py
 
-from PyQt5.QtWidgets import QMainWindow, QTableWidget, QTableWidgetItem, QVBoxLayout, QPushButton, QWidget, QLabel, QHBoxLayout
-from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QMainWindow, QTableView, QVBoxLayout, QPushButton, QWidget, QLabel, QHBoxLayout, QDateTimeEdit, QMessageBox, QLineEdit, QComboBox, QCheckBox, QFileDialog, QProgressDialog
+from PyQt5.QtCore import QDateTime, QTimer, pyqtSignal
+from app.log_model import LogTableModel
+from app.log_export import export_logs, ExportCancelled
+from app.log_partitions import log_matches
+from app.workers import TaskRunner, ProgressReporter
+
+# File dialog filter -> export format
+EXPORT_FILTERS = {"CSV (*.csv)": "csv", "JSON Lines (*.jsonl)": "jsonl", "Parquet (*.parquet)": "parquet"}
 
 class LogTable(QMainWindow):
-    def __init__(self, system):
+    log_written = pyqtSignal(object)  # Carries System count notifications from worker threads to the GUI thread
+
+    def __init__(self, system, count_refresh_interval=30000):
         super().__init__()
         self.system = system
-        self.current_page = 0  # Track the current page
-        self.logs_per_page = 20  # Number of logs per page
-        self.total_logs = self.system.get_log_count()  # Get the total number of logs
-        self.total_pages = (self.total_logs + self.logs_per_page - 1) // self.logs_per_page  # Calculate total pages
+        self.total_logs = None  # Counted in the background
+        self.total_exact = True  # False while the total is an estimate
+        self.runner = TaskRunner(self)  # Runs System calls off the GUI thread
+        self.runner.busy_changed.connect(self.show_loading)
+        self.runner.failed.connect(lambda message: QMessageBox.warning(self, "Database Error", message))
         self.initUI()
 
+        # Logs written at this terminal bump the total as they happen. Other gates' logs show
+        # up when the total is asked for again, which is cheap while it comes from the rollups.
+        self.log_written.connect(self.count_new_log)
+        self.count_listener = self.log_written.emit
+        self.system.add_count_listener(self.count_listener)
+        self.count_timer = QTimer(self)
+        self.count_timer.setInterval(count_refresh_interval)
+        self.count_timer.timeout.connect(self.refresh_count)
+        self.count_timer.start()
+
     def initUI(self):
         self.setWindowTitle("Log Table")
         self.setGeometry(100, 100, 800, 600)
 
-        # Create the log table
-        self.table = QTableWidget(self)
-        self.table.setColumnCount(6)
-        self.table.setHorizontalHeaderLabels(["Plate Number", "Owner", "House Number", "Action", "Timestamp", "Staff"])
-
-        # Create buttons for pagination
-        self.prev_button = QPushButton("Previous", self)
-        self.next_button = QPushButton("Next", self)
-        self.prev_button.clicked.connect(self.prev_page)
-        self.next_button.clicked.connect(self.next_page)
-
-        # Create a label to display the current page number
-        self.page_label = QLabel(f"Page {self.current_page + 1} of {self.total_pages}", self)
-
-        # Layout for pagination buttons and page label
-        button_layout = QHBoxLayout()
-        button_layout.addWidget(self.prev_button)
-        button_layout.addWidget(self.page_label, alignment=Qt.AlignCenter)
-        button_layout.addWidget(self.next_button)
+        # Create the log view; rows are fetched in batches as the operator scrolls
+        self.model = LogTableModel(self.system, self.runner, parent=self)
+        self.table = QTableView(self)
+        self.table.setModel(self.model)
+        self.table.verticalScrollBar().valueChanged.connect(self.scrolled)
+        self.model.rows_trimmed.connect(lambda count: self.shift_scroll(-count))
+        self.model.rows_prepended.connect(self.shift_scroll)
+
+        # Jump straight to the logs around a given date
+        self.date_input = QDateTimeEdit(QDateTime.currentDateTime(), self)
+        self.date_input.setCalendarPopup(True)
+        jump_button = QPushButton("Jump to Date", self)
+        jump_button.clicked.connect(self.jump_to_date)
+        latest_button = QPushButton("Latest", self)
+        latest_button.clicked.connect(self.load_latest)
+        export_button = QPushButton("Export...", self)
+        export_button.clicked.connect(self.export_logs)
+
+        date_layout = QHBoxLayout()
+        date_layout.addWidget(self.date_input)
+        date_layout.addWidget(jump_button)
+        date_layout.addWidget(latest_button)
+        date_layout.addWidget(export_button)
+
+        # Filter bar; the filters run on the server, a moment after the operator stops typing
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(300)
+        self.filter_timer.timeout.connect(self.apply_filters)
+
+        self.plate_filter = QLineEdit(self)
+        self.plate_filter.setPlaceholderText("Plate starts with")
+        self.owner_filter = QLineEdit(self)
+        self.owner_filter.setPlaceholderText("Owner")
+        self.house_filter = QLineEdit(self)
+        self.house_filter.setPlaceholderText("House Number")
+        self.staff_filter = QLineEdit(self)
+        self.staff_filter.setPlaceholderText("Staff")
+        self.action_filter = QComboBox(self)
+        self.action_filter.addItems(["Any action", "check-in", "check-out"])
+        self.type_filter = QComboBox(self)
+        self.type_filter.addItems(["Any type", "Member", "Guest"])
+        self.range_filter = QCheckBox("From", self)
+        self.start_filter = QDateTimeEdit(QDateTime.currentDateTime().addDays(-7), self)
+        self.start_filter.setCalendarPopup(True)
+        self.end_filter = QDateTimeEdit(QDateTime.currentDateTime(), self)
+        self.end_filter.setCalendarPopup(True)
+
+        for line_edit in (self.plate_filter, self.owner_filter, self.house_filter, self.staff_filter):
+            line_edit.textChanged.connect(self.filter_timer.start)
+        for combo_box in (self.action_filter, self.type_filter):
+            combo_box.currentIndexChanged.connect(self.filter_timer.start)
+        self.range_filter.toggled.connect(self.filter_timer.start)
+        self.start_filter.dateTimeChanged.connect(self.filter_timer.start)
+        self.end_filter.dateTimeChanged.connect(self.filter_timer.start)
+
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(self.plate_filter)
+        filter_layout.addWidget(self.owner_filter)
+        filter_layout.addWidget(self.house_filter)
+        filter_layout.addWidget(self.staff_filter)
+        filter_layout.addWidget(self.action_filter)
+        filter_layout.addWidget(self.type_filter)
+
+        range_layout = QHBoxLayout()
+        range_layout.addWidget(self.range_filter)
+        range_layout.addWidget(self.start_filter)
+        range_layout.addWidget(QLabel("To", self))
+        range_layout.addWidget(self.end_filter)
+
+        # Label with the total number of logs
+        self.count_label = QLabel("", self)
 
         # Main layout
         layout = QVBoxLayout()
+        layout.addLayout(filter_layout)
+        layout.addLayout(range_layout)
+        layout.addLayout(date_layout)
         layout.addWidget(self.table)
-        layout.addLayout(button_layout)
+        layout.addWidget(self.count_label)
 
         # Set the layout to the central widget
         container = QWidget()
         container.setLayout(layout)
         self.setCentralWidget(container)
 
-        # Initially load the first page of logs
-        self.load_logs()
-
-    def load_logs(self):
-        """Load logs for the current page."""
-        self.table.setRowCount(0)  # Clear the table
-
-        # Fetch logs for the current page
-        logs = self.system.get_logs_by_page(self.current_page, self.logs_per_page)
-
-        # Populate the table with logs
-        for row_num, log in enumerate(logs):
-            self.table.insertRow(row_num)
-            self.table.setItem(row_num, 0, QTableWidgetItem(str(log['plate_number'])))  # Ensure str conversion
-            self.table.setItem(row_num, 1, QTableWidgetItem(str(log['owner'])))
-            self.table.setItem(row_num, 2, QTableWidgetItem(str(log['house_number'])))
-            self.table.setItem(row_num, 3, QTableWidgetItem(str(log['action'])))
-            self.table.setItem(row_num, 4, QTableWidgetItem(str(log['timestamp'])))  # Convert timestamp to string
-            self.table.setItem(row_num, 5, QTableWidgetItem(str(log['staff'])))
-
-
-        # Update page label
-        self.page_label.setText(f"Page {self.current_page + 1} of {self.total_pages}")
-
-    def prev_page(self):
-        """Go to the previous page."""
-        if self.current_page > 0:
-            self.current_page -= 1
-            self.load_logs()
-
-    def next_page(self):
-        """Go to the next page."""
-        if self.current_page < self.total_pages - 1:
-            self.current_page += 1
-            self.load_logs()
+        # Initially load the newest logs and count the total in the background
+        self.apply_filters()
+
+    def current_filters(self):
+        """Collect the filter bar into System log filters."""
+        filters = {
+            "plate_prefix": self.plate_filter.text().strip(),
+            "owner": self.owner_filter.text().strip(),
+            "house_number": self.house_filter.text().strip(),
+            "staff": self.staff_filter.text().strip(),
+        }
+        if self.action_filter.currentIndex() > 0:
+            filters["action"] = self.action_filter.currentText()
+        if self.type_filter.currentIndex() > 0:
+            filters["type"] = self.type_filter.currentText()
+        if self.range_filter.isChecked():
+            filters["start"] = self.start_filter.dateTime().toPyDateTime()
+            filters["end"] = self.end_filter.dateTime().toPyDateTime()
+        return {key: value for key, value in filters.items() if value}
+
+    def apply_filters(self):
+        """Reload the newest logs matching the filter bar and count them."""
+        self.model.filters = self.current_filters()
+        self.count_label.setText("")
+        self.total_logs = None
+        self.count_cached = False
+        self.refresh_count(force=True)
+        self.load_latest()
+
+    def refresh_count(self, force=False):
+        """Ask for the total again; on the timer only while it is cheap to, since an exact count scans the logs."""
+        if force or self.count_cached:
+            self.runner.submit(self.system.count_logs, self.model.filters, key="count", on_result=self.set_total_logs)
+
+    def set_total_logs(self, count):
+        """Show the total once the log count is known."""
+        self.total_logs = count["count"]
+        self.total_exact = count["exact"]
+        self.count_cached = count["cached"]
+        self.show_total()
+
+    def count_new_log(self, log_data):
+        """Count a log this terminal just wrote, if it matches the filter bar."""
+        if self.total_logs is not None and log_matches(log_data, self.model.filters):
+            self.total_logs += 1
+            self.show_total()
+
+    def show_total(self):
+        total = f"{self.total_logs}" if self.total_exact else f"About {self.total_logs}"
+        self.count_label.setText(f"{total} logs" if not self.model.filters else f"{total} matching logs")
+
+    def load_latest(self):
+        """Show the newest logs."""
+        self.model.reset(self.system.get_logs_before, None, at_start=True)
+
+    def jump_to_date(self):
+        """Show the logs at or before the selected date."""
+        date = self.date_input.dateTime().toPyDateTime()
+        self.model.reset(self.system.get_logs_from_date, date)
+
+    def export_logs(self):
+        """Export every log matching the filter bar to a file, with a cancellable progress dialog."""
+        path, selected_filter = QFileDialog.getSaveFileName(self, "Export Logs", "", ";;".join(EXPORT_FILTERS))
+        if not path:
+            return
+        file_format = EXPORT_FILTERS[selected_filter]
+        if not path.endswith("." + file_format):
+            path += "." + file_format
+
+        reporter = ProgressReporter(self)
+        dialog = QProgressDialog("Exporting logs...", "Cancel", 0, 0, self)
+        dialog.setMinimumDuration(0)
+        dialog.canceled.connect(reporter.cancel)
+        reporter.progress.connect(lambda done, total: self.show_export_progress(dialog, done, total))
+        self.runner.submit(export_logs, self.system, path, file_format, self.current_filters(),
+                           progress=reporter.report, cancelled=reporter.is_cancelled,
+                           on_result=lambda written: self.finish_export(dialog, path, written),
+                           on_error=lambda error: self.export_failed(dialog, error))
+
+    def show_export_progress(self, dialog, done, total):
+        if not total:  # Not known without counting the logs; keep the busy indicator
+            dialog.setLabelText(f"Exported {done} logs...")
+            return
+        dialog.setMaximum(total)
+        dialog.setValue(min(done, total))
+        dialog.setLabelText(f"Exported {done} of {total} logs...")
+
+    def finish_export(self, dialog, path, written):
+        dialog.reset()
+        QMessageBox.information(self, "Export Complete", f"Exported {written} logs to {path}.")
+
+    def export_failed(self, dialog, error):
+        dialog.reset()
+        if not isinstance(error, ExportCancelled):
+            QMessageBox.warning(self, "Export Failed", str(error))
+
+    def scrolled(self, value):
+        """Fetch newer logs when the operator scrolls back to the top of the window."""
+        if value == self.table.verticalScrollBar().minimum():
+            self.model.fetch_newer()
+
+    def shift_scroll(self, rows):
+        """Keep the same logs on screen when rows are added or dropped above them."""
+        scroll_bar = self.table.verticalScrollBar()
+        scroll_bar.setValue(scroll_bar.value() + rows)
+
+    def closeEvent(self, event):
+        self.count_timer.stop()
+        self.system.remove_count_listener(self.count_listener)
+        super().closeEvent(event)
+
+    def show_loading(self, busy):
+        """Show a loading message while logs are being fetched."""
+        if busy:
+            self.statusBar().showMessage("Loading...")
+        else:
+            self.statusBar().clearMessage()
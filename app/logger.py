@@ -2,19 +2,12 @@
 
 from datetime import datetime
 
+from app.system import System
+
 class Logger:
+    """Kept for older callers; logs go through System.log_action so there is a single write path and log format."""
     def __init__(self, db):
-        self.db = db
-        self.logs_collection = self.db["logs"]
+        self.system = System(db)
 
     def log_action(self, plate_number, owner, house_number, action, type, staff):
-        log_entry = {
-            "plate_number": plate_number,
-            "owner": owner,
-            "house_number": house_number,
-            "action": action,  # 'check-in' or 'check-out'
-            "type": type,  # 'Member' or 'Guest'
-            "staff": staff,
-            "timestamp": datetime.now()
-        }
-        self.logs_collection.insert_one(log_entry)
+        self.system.log_action(plate_number, owner, house_number, action, datetime.now(), type, staff)
@@ -0,0 +1,194 @@
+# app/member_import.py
+
+import csv
+import json
+import os
+
+from app.car import normalize_plate
+
+FORMATS = ("csv", "jsonl")
+
+# CSV files hold one row per car; a member's rows must be consecutive. A member without
+# cars is a single row with empty brand and plate_number.
+CSV_FIELDS = ["name", "house_number", "type", "brand", "plate_number"]
+MEMBER_TYPES = ("Member", "Guest")
+
+
+class ImportReport:
+    """Outcome of a member import: counts plus one (line, name, plate number, error) entry per rejected row."""
+
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.errors = []
+
+    def reject(self, rows, error):
+        for line, row in rows:
+            self.errors.append((line, row.get("name", ""), row.get("plate_number", ""), error))
+
+    def write_errors(self, path):
+        """Write the rejected rows as CSV."""
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(["line", "name", "plate_number", "error"])
+            writer.writerows(sorted(self.errors, key=lambda error: error[0]))
+
+
+def _read_csv(path):
+    """Yield (line, name, rows) per member, rows being the (line, row) pairs of its cars."""
+    with open(path, newline="", encoding="utf-8") as file:
+        reader = csv.DictReader(file)
+        member_rows = []
+        for row in reader:
+            line = reader.line_num
+            row = {field: (row.get(field) or "").strip() for field in CSV_FIELDS}
+            if member_rows and row["name"] != member_rows[0][1]["name"]:
+                yield member_rows[0][0], member_rows[0][1]["name"], member_rows
+                member_rows = []
+            member_rows.append((line, row))
+        if member_rows:
+            yield member_rows[0][0], member_rows[0][1]["name"], member_rows
+
+
+def _read_jsonl(path):
+    """Yield (line, name, rows) per member from one JSON object per line."""
+    with open(path, encoding="utf-8") as file:
+        for line, text in enumerate(file, 1):
+            if not text.strip():
+                continue
+            try:
+                member = json.loads(text)
+            except ValueError as e:
+                yield line, None, [(line, {"error": f"invalid JSON: {e}"})]
+                continue
+            base = {"name": str(member.get("name") or "").strip(), "house_number": str(member.get("house_number") or "").strip(),
+                    "type": str(member.get("type") or "").strip()}
+            cars = member.get("cars") or [{}]
+            yield line, base["name"], [(line, dict(base, brand=str(car.get("brand") or "").strip(),
+                                                   plate_number=str(car.get("plate_number") or "").strip())) for car in cars]
+
+
+READERS = {"csv": _read_csv, "jsonl": _read_jsonl}
+
+
+def _build_member(rows):
+    """Validate a member's rows and return its document fields, or raise ValueError."""
+    first = rows[0][1]
+    if first.get("error"):
+        raise ValueError(first["error"])
+    if not first["name"]:
+        raise ValueError("missing name")
+    if not first["house_number"]:
+        raise ValueError("missing house number")
+    member_type = first["type"] or "Member"
+    if member_type not in MEMBER_TYPES:
+        raise ValueError(f"unknown member type {member_type!r}")
+    cars = []
+    plates = set()
+    for _, row in rows:
+        if row["house_number"] and row["house_number"] != first["house_number"]:
+            raise ValueError("rows of one member disagree on the house number")
+        if not row["plate_number"] and not row["brand"] and len(rows) == 1:
+            continue  # Member without cars
+        plate_number = normalize_plate(row["plate_number"])
+        if plate_number in plates:
+            raise ValueError(f"plate {plate_number} listed twice")
+        plates.add(plate_number)
+        cars.append({"brand": row["brand"], "plate_number": plate_number})
+    return {"name": first["name"], "house_number": first["house_number"], "type": member_type, "cars": cars}
+
+
+def import_members(system, path, file_format, chunk_size=500, progress=None):
+    """Import members from a CSV or JSON Lines file, creating new members and replacing existing ones by name.
+
+    The file is read and written chunk by chunk. Plates are normalized, and a member whose
+    plate belongs to another member, in MongoDB or earlier in the file, is rejected.
+    Returns an ImportReport; progress(members read) is called after every chunk.
+    """
+    report = ImportReport()
+    seen_names = set()
+    file_plates = {}  # Plate -> member name, for collisions within the file
+    chunk = []
+    read = 0
+    for line, name, rows in READERS[file_format](path):
+        read += 1
+        try:
+            if name in seen_names:
+                raise ValueError("member listed again further down; keep a member's rows together")
+            member = _build_member(rows)
+        except ValueError as e:
+            report.reject(rows, str(e))
+            continue
+        seen_names.add(member["name"])
+        chunk.append((member, rows))
+        if len(chunk) >= chunk_size:
+            _import_chunk(system, chunk, file_plates, report)
+            chunk = []
+            if progress:
+                progress(read)
+    if chunk:
+        _import_chunk(system, chunk, file_plates, report)
+    if progress:
+        progress(read)
+    return report
+
+
+def _import_chunk(system, chunk, file_plates, report):
+    plates = [car["plate_number"] for member, _ in chunk for car in member["cars"]]
+    # One query for the whole chunk instead of a lookup per plate
+    owners = system.get_plate_owners(plates)
+    accepted = []
+    for member, rows in chunk:
+        collision = None
+        for car in member["cars"]:
+            owner = file_plates.get(car["plate_number"]) or owners.get(car["plate_number"])
+            if owner is not None and owner != member["name"]:
+                collision = f"plate {car['plate_number']} already belongs to {owner}"
+                break
+        if collision:
+            report.reject(rows, collision)
+            continue
+        for car in member["cars"]:
+            file_plates[car["plate_number"]] = member["name"]
+        accepted.append((member, rows))
+    if not accepted:
+        return
+    result = system.upsert_members([member for member, _ in accepted])
+    for index, error in result["errors"].items():
+        report.reject(accepted[index][1], error)
+    report.inserted += result["inserted"]
+    report.updated += result["updated"]
+
+
+def export_members(system, path, file_format, batch_size=1000, progress=None):
+    """Stream every member, ordered by name, into a file import_members can read back. Returns the member count."""
+    partial_path = path + ".part"
+    written = 0
+    try:
+        with open(partial_path, "w", newline="", encoding="utf-8") as file:
+            writer = None
+            if file_format == "csv":
+                writer = csv.DictWriter(file, CSV_FIELDS)
+                writer.writeheader()
+            for member_data in system.iter_members(batch_size):
+                if writer:
+                    base = {"name": member_data["name"], "house_number": member_data["house_number"], "type": member_data.get("type", "Member")}
+                    for car in member_data.get("cars") or [{"brand": "", "plate_number": ""}]:
+                        writer.writerow(dict(base, brand=car["brand"], plate_number=car["plate_number"]))
+                else:
+                    file.write(json.dumps({
+                        "name": member_data["name"],
+                        "house_number": member_data["house_number"],
+                        "type": member_data.get("type", "Member"),
+                        "cars": [{"brand": car["brand"], "plate_number": car["plate_number"]} for car in member_data.get("cars", [])]
+                    }) + "\n")
+                written += 1
+                if progress and written % batch_size == 0:
+                    progress(written)
+    except BaseException:
+        os.remove(partial_path)
+        raise
+    os.replace(partial_path, path)
+    if progress:
+        progress(written)
+    return written
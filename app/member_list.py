@@ -1,20 +1,28 @@
 # app/member_list.py
 
-from PyQt5.QtWidgets import QMainWindow, QListWidget, QVBoxLayout, QWidget, QPushButton, QMessageBox
+from PyQt5.QtWidgets import QMainWindow, QListWidget, QListWidgetItem, QVBoxLayout, QWidget, QPushButton, QMessageBox
+from PyQt5.QtCore import Qt
 from app.member_registration import MemberRegistrationForm
+from app.workers import TaskRunner
 
 class MemberList(QMainWindow):
     def __init__(self, system):
         super().__init__()
         self.system = system
+        self.page_size = 100  # Members fetched per page while scrolling
+        self.items = {}  # Member name -> list item
+        self.has_more = False  # More members exist than are loaded
+        self.runner = TaskRunner(self)  # Runs System calls off the GUI thread
+        self.runner.failed.connect(lambda message: QMessageBox.warning(self, "Database Error", message))
         self.initUI()
 
     def initUI(self):
         self.setWindowTitle("Member List")
         self.setGeometry(100, 100, 400, 300)
 
-        # List to display members
+        # List to display members; further pages load when scrolled to the bottom
         self.member_list = QListWidget(self)
+        self.member_list.verticalScrollBar().valueChanged.connect(self.scrolled)
         self.populate_member_list()
 
         # Layout
@@ -31,13 +39,57 @@ class MemberList(QMainWindow):
         self.setCentralWidget(container)
 
     def populate_member_list(self):
-        members = self.system.get_all_members()  # Retrieve members from the system
-        if not members:
+        # Retrieve only the displayed fields of the first page of members
+        self.runner.submit(self.system.search_members, "", None, self.page_size, key="members", on_result=self.show_members)
+
+    def load_more_members(self):
+        if self.has_more and not self.runner.is_busy():
+            last_name = self.member_list.item(self.member_list.count() - 1).data(Qt.UserRole)
+            self.runner.submit(self.system.search_members, "", last_name, self.page_size,
+                               key="members", on_result=lambda members: self.show_members(members, append=True))
+
+    def scrolled(self, value):
+        if value == self.member_list.verticalScrollBar().maximum():
+            self.load_more_members()
+
+    def show_members(self, members, append=False):
+        if not append:
+            self.member_list.clear()
+            self.items = {}
+        self.has_more = len(members) == self.page_size
+        for member_data in members:
+            self.member_list.addItem(self.member_item(member_data))
+        if not self.items:
             self.member_list.addItem("No members available")
-        else:
-            for member in members:
-                self.member_list.addItem(f"{member.name} - {member.house_number} - {member.license_plate}")
+
+    def member_item(self, member_data):
+        item = self.items[member_data['name']] = QListWidgetItem(self.member_text(member_data))
+        item.setData(Qt.UserRole, member_data['name'])
+        return item
+
+    @staticmethod
+    def member_text(member_data):
+        car_info = ', '.join([car['plate_number'] for car in member_data.get('cars', [])])
+        return f"{member_data['name']} - {member_data['house_number']} - {car_info}"
+
+    def member_saved(self, name):
+        # Refresh only the saved member's row
+        self.runner.submit(self.system.get_member_summary, name, on_result=self.update_member_item)
+
+    def update_member_item(self, member_data):
+        if member_data is None:
+            return
+        if not self.items:
+            self.member_list.clear()
+        item = self.items.get(member_data['name'])
+        if item:
+            item.setText(self.member_text(member_data))
+        elif not self.has_more or member_data['name'] < max(self.items):
+            # Members past the loaded pages arrive with the next page
+            names = sorted(self.items)
+            position = sum(1 for loaded_name in names if loaded_name < member_data['name'])
+            self.member_list.insertItem(position, self.member_item(member_data))
 
     def open_add_member(self):
-        self.add_member_form = MemberRegistrationForm(self.system)
+        self.add_member_form = MemberRegistrationForm(self.system, self)
         self.add_member_form.show()
@@ -1,23 +1,47 @@
 # app/member_menu.py
 
-from PyQt5.QtWidgets import QMainWindow, QVBoxLayout, QPushButton, QListWidget, QMessageBox, QWidget
+import os
+
+from PyQt5.QtWidgets import QMainWindow, QVBoxLayout, QHBoxLayout, QPushButton, QListWidget, QListWidgetItem, QMessageBox, QWidget, QLineEdit, QFileDialog
+from PyQt5.QtCore import Qt, QTimer
 from app.member_registration import MemberRegistrationForm
 from app.car import Car
 from app.member import Member
+from app.member_import import import_members, export_members
+from app.workers import TaskRunner
+
+# File dialog filter -> import/export format
+MEMBER_FILE_FILTERS = {"CSV (*.csv)": "csv", "JSON Lines (*.jsonl)": "jsonl"}
+
 class MemberMenu(QMainWindow):
     def __init__(self, system, main_window):
         super().__init__()
         self.system = system
         self.main_window = main_window  # Reference to the main window
+        self.page_size = 100  # Members fetched per page while scrolling
+        self.items = {}  # Member name -> list item, for updating single rows
+        self.has_more = False  # More members match the search than are loaded
+        self.runner = TaskRunner(self)  # Runs System calls off the GUI thread
+        self.runner.busy_changed.connect(self.show_loading)
+        self.runner.failed.connect(lambda message: QMessageBox.warning(self, "Database Error", message))
         self.initUI()
 
     def initUI(self):
         self.setWindowTitle("Member Menu")
         self.setGeometry(100, 100, 600, 400)
 
-        # List to display members
+        # Search box; the search runs on the server a moment after the operator stops typing
+        self.search_input = QLineEdit(self)
+        self.search_input.setPlaceholderText("Search by name, house number or plate")
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(300)
+        self.search_timer.timeout.connect(self.populate_member_list)
+        self.search_input.textChanged.connect(self.search_timer.start)
+
+        # List to display members; further pages load when scrolled to the bottom
         self.member_list = QListWidget(self)
-        self.populate_member_list()
+        self.member_list.verticalScrollBar().valueChanged.connect(self.scrolled)
 
         # Buttons for adding, editing, deleting, and going back to the main menu
         add_member_button = QPushButton("Add Member", self)
@@ -29,32 +53,105 @@ class MemberMenu(QMainWindow):
         delete_member_button = QPushButton("Delete Member", self)
         delete_member_button.clicked.connect(self.delete_selected_member)
 
+        import_button = QPushButton("Import Members...", self)
+        import_button.clicked.connect(self.import_members)
+
+        export_button = QPushButton("Export Members...", self)
+        export_button.clicked.connect(self.export_members)
+
         back_button = QPushButton("Back to Main Menu", self)
         back_button.clicked.connect(self.go_back_to_main_menu)
 
         # Layout
         layout = QVBoxLayout()
+        layout.addWidget(self.search_input)
         layout.addWidget(self.member_list)
         layout.addWidget(add_member_button)
         layout.addWidget(edit_member_button)
         layout.addWidget(delete_member_button)
+        file_layout = QHBoxLayout()
+        file_layout.addWidget(import_button)
+        file_layout.addWidget(export_button)
+        layout.addLayout(file_layout)
         layout.addWidget(back_button)
 
         container = QWidget()
         container.setLayout(layout)
         self.setCentralWidget(container)
 
+    def showEvent(self, event):
+        """Load the members each time the menu is shown, not when it is built."""
+        super().showEvent(event)
+        if not event.spontaneous():  # Not when un-minimized
+            self.populate_member_list()
+
     def populate_member_list(self):
-        """Populate the list of members in real-time"""
-        self.member_list.clear()
-        members = self.system.get_all_members()
-        if not members:
+        """Load the first page of members matching the search"""
+        self.runner.submit(self.system.search_members, self.search_input.text().strip(), None, self.page_size,
+                           key="members", on_result=self.show_members)
+
+    def load_more_members(self):
+        """Load the next page of members matching the search"""
+        if self.has_more and not self.runner.is_busy():
+            last_name = self.member_list.item(self.member_list.count() - 1).data(Qt.UserRole)
+            self.runner.submit(self.system.search_members, self.search_input.text().strip(), last_name, self.page_size,
+                               key="members", on_result=lambda members: self.show_members(members, append=True))
+
+    def scrolled(self, value):
+        if value == self.member_list.verticalScrollBar().maximum():
+            self.load_more_members()
+
+    def show_members(self, members, append=False):
+        """Fill the list with the fetched members."""
+        if not append:
+            self.member_list.clear()
+            self.items = {}
+        self.has_more = len(members) == self.page_size
+        for member_data in members:
+            item = QListWidgetItem(self.member_text(member_data))
+            item.setData(Qt.UserRole, member_data['name'])
+            self.member_list.addItem(item)
+            self.items[member_data['name']] = item
+        if not self.items:
+            self.member_list.addItem("No members available")
+
+    @staticmethod
+    def member_text(member_data):
+        car_info = ', '.join([car['plate_number'] for car in member_data.get('cars', [])])  # Extract car plate numbers
+        return f"{member_data['name']} - {member_data['house_number']} - {car_info}"
+
+    def member_saved(self, name):
+        """Refresh a single member's row after it was added or edited"""
+        self.runner.submit(self.system.get_member_summary, name, on_result=lambda member_data: self.update_member_item(name, member_data))
+
+    def update_member_item(self, name, member_data):
+        """Update, insert or remove one member's row without reloading the list"""
+        item = self.items.get(name)
+        if member_data is None:
+            if item:
+                self.remove_member_item(name)
+            return
+        if item:
+            item.setText(self.member_text(member_data))
+            return
+        # Insert in name order among the loaded rows; rows past the loaded pages arrive with the next page
+        if not self.items:
+            self.member_list.clear()
+        names = sorted(self.items)
+        position = sum(1 for loaded_name in names if loaded_name < name)
+        if position == len(names) and self.has_more:
+            return
+        item = QListWidgetItem(self.member_text(member_data))
+        item.setData(Qt.UserRole, name)
+        self.member_list.insertItem(position, item)
+        self.items[name] = item
+
+    def remove_member_item(self, name):
+        item = self.items.pop(name, None)
+        if item:
+            self.member_list.takeItem(self.member_list.row(item))
+        if not self.items:
             self.member_list.addItem("No members available")
-        else:
-            # Access Member attributes directly instead of treating them as a dictionary
-            for member in members:
-                car_info = ', '.join([car.plate_number for car in member.cars])  # Extract car plate numbers
-                self.member_list.addItem(f"{member.name} - {member.house_number} - {car_info}")
 
     def open_add_member(self):
         """Open the Add Member form"""
@@ -66,37 +163,71 @@ class MemberMenu(QMainWindow):
     def edit_selected_member(self):
         """Edit the selected member"""
         selected_item = self.member_list.currentItem()
-        if selected_item and selected_item.text() != "No members available":
-            member_info = selected_item.text().split(" - ")
-            member_name = member_info[0]
-            member_data = self.system.get_member_by_name(member_name)
-
-            if member_data:
-                # Convert the MongoDB result back into a Member object
-                cars = [Car(car['brand'], car['plate_number']) for car in member_data['cars']]
-                member = Member(
-                    name=member_data['name'],
-                    house_number=member_data['house_number'],
-                    cars=cars,
-                    member_type=member_data['type']
-                )
-
-                # Populate the form with the member data
-                self.edit_member_form = MemberRegistrationForm(self.system, self)
-                self.edit_member_form.populate_form(member)
-                self.edit_member_form.show()
+        if selected_item and selected_item.data(Qt.UserRole):
+            member_name = selected_item.data(Qt.UserRole)
+            self.runner.submit(self.system.get_member_by_name, member_name, on_result=self.open_edit_member)
+
+    def open_edit_member(self, member_data):
+        """Open the edit form for a fetched member."""
+        if member_data:
+            # Convert the MongoDB result back into a Member object
+            cars = [Car(car['brand'], car['plate_number']) for car in member_data['cars']]
+            member = Member(
+                name=member_data['name'],
+                house_number=member_data['house_number'],
+                cars=cars,
+                member_type=member_data['type']
+            )
+
+            # Populate the form with the member data
+            self.edit_member_form = MemberRegistrationForm(self.system, self)
+            self.edit_member_form.populate_form(member)
+            self.edit_member_form.show()
 
 
     def delete_selected_member(self):
         """Delete the selected member"""
         selected_item = self.member_list.currentItem()
-        if selected_item and selected_item.text() != "No members available":
-            member_info = selected_item.text().split(" - ")
-            member_name = member_info[0]
+        if selected_item and selected_item.data(Qt.UserRole):
+            member_name = selected_item.data(Qt.UserRole)
             reply = QMessageBox.question(self, "Delete Member", f"Are you sure you want to delete {member_name}?", QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
             if reply == QMessageBox.Yes:
-                self.system.delete_member_by_name(member_name)
-                self.populate_member_list()  # Refresh the list after deletion
+                # Drop the row after deletion instead of reloading the list
+                self.runner.submit(self.system.delete_member_by_name, member_name, on_result=lambda _: self.remove_member_item(member_name))
+
+    def import_members(self):
+        """Import members from a CSV or JSON Lines file and report the rows that were rejected."""
+        path, selected_filter = QFileDialog.getOpenFileName(self, "Import Members", "", ";;".join(MEMBER_FILE_FILTERS))
+        if path:
+            self.runner.submit(import_members, self.system, path, MEMBER_FILE_FILTERS[selected_filter],
+                               on_result=lambda report: self.finish_import(path, report))
+
+    def finish_import(self, path, report):
+        """Reload the list and summarize the import, writing rejected rows next to the imported file."""
+        self.populate_member_list()
+        message = f"{report.inserted} members added, {report.updated} updated."
+        if report.errors:
+            errors_path = os.path.splitext(path)[0] + ".errors.csv"
+            report.write_errors(errors_path)
+            message += f"\n{len(report.errors)} rows were rejected; see {errors_path}."
+        QMessageBox.information(self, "Import Complete", message)
+
+    def export_members(self):
+        """Export every member to a file the import reads back."""
+        path, selected_filter = QFileDialog.getSaveFileName(self, "Export Members", "", ";;".join(MEMBER_FILE_FILTERS))
+        if path:
+            file_format = MEMBER_FILE_FILTERS[selected_filter]
+            if not path.endswith("." + file_format):
+                path += "." + file_format
+            self.runner.submit(export_members, self.system, path, file_format,
+                               on_result=lambda written: QMessageBox.information(self, "Export Complete", f"Exported {written} members to {path}."))
+
+    def show_loading(self, busy):
+        """Show a loading message while database calls are in flight."""
+        if busy:
+            self.statusBar().showMessage("Loading...")
+        else:
+            self.statusBar().clearMessage()
 
     def go_back_to_main_menu(self):
         """Return to the Main Menu"""
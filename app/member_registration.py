@@ -2,7 +2,8 @@
 
 from PyQt5.QtWidgets import QMainWindow, QLabel, QLineEdit, QPushButton, QVBoxLayout, QHBoxLayout, QWidget, QMessageBox
 from app.member import Member
-from app.car import Car
+from app.car import Car, normalize_plate
+from app.workers import TaskRunner
 
 class MemberRegistrationForm(QMainWindow):
     def __init__(self, system, member_menu):
@@ -11,6 +12,8 @@ class MemberRegistrationForm(QMainWindow):
         self.member_menu = member_menu  # Reference to the member menu for real-time refresh
         self.editing_member = None  # Track if editing an existing member
         self.car_inputs = []  # List to track car input fields (brand_input, plate_input, car_layout)
+        self.runner = TaskRunner(self)  # Runs System calls off the GUI thread
+        self.runner.failed.connect(lambda message: QMessageBox.warning(self, "Database Error", message))
         self.initUI()
 
     def initUI(self):
@@ -45,9 +48,10 @@ class MemberRegistrationForm(QMainWindow):
         self.layout.addWidget(add_car_button)
 
         # Register Button
-        register_button = QPushButton("Register", self)
-        register_button.clicked.connect(self.register_member)
-        self.layout.addWidget(register_button)
+        self.register_button = QPushButton("Register", self)
+        self.register_button.clicked.connect(self.register_member)
+        self.runner.busy_changed.connect(lambda busy: self.register_button.setEnabled(not busy))
+        self.layout.addWidget(self.register_button)
 
         # Set the layout to the central widget
         container = QWidget()
@@ -122,19 +126,25 @@ class MemberRegistrationForm(QMainWindow):
             car_brand = brand_input.text()
             plate_number = plate_input.text()
             if car_brand and plate_number:
-                cars.append(Car(car_brand, plate_number))
+                try:
+                    cars.append(Car(car_brand, normalize_plate(plate_number)))
+                except ValueError as e:
+                    QMessageBox.warning(self, "Input Error", f"Not a license plate: {e}.")
+                    return
 
         if self.editing_member:
             # Edit existing member's cars
-            self.system.update_member_cars(self.editing_member.name, [{"brand": car.brand, "plate_number": car.plate_number} for car in cars])
-            QMessageBox.information(self, "Member Updated", f"Member {name}'s information was updated.")
+            self.runner.submit(self.system.update_member_cars, self.editing_member.name, [{"brand": car.brand, "plate_number": car.plate_number} for car in cars],
+                               on_result=lambda _: self.finish_registration("Member Updated", f"Member {name}'s information was updated."))
 
         else:
             # Add a new member
             new_member = Member(name, house_number, cars)
-            self.system.add_member(new_member)
-            QMessageBox.information(self, "Member Registered", f"New member {name} was successfully registered.")
+            self.runner.submit(self.system.add_member, new_member,
+                               on_result=lambda _: self.finish_registration("Member Registered", f"New member {name} was successfully registered."))
 
-        # Refresh the member list in the MemberMenu and close the form
-        self.member_menu.populate_member_list()
+    def finish_registration(self, title, message):
+        """Confirm the stored change, refresh the member's row in the MemberMenu and close the form."""
+        QMessageBox.information(self, title, message)
+        self.member_menu.member_saved(self.editing_member.name if self.editing_member else self.name_input.text())
         self.close()
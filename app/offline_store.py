@@ -0,0 +1,169 @@
+# app/offline_store.py
+
+import os
+import sqlite3
+import threading
+
+from bson import json_util
+from pymongo.errors import PyMongoError
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS members (name TEXT PRIMARY KEY, document TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS member_plates (plate_number TEXT NOT NULL, name TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS member_plates_plate ON member_plates (plate_number);
+CREATE TABLE IF NOT EXISTS staff (name TEXT PRIMARY KEY, active INTEGER NOT NULL, document TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS presence (plate_number TEXT PRIMARY KEY, document TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS pending_logs (seq INTEGER PRIMARY KEY AUTOINCREMENT, document TEXT NOT NULL,
+                                         presence_applied INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE IF NOT EXISTS conflicts (seq INTEGER PRIMARY KEY AUTOINCREMENT, reason TEXT NOT NULL, document TEXT NOT NULL);
+"""
+
+
+def _dumps(document):
+    return json_util.dumps(document, json_options=json_util.CANONICAL_JSON_OPTIONS)
+
+
+class OfflineStore:
+    """Local SQLite replica of members, staff and presence, plus the logs written while MongoDB was unreachable."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Shared by the GUI worker threads and the connection monitor, so access is serialized
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        # Stores created before presence_applied existed
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(pending_logs)")}
+        if "presence_applied" not in columns:
+            self.connection.execute("ALTER TABLE pending_logs ADD COLUMN presence_applied INTEGER NOT NULL DEFAULT 0")
+
+    # --- Replication ---
+    def replace_members(self, members):
+        """Replace the local member replica with the given member documents."""
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM members")
+            self.connection.execute("DELETE FROM member_plates")
+            for member_data in members:
+                self.connection.execute("INSERT OR REPLACE INTO members VALUES (?, ?)", (member_data["name"], _dumps(member_data)))
+                self.connection.executemany("INSERT INTO member_plates VALUES (?, ?)",
+                                            [(car["plate_number"], member_data["name"]) for car in member_data.get("cars", [])])
+
+    def replace_staff(self, staff_list, active_staff_id):
+        """Replace the local staff replica with the given staff documents, marking the one on shift at this gate."""
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM staff")
+            self.connection.executemany("INSERT OR REPLACE INTO staff VALUES (?, ?, ?)",
+                                        [(staff_data["name"], int(staff_data["_id"] == active_staff_id), _dumps(staff_data)) for staff_data in staff_list])
+
+    def replace_presence(self, presence_list):
+        """Replace the local presence replica with the given presence documents."""
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM presence")
+            self.connection.executemany("INSERT INTO presence VALUES (?, ?)",
+                                        [(presence["plate_number"], _dumps(presence)) for presence in presence_list])
+
+    # --- Lookups ---
+    def _fetch_document(self, query, params):
+        with self.lock:
+            row = self.connection.execute(query, params).fetchone()
+        return json_util.loads(row[0]) if row else None
+
+    def get_member_by_plate(self, plate_number):
+        return self._fetch_document(
+            "SELECT members.document FROM member_plates JOIN members ON members.name = member_plates.name "
+            "WHERE member_plates.plate_number = ? LIMIT 1", (plate_number,))
+
+    def get_active_staff(self):
+        return self._fetch_document("SELECT document FROM staff WHERE active = 1 LIMIT 1", ())
+
+    def get_presence(self, plate_number):
+        return self._fetch_document("SELECT document FROM presence WHERE plate_number = ?", (plate_number,))
+
+    # --- Local writes ---
+    def set_presence(self, plate_number, presence):
+        """Record a car as inside, or as outside when presence is None."""
+        with self.lock, self.connection:
+            if presence is None:
+                self.connection.execute("DELETE FROM presence WHERE plate_number = ?", (plate_number,))
+            else:
+                self.connection.execute("INSERT OR REPLACE INTO presence VALUES (?, ?)", (plate_number, _dumps(presence)))
+
+    def queue_log(self, log_data, presence_applied=False):
+        """Keep a log entry written while offline until it can be reconciled.
+
+        presence_applied marks an entry whose presence change already reached MongoDB.
+        """
+        with self.lock, self.connection:
+            self.connection.execute("INSERT INTO pending_logs (document, presence_applied) VALUES (?, ?)",
+                                    (_dumps(log_data), int(presence_applied)))
+
+    def pending_logs(self):
+        """Return (seq, log_data, presence_applied) for every queued log entry, oldest first."""
+        with self.lock:
+            rows = self.connection.execute("SELECT seq, document, presence_applied FROM pending_logs ORDER BY seq").fetchall()
+        return [(seq, json_util.loads(document), bool(presence_applied)) for seq, document, presence_applied in rows]
+
+    def remove_pending_log(self, seq):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM pending_logs WHERE seq = ?", (seq,))
+
+    def pending_log_count(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM pending_logs").fetchone()[0]
+
+    def record_conflict(self, reason, log_data):
+        """Remember an offline entry that disagreed with the state another gate left in MongoDB."""
+        with self.lock, self.connection:
+            self.connection.execute("INSERT INTO conflicts (reason, document) VALUES (?, ?)", (reason, _dumps(log_data)))
+
+    def conflicts(self):
+        with self.lock:
+            rows = self.connection.execute("SELECT reason, document FROM conflicts ORDER BY seq").fetchall()
+        return [(reason, json_util.loads(document)) for reason, document in rows]
+
+    def clear_conflicts(self):
+        """Forget the recorded conflicts, once they have been looked into."""
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM conflicts")
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class ConnectionMonitor(threading.Thread):
+    """Ping MongoDB in the background, switching System between online and offline and reconciling on reconnect."""
+
+    def __init__(self, system, interval=5.0, refresh_interval=300.0):
+        super().__init__(daemon=True, name="connection-monitor")
+        self.system = system
+        self.interval = interval
+        self.refresh_interval = refresh_interval  # Seconds between replica refreshes while online
+        self.stopping = threading.Event()
+
+    def run(self):
+        since_refresh = self.refresh_interval  # Refresh the replica on the first successful ping
+        while not self.stopping.is_set():
+            try:
+                if self.system.ping():
+                    if self.system.offline or self.system.offline_store.pending_log_count():
+                        self.system.reconcile_offline_logs()
+                        since_refresh = self.refresh_interval
+                    if since_refresh >= self.refresh_interval:
+                        self.system.sync_offline_store()
+                        since_refresh = 0
+                    self.system.offline = False
+                else:
+                    self.system.offline = True
+            except PyMongoError:
+                self.system.offline = True  # Lost the connection halfway; try again on the next pass
+            self.stopping.wait(self.interval)
+            since_refresh += self.interval
+
+    def stop(self):
+        self.stopping.set()
+        if self.is_alive():
+            self.join()
@@ -0,0 +1,285 @@
+# app/plate_index.py
+
+import os
+import struct
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.plate_snapshot import PlateSnapshot, write_snapshot
+
+# Fields of a member document the gate needs to decide on a plate
+MEMBER_PROJECTION = {"name": 1, "house_number": 1, "type": 1, "cars": 1, "updated_at": 1}
+
+# Deletion tombstones expire after a day (see app/indexes.py); a snapshot older than this
+# may have missed deletions, so it only serves lookups until a full load replaces it
+TOMBSTONE_RETENTION = timedelta(hours=23)
+
+# Polls re-read this far behind their watermarks, for writes stamped just before a poll ran
+# that only became visible after it, and for small differences between server clocks
+POLL_OVERLAP = timedelta(seconds=5)
+
+
+def _utc_now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)  # Naive UTC, as pymongo returns dates
+
+
+def _deep_size(value):
+    """Approximate the memory held by a document, including its nested values."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_size(key) + _deep_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_deep_size(item) for item in value)
+    return size
+
+
+class PlateIndex(threading.Thread):
+    """In-process plate -> member map, so resolving a member's plate needs no network hop.
+
+    Loaded from MongoDB when the thread starts, then kept current from a change stream on
+    members. Standalone servers have no change streams, so the index falls back to polling
+    members by their updated_at watermark and the member_deletions tombstones. Both are
+    stamped with the server's clock, and the index measures its offset from that clock,
+    so terminals whose own clocks drift cannot fall behind the watermark.
+
+    At most max_plates plates are held. Once that is reached the index stops being complete
+    and lookups it cannot answer go back to MongoDB.
+
+    With snapshot_path, the index is saved to disk after each full load and on stop. On the
+    next start the snapshot answers lookups straight away, while the changes made since its
+    watermarks are applied on top of it.
+    """
+
+    def __init__(self, members_collection, deletions_collection, max_plates=200000, poll_interval=1.0, use_change_stream=True, snapshot_path=None):
+        super().__init__(daemon=True, name="plate-index")
+        self.members_collection = members_collection
+        self.deletions_collection = deletions_collection
+        self.max_plates = max_plates
+        self.poll_interval = poll_interval
+        self.use_change_stream = use_change_stream
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.members = {}  # Member _id -> projected member document
+        self.plates = {}  # Plate number -> member _id
+        self.ready = False  # Set once the initial load has finished
+        self.complete = True  # False once max_plates was reached and some plates were left out
+        self.watermark = None  # Newest updated_at applied
+        self.deletion_watermark = None  # Newest deleted_at applied
+        self.mode = "loading"
+        self.snapshot_path = snapshot_path
+        self.snapshot = None  # PlateSnapshot answering lookups the in-memory maps have not replaced
+        self.removed = set()  # _ids of members deleted since the snapshot was written
+        self.snapshot_stale = False  # The snapshot predates the tombstones; reload rather than catch up
+        self.synced_at = None  # When the index was last known to hold every change and deletion
+        self.clock_offset = None  # Server clock minus this terminal's clock, measured on connecting
+        self.polled = {}  # Member _id -> updated_at, and tombstone _id -> deleted_at, seen inside the overlap
+        self.open_snapshot()
+
+    # --- Lookups ---
+    def lookup(self, plate_number):
+        """Return (known, member). known is False when the index cannot answer and MongoDB must be asked."""
+        if not self.ready:
+            return False, None
+        with self.lock:
+            member_id = self.plates.get(plate_number)
+            if member_id is not None:
+                return True, self.members[member_id]
+            if self.snapshot is not None:
+                member_data = self.snapshot.lookup(plate_number)
+                # A member changed or deleted since the snapshot is answered from the maps above
+                if member_data is not None and member_data["_id"] not in self.members and member_data["_id"] not in self.removed:
+                    return True, member_data
+            return self.complete, None
+
+    def stats(self, approx_size=True):
+        """Report the size of the index and how it is kept current.
+
+        approx_size walks every held document; leave it off for stats read on a timer.
+        """
+        with self.lock:
+            approx_bytes = _deep_size(self.members) + _deep_size(self.plates) if approx_size else None
+            return {
+                "members": len(self.members),
+                "plates": len(self.plates),
+                "max_plates": self.max_plates,
+                "complete": self.complete,
+                "approx_bytes": approx_bytes,
+                "mode": self.mode,
+                "watermark": self.watermark,
+                "ready": self.ready,
+                # Seconds since the index was last known to hold every change, by the server's clock
+                "sync_age": (self.server_now() - self.synced_at).total_seconds() if self.synced_at else None,
+                "snapshot_plates": self.snapshot.plate_count if self.snapshot else None,
+                "snapshot_written_at": self.snapshot.written_at if self.snapshot else None
+            }
+
+    # --- Maintenance ---
+    def _apply(self, member_data):
+        with self.lock:
+            self._remove(member_data["_id"])
+            plates = [car["plate_number"] for car in member_data.get("cars", [])]
+            if len(self.plates) + len(plates) > self.max_plates:
+                self.complete = False
+                return
+            self.members[member_data["_id"]] = member_data
+            for plate_number in plates:
+                self.plates[plate_number] = member_data["_id"]
+            updated_at = member_data.get("updated_at")
+            if updated_at and (self.watermark is None or updated_at > self.watermark):
+                self.watermark = updated_at
+
+    def _remove(self, member_id):
+        if self.snapshot is not None:
+            self.removed.add(member_id)
+        member_data = self.members.pop(member_id, None)
+        if member_data:
+            for car in member_data.get("cars", []):
+                if self.plates.get(car["plate_number"]) == member_id:
+                    del self.plates[car["plate_number"]]
+
+    def remove(self, member_id):
+        with self.lock:
+            self._remove(member_id)
+
+    def load(self):
+        """Load every member from MongoDB."""
+        started_at = self.server_now()
+        with self.lock:
+            self.members = {}
+            self.plates = {}
+            self.complete = True
+        for member_data in self.members_collection.find({}, MEMBER_PROJECTION):
+            self._apply(member_data)
+        if self.deletion_watermark is None:
+            self.deletion_watermark = started_at
+        self.synced_at = started_at
+        with self.lock:
+            self._close_snapshot()  # Everything it held has just been reloaded
+        self.ready = True
+        self.save_snapshot()
+
+    # --- Snapshot ---
+    def open_snapshot(self):
+        """Serve lookups from the snapshot on disk, if there is one, until MongoDB has been heard from."""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            snapshot = PlateSnapshot(self.snapshot_path)
+        except (OSError, ValueError, struct.error):
+            return  # Unreadable; the full load writes a new one
+        self.snapshot = snapshot
+        self.complete = snapshot.complete
+        self.watermark = snapshot.watermark
+        self.deletion_watermark = snapshot.deletion_watermark
+        # The deletions since the snapshot can only be caught up on while their tombstones last
+        self.snapshot_stale = self.deletion_watermark is None or _utc_now() - self.deletion_watermark >= TOMBSTONE_RETENTION
+        self.mode = "snapshot"
+        self.ready = True
+
+    def save_snapshot(self):
+        """Write the index to snapshot_path; the in-memory maps take precedence over the current snapshot."""
+        if not self.snapshot_path:
+            return
+        with self.lock:
+            members = dict(self.members)
+            if self.snapshot is not None:
+                for member_data in self.snapshot.members():
+                    if member_data["_id"] not in members and member_data["_id"] not in self.removed:
+                        members[member_data["_id"]] = member_data
+            watermark, complete = self.watermark, self.complete
+            deletion_watermark = max(filter(None, (self.deletion_watermark, self.synced_at)), default=None)
+        try:
+            write_snapshot(self.snapshot_path, members.values(), watermark, deletion_watermark, complete)
+        except OSError:
+            pass  # The next start does a full load instead
+
+    def _close_snapshot(self):
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
+            self.removed = set()
+
+    # --- Server clock ---
+    def measure_clock(self):
+        """Measure how far the server's clock, which stamps updated_at and deleted_at, is from this terminal's."""
+        asked_at = _utc_now()
+        server_time = self.members_collection.database.command("hello")["localTime"]
+        self.clock_offset = server_time - (asked_at + (_utc_now() - asked_at) / 2)
+
+    def server_now(self):
+        """The server's current time, estimated from the measured clock offset."""
+        return _utc_now() + (self.clock_offset or timedelta(0))
+
+    def poll(self):
+        """Apply member changes and deletions made since the watermarks, minus the overlap window."""
+        started_at = self.server_now()
+        query = {"updated_at": {"$gte": self.watermark - POLL_OVERLAP}} if self.watermark else {"updated_at": {"$exists": True}}
+        polled = {}
+        for member_data in self.members_collection.find(query, MEMBER_PROJECTION):
+            polled[member_data["_id"]] = member_data.get("updated_at")
+            if self.polled.get(member_data["_id"]) != polled[member_data["_id"]]:  # Not already applied by the last poll
+                self._apply(member_data)
+        for deletion in self.deletions_collection.find({"deleted_at": {"$gte": self.deletion_watermark - POLL_OVERLAP}}):
+            polled[deletion["_id"]] = deletion["deleted_at"]
+            if deletion["_id"] not in self.polled:
+                self.remove(deletion["member_id"])
+            self.deletion_watermark = max(self.deletion_watermark, deletion["deleted_at"])
+        self.polled = polled
+        self.synced_at = started_at
+
+    def run(self):
+        while not self.stopping.is_set():
+            try:
+                if self.clock_offset is None:
+                    self.measure_clock()
+                if self.mode == "snapshot":
+                    if self.snapshot_stale:
+                        self.load()  # The snapshot keeps answering while the reload runs
+                    else:
+                        self.poll()  # Catch up from the snapshot's watermarks before watching
+                    self.mode = "caught up"
+                if not self.ready:
+                    self.load()
+                if self.use_change_stream:
+                    self._watch()
+                else:
+                    self.mode = "polling"
+                    self.poll()
+                    self.stopping.wait(self.poll_interval)
+            except OperationFailure:
+                # Change streams need a replica set; poll the updated_at watermark instead
+                self.use_change_stream = False
+            except PyMongoError:
+                if self.mode != "snapshot":
+                    self.ready = False  # Missed changes while disconnected; reload once MongoDB is back
+                # Otherwise the snapshot keeps answering until MongoDB can be caught up from
+                self.stopping.wait(self.poll_interval)
+
+    def _watch(self):
+        with self.members_collection.watch(full_document="updateLookup", max_await_time_ms=int(self.poll_interval * 1000)) as stream:
+            self.mode = "change stream"
+            while not self.stopping.is_set() and stream.alive:
+                asked_at = self.server_now()
+                change = stream.try_next()
+                if change is None:
+                    self.synced_at = asked_at  # Nothing pending: every change up to then is applied
+                    continue
+                if change["operationType"] == "delete":
+                    self.remove(change["documentKey"]["_id"])
+                elif change.get("fullDocument"):
+                    self._apply({key: change["fullDocument"].get(key) for key in ("_id", *MEMBER_PROJECTION) if key in change["fullDocument"]})
+                elif change["operationType"] in ("drop", "rename", "invalidate"):
+                    self.ready = False
+                    return
+
+    def stop(self):
+        self.stopping.set()
+        if self.is_alive():
+            self.join()
+        if self.ready and self.mode != "snapshot":
+            self.save_snapshot()  # Only once caught up, so the watermarks match the contents
+        with self.lock:
+            self._close_snapshot()
@@ -0,0 +1,129 @@
+# app/plate_snapshot.py
+
+import mmap
+import os
+import struct
+from datetime import datetime, timedelta
+
+import bson
+
+# On-disk copy of the plate index, so a restarted terminal can answer plate lookups before
+# it has heard from MongoDB. Layout, little-endian:
+#   header   magic, version, flags, plate count, member count, watermark, deletion watermark
+#   index    one fixed-size entry per plate, sorted by plate bytes:
+#            (plate offset, plate length, member offset, member length) into the data area
+#   data     the plates (UTF-8) followed by each member document once, BSON-encoded
+# The file is memory-mapped and searched in place; only the member found is decoded.
+
+MAGIC = b"VGPS"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIqq")
+ENTRY = struct.Struct("<IHII")
+COMPLETE = 1  # Flag: every member plate is in the snapshot
+EPOCH = datetime(1970, 1, 1)
+
+
+def _to_micros(value):
+    return -1 if value is None else (value - EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(value):
+    return None if value < 0 else EPOCH + timedelta(microseconds=value)
+
+
+def write_snapshot(path, members, watermark, deletion_watermark, complete=True):
+    """Write the member documents and their plates to path, replacing any earlier snapshot in one step."""
+    data = bytearray()
+    entries = []  # (plate bytes, member offset, member length)
+    member_count = 0
+    for member_data in members:
+        encoded = bson.encode(member_data)
+        member_offset = len(data)
+        data += encoded
+        member_count += 1
+        for car in member_data.get("cars", []):
+            entries.append((car["plate_number"].encode("utf-8"), member_offset, len(encoded)))
+    entries.sort(key=lambda entry: entry[0])
+    # Plates go in front of the member documents, so member offsets shift by their total length
+    plates_length = sum(len(plate) for plate, _, _ in entries)
+    index = bytearray()
+    plates = bytearray()
+    for plate, member_offset, member_length in entries:
+        index += ENTRY.pack(len(plates), len(plate), plates_length + member_offset, member_length)
+        plates += plate
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path + ".part", "wb") as snapshot_file:
+        snapshot_file.write(HEADER.pack(MAGIC, VERSION, COMPLETE if complete else 0, len(entries), member_count,
+                                        _to_micros(watermark), _to_micros(deletion_watermark)))
+        snapshot_file.write(index)
+        snapshot_file.write(plates)
+        snapshot_file.write(data)
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+    os.replace(path + ".part", path)
+    return len(entries)
+
+
+class PlateSnapshot:
+    """Read-only, memory-mapped snapshot written by write_snapshot."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as snapshot_file:
+            self.map = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, flags, self.plate_count, self.member_count, watermark, deletion_watermark = HEADER.unpack_from(self.map, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a version {VERSION} plate snapshot.")
+            if len(self.map) < HEADER.size + self.plate_count * ENTRY.size:
+                raise ValueError(f"{path} is truncated.")
+        except (struct.error, ValueError):
+            self.map.close()
+            raise
+        self.complete = bool(flags & COMPLETE)
+        self.watermark = _from_micros(watermark)
+        self.deletion_watermark = _from_micros(deletion_watermark)
+        self.data_start = HEADER.size + self.plate_count * ENTRY.size
+        self.written_at = datetime.fromtimestamp(os.path.getmtime(path))
+
+    def _entry(self, position):
+        return ENTRY.unpack_from(self.map, HEADER.size + position * ENTRY.size)
+
+    def _plate(self, entry):
+        start = self.data_start + entry[0]
+        return self.map[start:start + entry[1]]
+
+    def _member(self, entry):
+        start = self.data_start + entry[2]
+        return bson.decode(self.map[start:start + entry[3]])
+
+    def lookup(self, plate_number):
+        """Binary-search the index for a plate and return its member document, or None."""
+        key = plate_number.encode("utf-8")
+        low, high = 0, self.plate_count
+        while low < high:
+            middle = (low + high) // 2
+            entry = self._entry(middle)
+            plate = self._plate(entry)
+            if plate < key:
+                low = middle + 1
+            elif plate > key:
+                high = middle
+            else:
+                return self._member(entry)
+        return None
+
+    def members(self):
+        """Yield every member document in the snapshot once."""
+        seen = set()
+        for position in range(self.plate_count):
+            entry = self._entry(position)
+            if entry[2] not in seen:
+                seen.add(entry[2])
+                yield self._member(entry)
+
+    def close(self):
+        self.map.close()
@@ -0,0 +1,90 @@
+# app/reports_window.py
+
+from PyQt5.QtWidgets import QMainWindow, QTableWidget, QTableWidgetItem, QVBoxLayout, QHBoxLayout, QPushButton, QWidget, QLabel, QComboBox, QDateTimeEdit, QMessageBox
+from PyQt5.QtCore import QDateTime
+from app.workers import TaskRunner
+
+# (label, System period) and (label, System dimension) for the report selectors
+PERIODS = [("Hourly", "hour"), ("Daily", "day"), ("Monthly", "month")]
+DIMENSIONS = [("Total", "total"), ("By Type", "type"), ("By House", "house"), ("By Staff", "staff")]
+PERIOD_FORMATS = {"hour": "%Y-%m-%d %H:00", "day": "%Y-%m-%d", "month": "%Y-%m"}
+
+class ReportsWindow(QMainWindow):
+    def __init__(self, system):
+        super().__init__()
+        self.system = system
+        self.runner = TaskRunner(self)  # Runs System calls off the GUI thread
+        self.runner.busy_changed.connect(self.show_loading)
+        self.runner.failed.connect(lambda message: QMessageBox.warning(self, "Database Error", message))
+        self.initUI()
+
+    def initUI(self):
+        self.setWindowTitle("Gate Traffic Reports")
+        self.setGeometry(100, 100, 700, 500)
+
+        # Report selectors
+        self.period_input = QComboBox(self)
+        self.period_input.addItems([label for label, _ in PERIODS])
+        self.period_input.setCurrentIndex(1)
+        self.dimension_input = QComboBox(self)
+        self.dimension_input.addItems([label for label, _ in DIMENSIONS])
+        self.start_input = QDateTimeEdit(QDateTime.currentDateTime().addDays(-30), self)
+        self.start_input.setCalendarPopup(True)
+        self.end_input = QDateTimeEdit(QDateTime.currentDateTime(), self)
+        self.end_input.setCalendarPopup(True)
+        show_button = QPushButton("Show Report", self)
+        show_button.clicked.connect(self.load_report)
+
+        selector_layout = QHBoxLayout()
+        selector_layout.addWidget(self.period_input)
+        selector_layout.addWidget(self.dimension_input)
+        selector_layout.addWidget(QLabel("From", self))
+        selector_layout.addWidget(self.start_input)
+        selector_layout.addWidget(QLabel("To", self))
+        selector_layout.addWidget(self.end_input)
+        selector_layout.addWidget(show_button)
+
+        # Report table
+        self.table = QTableWidget(0, 4, self)
+        self.table.setHorizontalHeaderLabels(["Period", "Key", "Entries", "Exits"])
+
+        # Totals over the whole report
+        self.total_label = QLabel("", self)
+
+        layout = QVBoxLayout()
+        layout.addLayout(selector_layout)
+        layout.addWidget(self.table)
+        layout.addWidget(self.total_label)
+
+        container = QWidget()
+        container.setLayout(layout)
+        self.setCentralWidget(container)
+
+        self.load_report()
+
+    def load_report(self):
+        """Fetch the selected report from the traffic rollups."""
+        period = PERIODS[self.period_input.currentIndex()][1]
+        dimension = DIMENSIONS[self.dimension_input.currentIndex()][1]
+        start = self.start_input.dateTime().toPyDateTime()
+        end = self.end_input.dateTime().toPyDateTime()
+        self.runner.submit(self.system.get_traffic_report, period, dimension, start, end, key="report",
+                           on_result=lambda rows: self.show_report(period, rows))
+
+    def show_report(self, period, rows):
+        """Fill the table with the report rows."""
+        self.table.setRowCount(len(rows))
+        for row_number, row in enumerate(rows):
+            values = [row["start"].strftime(PERIOD_FORMATS[period]), "" if row["key"] is None else str(row["key"]), str(row["entries"]), str(row["exits"])]
+            for column, value in enumerate(values):
+                self.table.setItem(row_number, column, QTableWidgetItem(value))
+        entries = sum(row["entries"] for row in rows)
+        exits = sum(row["exits"] for row in rows)
+        self.total_label.setText(f"{entries} entries, {exits} exits")
+
+    def show_loading(self, busy):
+        """Show a loading message while the report is being fetched."""
+        if busy:
+            self.statusBar().showMessage("Loading...")
+        else:
+            self.statusBar().clearMessage()
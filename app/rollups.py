@@ -0,0 +1,131 @@
+# app/rollups.py
+
+from collections import Counter
+from datetime import timedelta
+
+from pymongo import UpdateOne
+
+from app.log_schema import SCHEMA_VERSION, ACTION_CODES, ACTIONS, TYPES
+
+# Pre-aggregated gate traffic, one document per (period, dimension, start, key):
+#   {"period": "hour" | "day" | "all", "dimension": "total" | "type" | "house" | "staff",
+#    "start": start of the hour or day (None for "all"), "key": type, house number or staff _id,
+#    "entries": check-ins, "exits": check-outs}
+# Kept current as logs are written and rebuilt from the logs by the backfill. Hourly and
+# daily rollups are history for reports and outlive archived logs; the "all" rollups count
+# the logs still stored, for the log view's totals.
+PERIODS = ("hour", "day", "all")
+DIMENSIONS = ("total", "type", "house", "staff")
+
+# The backfill uses $dateTrunc and $ifNull with more than two arguments, added in MongoDB 5.0
+MIN_SERVER_VERSION = (5, 0)
+
+
+def period_start(timestamp, period):
+    """Truncate a timestamp to the start of its hour or day."""
+    if period == "all":
+        return None
+    if period == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _dimension_keys(document):
+    """(dimension, key) pairs a version 2 log document counts towards."""
+    return [
+        ("total", None),
+        ("type", TYPES.get(document["t"], document["t"])),
+        ("house", document["h"]),
+        ("staff", document.get("s", document.get("sn"))),
+    ]
+
+
+def rollup_updates(documents, periods=PERIODS, sign=1):
+    """Build the $inc upserts that add a batch of version 2 log documents to the rollups, or with sign=-1 take them out."""
+    counts = Counter()
+    for document in documents:
+        if document.get("v") != SCHEMA_VERSION:
+            continue  # Journaled before the compact schema; the backfill counts those
+        field = "entries" if document["a"] == ACTION_CODES["check-in"] else "exits"
+        for period in periods:
+            start = period_start(document["ts"], period)
+            for dimension, key in _dimension_keys(document):
+                counts[(period, dimension, start, key, field)] += sign
+    # One upsert per rollup document, however many logs of the batch fall into it
+    increments = {}
+    for (period, dimension, start, key, field), count in counts.items():
+        increments.setdefault((period, dimension, start, key), {})[field] = count
+    return [
+        UpdateOne({"period": period, "dimension": dimension, "start": start, "key": key}, {"$inc": fields}, upsert=True)
+        for (period, dimension, start, key), fields in increments.items()
+    ]
+
+
+def backfill_pipeline(dimension, output_collection):
+    """Aggregation that recounts the hourly rollups of one dimension from the logs into output_collection.
+
+    Handles both log schema versions, so it can run before migrate-logs. Needs MongoDB
+    MIN_SERVER_VERSION or later.
+    """
+    keys = {
+        "total": None,
+        "type": {"$ifNull": ["$t", "$type"]},
+        "house": {"$ifNull": ["$h", "$house_number"]},
+        "staff": {"$ifNull": ["$s", "$sn", "$staff._id", "$staff"]},
+    }
+    entry_actions = [ACTION_CODES["check-in"], ACTIONS[ACTION_CODES["check-in"]], "Check-in"]
+    return [
+        {"$project": {
+            "start": {"$dateTrunc": {"date": {"$ifNull": ["$ts", "$timestamp"]}, "unit": "hour"}},
+            "key": keys[dimension],
+            "entry": {"$in": [{"$ifNull": ["$a", "$action"]}, entry_actions]},
+        }},
+        {"$group": {
+            "_id": {"start": "$start", "key": "$key"},
+            "entries": {"$sum": {"$cond": ["$entry", 1, 0]}},
+            "exits": {"$sum": {"$cond": ["$entry", 0, 1]}},
+        }},
+        {"$project": {"_id": 0, "period": "hour", "dimension": dimension, "start": "$_id.start", "key": "$_id.key", "entries": 1, "exits": 1}},
+        {"$merge": {"into": output_collection, "on": ["period", "dimension", "start", "key"], "whenMatched": "replace"}},
+    ]
+
+
+def summary_pipeline(period, output_collection):
+    """Aggregation that sums the hourly rollups into daily ("day") or all-time ("all") ones."""
+    start = {"$dateTrunc": {"date": "$start", "unit": "day"}} if period == "day" else None
+    return [
+        {"$match": {"period": "hour"}},
+        {"$group": {
+            "_id": {"dimension": "$dimension", "start": start, "key": "$key"},
+            "entries": {"$sum": "$entries"},
+            "exits": {"$sum": "$exits"},
+        }},
+        {"$project": {"_id": 0, "period": period, "dimension": "$_id.dimension", "start": "$_id.start", "key": "$_id.key", "entries": 1, "exits": 1}},
+        {"$merge": {"into": output_collection, "on": ["period", "dimension", "start", "key"], "whenMatched": "replace"}},
+    ]
+
+
+def ceil_period(timestamp, period):
+    start = period_start(timestamp, period)
+    if start == timestamp:
+        return start
+    return start + (timedelta(hours=1) if period == "hour" else timedelta(days=1))
+
+
+def split_range(start, end):
+    """Cover [start, end] with whole days, whole hours and the partial hours at its edges.
+
+    Returns (days, hours, edges): the days and hours as [first, last) starts, the edges as
+    inclusive (start, end) ranges to be counted from the logs themselves.
+    """
+    first_hour, last_hour = ceil_period(start, "hour"), period_start(end, "hour")
+    if first_hour > last_hour:
+        return None, [], [(start, end)]  # Within a single hour
+    edges = []
+    if start < first_hour:
+        edges.append((start, first_hour - timedelta(microseconds=1)))
+    edges.append((last_hour, end))
+    first_day, last_day = ceil_period(first_hour, "day"), period_start(last_hour, "day")
+    if first_day >= last_day:
+        return None, [(first_hour, last_hour)], edges
+    return (first_day, last_day), [(first_hour, first_day), (last_day, last_hour)], edges
@@ -3,12 +3,16 @@
 from PyQt5.QtWidgets import QMainWindow, QVBoxLayout, QPushButton, QListWidget, QMessageBox, QWidget
 from app.staff_registration import StaffRegistrationForm
 from app.staff import Staff
+from app.workers import TaskRunner
 
 class StaffMenu(QMainWindow):
     def __init__(self, system, main_window):
         super().__init__()
         self.system = system
         self.main_window = main_window  # Reference to the main window
+        self.runner = TaskRunner(self)  # Runs System calls off the GUI thread
+        self.runner.busy_changed.connect(self.show_loading)
+        self.runner.failed.connect(lambda message: QMessageBox.warning(self, "Database Error", message))
         self.initUI()
 
     def initUI(self):
@@ -17,7 +21,6 @@ class StaffMenu(QMainWindow):
 
         # List to display staff members
         self.staff_list = QListWidget(self)
-        self.populate_staff_list()
 
         # Buttons for adding, editing, deleting, setting active, and going back to the main menu
         add_staff_button = QPushButton("Add Staff", self)
@@ -48,10 +51,19 @@ class StaffMenu(QMainWindow):
         container.setLayout(layout)
         self.setCentralWidget(container)
 
+    def showEvent(self, event):
+        """Load the staff each time the menu is shown, not when it is built."""
+        super().showEvent(event)
+        if not event.spontaneous():  # Not when un-minimized
+            self.populate_staff_list()
+
     def populate_staff_list(self):
         """Populate the list of staff members in real-time"""
+        self.runner.submit(self.system.get_all_staff, key="staff", on_result=self.show_staff)
+
+    def show_staff(self, staff_members):
+        """Fill the list with the fetched staff members."""
         self.staff_list.clear()
-        staff_members = self.system.get_all_staff()
         if not staff_members:
             self.staff_list.addItem("No staff members available")
         else:
@@ -70,15 +82,17 @@ class StaffMenu(QMainWindow):
         if selected_item and selected_item.text() != "No staff members available":
             staff_info = selected_item.text().split(" - ")
             staff_name = staff_info[0]
-            staff_data = self.system.get_staff_by_name(staff_name)
+            self.runner.submit(self.system.get_staff_by_name, staff_name, on_result=self.open_edit_staff)
 
-            if staff_data:
-                staff = Staff(name=staff_data['name'], phone_number=staff_data['phone_number'])
+    def open_edit_staff(self, staff_data):
+        """Open the edit form for a fetched staff member."""
+        if staff_data:
+            staff = Staff(name=staff_data['name'], phone_number=staff_data['phone_number'])
 
-                # Populate the form with the staff member data
-                self.edit_staff_form = StaffRegistrationForm(self.system, self)
-                self.edit_staff_form.populate_form(staff)
-                self.edit_staff_form.show()
+            # Populate the form with the staff member data
+            self.edit_staff_form = StaffRegistrationForm(self.system, self)
+            self.edit_staff_form.populate_form(staff)
+            self.edit_staff_form.show()
 
     def delete_selected_staff(self):
         """Delete the selected staff member"""
@@ -88,8 +102,8 @@ class StaffMenu(QMainWindow):
             staff_name = staff_info[0]
             reply = QMessageBox.question(self, "Delete Staff", f"Are you sure you want to delete {staff_name}?", QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
             if reply == QMessageBox.Yes:
-                self.system.delete_staff_by_name(staff_name)
-                self.populate_staff_list()  # Refresh the list after deletion
+                # Refresh the list after deletion
+                self.runner.submit(self.system.delete_staff_by_name, staff_name, on_result=lambda _: self.populate_staff_list())
 
     def set_active_staff(self):
         """Set the selected staff member as active"""
@@ -97,9 +111,19 @@ class StaffMenu(QMainWindow):
         if selected_item and selected_item.text() != "No staff members available":
             staff_info = selected_item.text().split(" - ")
             staff_name = staff_info[0]
-            self.system.set_active_staff(staff_name)
-            QMessageBox.information(self, "Active Staff", f"{staff_name} is now the active staff member.")
-            self.populate_staff_list()  # Refresh the list to show the active staff
+            self.runner.submit(self.system.set_active_staff, staff_name, on_result=lambda _: self.show_active_staff(staff_name))
+
+    def show_active_staff(self, staff_name):
+        """Confirm the shift change and refresh the list to show the active staff."""
+        QMessageBox.information(self, "Active Staff", f"{staff_name} is now the active staff member.")
+        self.populate_staff_list()
+
+    def show_loading(self, busy):
+        """Show a loading message while database calls are in flight."""
+        if busy:
+            self.statusBar().showMessage("Loading...")
+        else:
+            self.statusBar().clearMessage()
 
     def go_back_to_main_menu(self):
         """Return to the Main Menu"""
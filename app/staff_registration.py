@@ -2,6 +2,7 @@
 
 from PyQt5.QtWidgets import QMainWindow, QLabel, QLineEdit, QPushButton, QVBoxLayout, QWidget, QMessageBox
 from app.staff import Staff
+from app.workers import TaskRunner
 
 class StaffRegistrationForm(QMainWindow):
     def __init__(self, system, staff_menu):
@@ -9,6 +10,8 @@ class StaffRegistrationForm(QMainWindow):
         self.system = system
         self.staff_menu = staff_menu  # Reference to the staff menu for real-time refresh
         self.editing_staff = None  # Track if editing an existing staff member
+        self.runner = TaskRunner(self)  # Runs System calls off the GUI thread
+        self.runner.failed.connect(lambda message: QMessageBox.warning(self, "Database Error", message))
         self.initUI()
 
     def initUI(self):
@@ -23,8 +26,9 @@ class StaffRegistrationForm(QMainWindow):
         self.phone_input = QLineEdit(self)
 
         # Register Button
-        register_button = QPushButton("Register", self)
-        register_button.clicked.connect(self.register_staff)
+        self.register_button = QPushButton("Register", self)
+        self.register_button.clicked.connect(self.register_staff)
+        self.runner.busy_changed.connect(lambda busy: self.register_button.setEnabled(not busy))
 
         # Create the layout
         layout = QVBoxLayout()
@@ -36,7 +40,7 @@ class StaffRegistrationForm(QMainWindow):
         layout.addWidget(self.name_input)
         layout.addWidget(phone_label)
         layout.addWidget(self.phone_input)
-        layout.addWidget(register_button)
+        layout.addWidget(self.register_button)
 
         # Set the layout to the central widget
         container = QWidget()
@@ -57,14 +61,16 @@ class StaffRegistrationForm(QMainWindow):
         if self.editing_staff:
             # Edit existing staff
             updated_data = {"name": name, "phone_number": phone_number}
-            self.system.update_staff(self.editing_staff.name, updated_data)
-            QMessageBox.information(self, "Staff Updated", f"Staff {name}'s information was updated.")
+            self.runner.submit(self.system.update_staff, self.editing_staff.name, updated_data,
+                               on_result=lambda _: self.finish_registration("Staff Updated", f"Staff {name}'s information was updated."))
         else:
             # Add a new staff member
             new_staff = Staff(name, phone_number)
-            self.system.add_staff(new_staff)
-            QMessageBox.information(self, "Staff Registered", f"New staff {name} was successfully registered.")
+            self.runner.submit(self.system.add_staff, new_staff,
+                               on_result=lambda _: self.finish_registration("Staff Registered", f"New staff {name} was successfully registered."))
 
-        # Refresh the staff list in the StaffMenu and close the form
+    def finish_registration(self, title, message):
+        """Confirm the stored change, refresh the staff list in the StaffMenu and close the form."""
+        QMessageBox.information(self, title, message)
         self.staff_menu.populate_staff_list()
         self.close()
@@ -0,0 +1,81 @@
+# app/startup_profile.py
+
+import os
+import subprocess
+import sys
+import time
+
+# Start-up profiling: manage.py profile-startup runs main.py in a child process with
+# -X importtime and VILLAGE_STARTUP_PROFILE=1. main.py then writes FIRST_PAINT_MARKER to
+# stderr once the gate window has painted and exits, so the parent can time the whole
+# start-up and summarize the imports made before the window appeared.
+
+FIRST_PAINT_MARKER = "startup-profile: first paint"
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def report_first_paint(app, window):
+    """Write the first-paint marker and quit once window has painted."""
+    from PyQt5.QtCore import QObject, QEvent, QTimer
+
+    class FirstPaintFilter(QObject):
+        def eventFilter(self, watched, event):
+            if event.type() == QEvent.Paint:
+                window.removeEventFilter(self)
+                sys.stderr.write(FIRST_PAINT_MARKER + "\n")
+                sys.stderr.flush()
+                QTimer.singleShot(0, app.quit)
+            return False
+
+    window.first_paint_filter = FirstPaintFilter(window)
+    window.installEventFilter(window.first_paint_filter)
+
+
+def parse_importtime(lines):
+    """Turn -X importtime lines into (module, self seconds, cumulative seconds, depth) tuples."""
+    imports = []
+    for line in lines:
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        imports.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6, depth))
+    return imports
+
+
+def profile_startup(timeout=60.0, top=15, python=None):
+    """Start the gate in a child process and return the time to first paint and an import summary."""
+    env = dict(os.environ, VILLAGE_STARTUP_PROFILE="1")
+    if sys.platform.startswith("linux") and not env.get("DISPLAY") and not env.get("WAYLAND_DISPLAY"):
+        env.setdefault("QT_QPA_PLATFORM", "offscreen")  # Headless CI
+    started = time.perf_counter()
+    child = subprocess.Popen([python or sys.executable, "-X", "importtime", "main.py"], cwd=PROJECT_DIR, env=env,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    first_paint = None
+    before_paint = []
+    try:
+        # Read stderr as it comes, so the importtime output cannot fill the pipe and stall the child
+        for line in child.stderr:
+            if line.strip() == FIRST_PAINT_MARKER:
+                first_paint = time.perf_counter() - started
+                break
+            before_paint.append(line)
+            if time.perf_counter() - started > timeout:
+                break
+        for _ in child.stderr:
+            pass
+        child.wait(timeout=timeout)
+    finally:
+        if child.poll() is None:
+            child.kill()
+    imports = parse_importtime(before_paint)
+    top_level = [entry for entry in imports if entry[3] == 0]
+    return {
+        "first_paint_s": round(first_paint, 3) if first_paint is not None else None,
+        "exit_code": child.returncode,
+        "import_s": round(sum(entry[1] for entry in imports), 3),
+        "modules_imported": len(imports),
+        "slowest_imports": [{"module": name, "cumulative_ms": round(cumulative * 1000, 1)}
+                            for name, _, cumulative, _ in sorted(top_level, key=lambda entry: entry[2], reverse=True)[:top]],
+        "errors": [line.rstrip() for line in before_paint if not line.startswith("import time:")][-20:],
+    }
@@ -1,16 +1,259 @@
 # app/system.py
 
 from app.member import Member
-from app.car import Car
+from app.car import Car, normalize_plate, plate_key
 from app.staff import Staff
+from app.log_journal import LogJournal, LogFlusher
+from app.offline_store import OfflineStore, ConnectionMonitor
+from app.plate_index import PlateIndex
+from app.visit_compactor import VisitCompactor
+from app.log_partitions import LogPartitions, LogArchive, partition_name, partition_month, log_matches
+from app.indexes import INDEXES
+from app.instrumentation import Instrumentation, MetricsWriter
+from app.rollups import DIMENSIONS, rollup_updates, backfill_pipeline, summary_pipeline, split_range, period_start, ceil_period
+from app.log_schema import SCHEMA_VERSION, FIELDS, encode_log, decode_log, action_code, type_code
+from datetime import datetime, timedelta
+from bson import ObjectId
+import heapq
+import os
+import re
+import socket
+import pymongo
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError, PyMongoError
+
+class GateStateError(Exception):
+    """Raised when a check-in or check-out contradicts the car's current presence."""
+
+
+class AlreadyCheckedInError(GateStateError):
+    def __init__(self, plate_number):
+        super().__init__(f"{plate_number} is already checked in.")
+        self.plate_number = plate_number
+
+
+class NotCheckedInError(GateStateError):
+    def __init__(self, plate_number):
+        super().__init__(f"{plate_number} is not checked in.")
+        self.plate_number = plate_number
+
+
+class LogNotStoredError(Exception):
+    """Raised when a presence change was committed but its log entry could not be written."""
+
+    def __init__(self, error):
+        super().__init__(str(error))
+        self.error = error
+
 
 class System:
-    def __init__(self, db):
+    def __init__(self, db, gate_id=None):
         self.db = db
         # Define collections for both members and staff
         self.members_collection = self.db["members"]
         self.staff_collection = self.db["staff"]
+        # Logs live in monthly partitions (logs_YYYY_MM); "logs" holds history from before
+        # partitioning until partition_logs has moved it
         self.logs_collection = self.db["logs"]
+        self.log_partitions = LogPartitions(self.db)
+        self.log_archive = None  # Set by enable_log_archive
+        # One document per car currently inside, keyed by plate number
+        self.presence_collection = self.db["presence"]
+        # Tombstones of deleted members, so terminals polling for changes can drop them
+        self.member_deletions_collection = self.db["member_deletions"]
+        self.plate_index = None  # Set by enable_plate_index
+        # Which staff member is on shift at each gate terminal, one document per gate
+        self.gate_state_collection = self.db["gate_state"]
+        self.gate_id = gate_id or socket.gethostname()  # Gates must not share one, see GATE_ID in config/config.py
+        # Holds leases on shared jobs; unique per process, even for terminals sharing a gate_id
+        self.lease_holder = f"{socket.gethostname()}:{os.getpid()}"
+        self._active_staff = None  # Cached staff document of the staff member on shift here
+        self._active_staff_loaded = False
+        self._staff_names = None  # Staff _id -> name, loaded on first use
+        # Which format the stored logs are in (see migrate_logs)
+        self.schema_state_collection = self.db["schema_state"]
+        self._logs_migrated = False
+        self._logs_partitioned = False
+        # One document per finished stay, with its entry, exit and duration
+        self.visits_collection = self.db["visits"]
+        self.visit_compactor = None  # Set by enable_visit_compactor
+        # Hourly and daily entry/exit counts, see app/rollups.py
+        self.rollups_collection = self.db["traffic_rollups"]
+        self._rollups_complete = False
+        self.count_listeners = []  # Called with each log entry this process stores (see add_count_listener)
+        self.log_flusher = None  # Set by enable_write_behind
+        self.instrumentation = None  # Set by enable_instrumentation
+        self.metrics_writer = None
+        self.offline_store = None  # Set by enable_offline_mode
+        self.connection_monitor = None
+        self.offline = False  # True while MongoDB is unreachable and gate calls use the offline store
+        self.offline_timeout = 2.0  # Seconds a gate call waits for MongoDB before falling back to the offline store
+
+    def enable_write_behind(self, journal_path, batch_size=500, interval=1.0):
+        """Journal log entries locally and write them to MongoDB in batches from a background thread."""
+        self.log_flusher = LogFlusher(LogJournal(journal_path), self.log_partitions, batch_size, interval, self.rollups_collection)
+        self.log_flusher.start()
+
+    def get_log_queue_stats(self):
+        """Report the write-behind queue depth and flush latency, or None when logs are written directly."""
+        return self.log_flusher.stats() if self.log_flusher else None
+
+    def enable_offline_mode(self, store_path, check_interval=5.0, timeout=2.0):
+        """Keep a local replica for gate operations and fall back to it whenever MongoDB is unreachable."""
+        self.offline_store = OfflineStore(store_path)
+        self.offline_timeout = timeout
+        self.connection_monitor = ConnectionMonitor(self, check_interval)
+        self.connection_monitor.start()
+
+    def enable_plate_index(self, max_plates=200000, poll_interval=1.0, snapshot_path=None):
+        """Resolve member plates from an in-process index kept current from MongoDB.
+
+        With snapshot_path, the index is saved there and reopened on the next start, so
+        lookups are answered before MongoDB has been reached.
+        """
+        self.plate_index = PlateIndex(self.members_collection, self.member_deletions_collection, max_plates, poll_interval,
+                                      snapshot_path=snapshot_path)
+        self.plate_index.start()
+
+    def get_plate_index_stats(self, approx_size=True):
+        """Report the size and sync mode of the plate index, or None when it is disabled."""
+        return self.plate_index.stats(approx_size) if self.plate_index else None
+
+    def enable_log_archive(self, directory):
+        """Keep archived log partitions as files in directory (see archive_log_partitions)."""
+        self.log_archive = LogArchive(directory)
+
+    def enable_visit_compactor(self, interval=3600.0, batch_size=1000):
+        """Pair logs that have no visit yet into visits from a background thread."""
+        self.visit_compactor = VisitCompactor(self, interval, batch_size)
+        self.visit_compactor.start()
+
+    def enable_instrumentation(self, slow_threshold=0.2, slow_log_path=None, metrics_path=None, metrics_interval=15.0):
+        """Time every public System call, log the slow ones and, with metrics_path, keep a Prometheus metrics file current.
+
+        The slow-operation log and the metrics file are written every metrics_interval seconds.
+        """
+        self.instrumentation = Instrumentation(slow_threshold, slow_log_path, gate_id=self.gate_id)
+        self.instrumentation.instrument(self)
+        self.instrumentation.add_gauge_source(self._background_gauges)
+        if metrics_path or slow_log_path:
+            self.metrics_writer = MetricsWriter(self.instrumentation, metrics_path, metrics_interval)
+            self.metrics_writer.start()
+
+    def _background_gauges(self):
+        """Health of the write-behind queue and the plate index, for the metrics file."""
+        gauges = []
+        queue = self.get_log_queue_stats()
+        if queue:
+            gauges += [
+                ("log_queue_depth", "gauge", "Log entries journaled but not yet in MongoDB", queue["queue_depth"]),
+                ("log_queue_lag_seconds", "gauge", "Seconds journaled entries have been waiting for a flush", queue["flush_lag"]),
+                ("log_queue_failed_flushes", "gauge", "Flush passes in a row that failed", queue["failed_flushes"]),
+                ("log_queue_flushed_total", "counter", "Log entries flushed to MongoDB", queue["flushed_total"]),
+                ("log_queue_last_flush_seconds", "gauge", "Duration of the last successful flush", queue["last_flush_latency"]),
+            ]
+        plate_index = self.get_plate_index_stats(approx_size=False)
+        if plate_index:
+            gauges += [
+                ("plate_index_plates", "gauge", "Plates held by the plate index", plate_index["plates"]),
+                ("plate_index_ready", "gauge", "1 once the plate index answers lookups", int(plate_index["ready"])),
+                ("plate_index_complete", "gauge", "1 while the plate index holds every member's plates", int(plate_index["complete"])),
+                ("plate_index_sync_age_seconds", "gauge", "Seconds since the plate index was last known to be current", plate_index["sync_age"]),
+            ]
+        return gauges
+
+    def get_instrumentation_stats(self):
+        """Report per-operation stats and recent slow operations, or None when instrumentation is disabled."""
+        return self.instrumentation.snapshot() if self.instrumentation else None
+
+    def close(self):
+        """Flush any journaled log entries and stop background threads before shutting down."""
+        if self.visit_compactor:
+            self.visit_compactor.stop()
+            self.visit_compactor = None
+        if self.plate_index:
+            self.plate_index.stop()
+            self.plate_index = None
+        if self.connection_monitor:
+            self.connection_monitor.stop()
+            self.connection_monitor = None
+        if self.log_flusher:
+            self.log_flusher.stop()
+            self.log_flusher.journal.close()
+            self.log_flusher = None
+        if self.offline_store:
+            self.offline_store.close()
+            self.offline_store = None
+        if self.metrics_writer:
+            self.metrics_writer.stop()
+            self.metrics_writer = None
+
+    # --- Offline Mode ---
+    def ping(self):
+        """Return True if MongoDB answers within the offline timeout."""
+        try:
+            with pymongo.timeout(self.offline_timeout):
+                self.db.client.admin.command("ping")
+            return True
+        except PyMongoError:
+            return False
+
+    def _gate_call(self, online, offline):
+        """Run a gate operation against MongoDB, or against the offline store while MongoDB is unreachable."""
+        if self.offline_store is None:
+            return online()
+        if not self.offline:
+            try:
+                with pymongo.timeout(self.offline_timeout):
+                    return online()
+            except PyMongoError as e:
+                if not self._unreachable(e):
+                    raise
+                self.offline = True  # The connection monitor switches back once MongoDB answers again
+        return offline()
+
+    @staticmethod
+    def _unreachable(error):
+        """Whether a PyMongoError means MongoDB could not be reached in time, rather than a rejected operation."""
+        return isinstance(error, ConnectionFailure) or error.timeout
+
+    def sync_offline_store(self):
+        """Refresh the local replica of members, staff and presence from MongoDB."""
+        self.offline_store.replace_members(self.members_collection.find())
+        active_staff = self._load_active_staff()
+        self.offline_store.replace_staff(self.staff_collection.find(), active_staff["_id"] if active_staff else None)
+        self.offline_store.replace_presence(self.presence_collection.find())
+
+    def reconcile_offline_logs(self):
+        """Replay logs written while offline, recording plates whose state changed at another gate meanwhile."""
+        for seq, log_data, presence_applied in self.offline_store.pending_logs():
+            # Entries already stored before the connection dropped were applied in full
+            if not self._log_exists(log_data):
+                presence = None
+                try:
+                    # Entries whose presence change reached MongoDB before their log did only need the log
+                    if not presence_applied:
+                        presence = self._apply_presence(log_data)
+                except AlreadyCheckedInError:
+                    self.offline_store.record_conflict("already checked in at another gate", log_data)
+                except NotCheckedInError:
+                    self.offline_store.record_conflict("already checked out at another gate", log_data)
+                # The history keeps every entry; only consistent ones change the shared presence
+                try:
+                    self.write_log(log_data)
+                    self._log_written(log_data)
+                except DuplicateKeyError:
+                    pass
+                if log_data["action"].lower() != "check-in":
+                    if presence is None and presence_applied:
+                        presence = self._stay_check_in(log_data)  # Its presence record left MongoDB with the check-out
+                    if presence is not None:
+                        self._write_visit(self._visit_document(presence, log_data))
+            self.offline_store.remove_pending_log(seq)
+
+    def get_offline_conflicts(self):
+        """Return (reason, log entry) for offline entries that disagreed with another gate."""
+        return self.offline_store.conflicts() if self.offline_store else []
 
     # --- Member Management ---
     def get_all_members(self):
@@ -27,15 +270,61 @@ class System:
             ))
         return members
 
+    # Stamps updated_at, the watermark terminals poll for member changes, with the server's
+    # clock; the terminals' own clocks may disagree with each other
+    MEMBER_CHANGED = {"$currentDate": {"updated_at": True}}
+
+    @staticmethod
+    def _member_cars(cars):
+        """Car documents with normalized plates, as every lookup expects; raises ValueError on an invalid plate."""
+        return [dict(car, plate_number=normalize_plate(car["plate_number"])) for car in cars]
+
     def add_member(self, member):
         """Add a new member to the MongoDB collection."""
         member_data = {
             "name": member.name,
             "house_number": member.house_number,
-            "cars": [{"brand": car.brand, "plate_number": car.plate_number} for car in member.cars],
+            "cars": self._member_cars({"brand": car.brand, "plate_number": car.plate_number} for car in member.cars),
             "type": member.type
         }
-        self.members_collection.insert_one(member_data)
+        # Upserted rather than inserted so updated_at can be set from the server's clock
+        result = self.members_collection.update_one({"_id": ObjectId()}, {"$setOnInsert": member_data, **self.MEMBER_CHANGED}, upsert=True)
+        return result.upserted_id
+
+    # Only the fields the member lists display
+    MEMBER_LIST_PROJECTION = {"name": 1, "house_number": 1, "cars.plate_number": 1}
+    # Field searched by prefix -> the index that bounds the search (see app/indexes.py)
+    MEMBER_SEARCH_INDEXES = {"name": "name", "house_number": "house_number", "cars.plate_number": "cars_plate_number"}
+
+    def search_members(self, text="", after_name=None, limit=100):
+        """List members whose name, house number or plate starts with text, ordered by name.
+
+        Pass the last name of the previous page as after_name to fetch the next page.
+        """
+        page = [{"name": {"$gt": after_name}}] if after_name is not None else []
+        if not text:
+            query = {"$and": page} if page else {}
+            return list(self.members_collection.find(query, self.MEMBER_LIST_PROJECTION).sort("name", 1).limit(limit))
+        # One prefix query per field, each bounded by its own index, merged by name. A single
+        # $or sorted by name can be planned as a walk of the whole name index instead.
+        prefixes = {field: {"$regex": "^" + re.escape(plate_key(text) if field == "cars.plate_number" else text)}
+                    for field in self.MEMBER_SEARCH_INDEXES}
+        cursors = [self.members_collection.find({"$and": page + [{field: prefixes[field]}]}, self.MEMBER_LIST_PROJECTION)
+                   .sort("name", 1).limit(limit).hint(index)
+                   for field, index in self.MEMBER_SEARCH_INDEXES.items()]
+        members = []
+        seen = set()
+        for member_data in heapq.merge(*cursors, key=lambda member_data: member_data["name"]):
+            if member_data["_id"] not in seen:  # Matched on more than one field
+                seen.add(member_data["_id"])
+                members.append(member_data)
+                if len(members) == limit:
+                    break
+        return members
+
+    def get_member_summary(self, name):
+        """Find a member by name with only the fields the member lists display."""
+        return self.members_collection.find_one({"name": name}, self.MEMBER_LIST_PROJECTION)
 
     def get_member_by_name(self, name):
         """Find a member by their name."""
@@ -43,55 +332,124 @@ class System:
 
     def get_member_by_plate(self, plate_number):
         """Find a member by the car's license plate."""
-        return self.members_collection.find_one({"cars.plate_number": plate_number})
+        plate_number = plate_key(plate_number)
+        if self.plate_index:
+            known, member_data = self.plate_index.lookup(plate_number)
+            if known:
+                return member_data
+        return self._gate_call(lambda: self.members_collection.find_one({"cars.plate_number": plate_number}),
+                               lambda: self.offline_store.get_member_by_plate(plate_number))
 
     def update_member_cars(self, name, updated_cars):
         """Update a member's cars list."""
-        self.members_collection.update_one({"name": name}, {"$set": {"cars": updated_cars}})
+        self.members_collection.update_one({"name": name}, {"$set": {"cars": self._member_cars(updated_cars)}, **self.MEMBER_CHANGED})
 
     def edit_member(self, plate_number, member):
         """Edit a member's details based on their car's plate number."""
         member_data = {
             "name": member.name,
             "house_number": member.house_number,
-            "cars": [{"brand": car.brand, "plate_number": car.plate_number} for car in member.cars],
+            "cars": self._member_cars({"brand": car.brand, "plate_number": car.plate_number} for car in member.cars),
             "type": member.type
         }
-        self.members_collection.update_one({"cars.plate_number": plate_number}, {"$set": member_data})
+        self.members_collection.update_one({"cars.plate_number": plate_key(plate_number)}, {"$set": member_data, **self.MEMBER_CHANGED})
 
     def delete_member_by_name(self, name):
         """Delete a member by name."""
-        self.members_collection.delete_one({"name": name})
+        member_data = self.members_collection.find_one_and_delete({"name": name}, {"_id": 1})
+        if member_data:
+            self.member_deletions_collection.update_one({"_id": ObjectId()}, {"$setOnInsert": {"member_id": member_data["_id"]},
+                                                                              "$currentDate": {"deleted_at": True}}, upsert=True)
+
+    # --- Bulk Import/Export ---
+    def get_plate_owners(self, plate_numbers):
+        """Map each of the given plates that belongs to a member to that member's name, with one query."""
+        owners = {}
+        wanted = set(plate_numbers)
+        if not wanted:
+            return owners
+        for member_data in self.members_collection.find({"cars.plate_number": {"$in": list(wanted)}}, {"name": 1, "cars.plate_number": 1}):
+            for car in member_data.get("cars", []):
+                if car["plate_number"] in wanted:
+                    owners[car["plate_number"]] = member_data["name"]
+        return owners
+
+    def upsert_members(self, members):
+        """Create or replace members by name with one unordered bulk write.
+
+        Returns the inserted and updated counts and the error message of each member that
+        failed, by its position in members.
+        """
+        requests = [UpdateOne({"name": member_data["name"]},
+                              {"$set": dict({key: value for key, value in member_data.items() if key != "updated_at"},
+                                            cars=self._member_cars(member_data.get("cars", []))), **self.MEMBER_CHANGED},
+                              upsert=True)
+                    for member_data in members]
+        try:
+            result = self.members_collection.bulk_write(requests, ordered=False).bulk_api_result
+        except BulkWriteError as e:
+            result = e.details
+        return {
+            "inserted": result["nUpserted"],
+            "updated": result["nMatched"],
+            "errors": {error["index"]: error["errmsg"] for error in result["writeErrors"]}
+        }
+
+    def normalize_stored_plates(self):
+        """Rewrite member plates and presence records stored before plates were normalized.
+
+        Returns the members and presence records rewritten, and the (name, plate) pairs that
+        are not valid plates; those are stored in normalized form but should be corrected.
+        """
+        requests = []
+        invalid = []
+        for member_data in self.members_collection.find({}, {"name": 1, "cars": 1}):
+            cars = member_data.get("cars", [])
+            for car in cars:
+                try:
+                    normalize_plate(car["plate_number"])
+                except ValueError:
+                    invalid.append((member_data["name"], car["plate_number"]))
+            normalized = [dict(car, plate_number=plate_key(car["plate_number"])) for car in cars]
+            if normalized != cars:
+                requests.append(UpdateOne({"_id": member_data["_id"]}, {"$set": {"cars": normalized}, **self.MEMBER_CHANGED}))
+        if requests:
+            self.members_collection.bulk_write(requests, ordered=False)
+        presence_rewritten = 0
+        for presence in self.presence_collection.find():
+            plate_number = plate_key(presence["_id"])
+            if plate_number != presence["_id"]:
+                self.presence_collection.replace_one({"_id": plate_number}, dict(presence, _id=plate_number, plate_number=plate_number), upsert=True)
+                self.presence_collection.delete_one({"_id": presence["_id"]})
+                presence_rewritten += 1
+        return {"members": len(requests), "presence": presence_rewritten, "invalid": invalid}
+
+    def iter_members(self, batch_size=1000):
+        """Yield every member document ordered by name, straight from the cursor."""
+        return self.members_collection.find({}, {"_id": 0, "updated_at": 0}).sort("name", 1).batch_size(batch_size)
 
     # --- Staff Management ---
     def get_all_staff(self):
         """Retrieve all staff members from the MongoDB collection."""
         staff_list = []
+        active_staff = self.get_active_staff()
         cursor = self.staff_collection.find()
         for staff_data in cursor:
             staff_list.append(Staff(
                 name=staff_data['name'],
                 phone_number=staff_data['phone_number'],
-                active=staff_data.get('active', False)  # Handle active status for staff
+                active=active_staff is not None and staff_data['_id'] == active_staff['_id']  # On shift at this gate
             ))
         return staff_list
 
-    def set_active_staff(self, staff_name):
-        """Set a staff member as active and deactivate others."""
-        # Deactivate all staff members first
-        self.staff_collection.update_many({}, {"$set": {"active": False}})
-
-        # Activate the selected staff member
-        self.staff_collection.update_one({"name": staff_name}, {"$set": {"active": True}})
-
     def add_staff(self, staff):
         """Add a new staff member to the MongoDB collection."""
         staff_data = {
             "name": staff.name,
-            "phone_number": staff.phone_number,
-            "active": staff.active
+            "phone_number": staff.phone_number
         }
         self.staff_collection.insert_one(staff_data)
+        self._staff_names = None
 
     def get_staff_by_name(self, name):
         """Find a staff member by their name."""
@@ -100,65 +458,954 @@ class System:
     def update_staff(self, name, updated_data):
         """Update an existing staff member's information."""
         self.staff_collection.update_one({"name": name}, {"$set": updated_data})
+        self._staff_names = None  # Logs show the staff member under the new name
+        if self._active_staff and self._active_staff["name"] == name:
+            self.invalidate_active_staff()
 
+    # --- Gate Shift ---
+    # Each gate terminal has one gate_state document holding the staff member on shift there.
+    # The active staff member is cached in-process, so check-ins do not look it up again.
     def set_active_staff(self, staff_name):
-        """Set a staff member as active and deactivate others."""
-        # Deactivate all staff members first
-        self.staff_collection.update_many({}, {"$set": {"active": False}})
-        # Activate the selected staff member
-        self.staff_collection.update_one({"name": staff_name}, {"$set": {"active": True}})
+        """Put a staff member on shift at this gate with a single write."""
+        staff_data = self.staff_collection.find_one({"name": staff_name})
+        if staff_data is None:
+            return
+        self.gate_state_collection.update_one(
+            {"_id": self.gate_id},
+            {"$set": {"staff_id": staff_data["_id"], "staff_name": staff_data["name"], "changed_at": datetime.now()}},
+            upsert=True
+        )
+        self._active_staff = staff_data
+        self._active_staff_loaded = True
 
     def get_active_staff(self):
-        """Retrieve the currently active staff member."""
-        return self.staff_collection.find_one({"active": True})
+        """Retrieve the staff member on shift at this gate."""
+        if not self._active_staff_loaded:
+            self._active_staff = self._gate_call(self._load_active_staff, lambda: self.offline_store.get_active_staff())
+            self._active_staff_loaded = not self.offline  # Offline answers are re-read once MongoDB is back
+        return self._active_staff
+
+    def _load_active_staff(self):
+        gate_state = self.gate_state_collection.find_one({"_id": self.gate_id}) or self._seed_gate_state()
+        if gate_state.get("staff_id") is None:
+            return None
+        return self.staff_collection.find_one({"_id": gate_state["staff_id"]})
+
+    def _seed_gate_state(self):
+        """Create this gate's gate_state document, once, from the legacy active flag.
+
+        Before gate state existed, the active staff member was flagged on the staff document.
+        That lookup has no index (ensure_indexes drops it), so it runs only while seeding; a
+        gate with nobody flagged is seeded with no staff member on shift.
+        """
+        staff_data = self.staff_collection.find_one({"active": True}) or {}
+        self.gate_state_collection.update_one(
+            {"_id": self.gate_id},
+            {"$setOnInsert": {"staff_id": staff_data.get("_id"), "staff_name": staff_data.get("name"), "changed_at": datetime.now()}},
+            upsert=True
+        )
+        return self.gate_state_collection.find_one({"_id": self.gate_id})
+
+    def invalidate_active_staff(self):
+        """Forget the cached active staff member, e.g. after it was edited."""
+        self._active_staff = None
+        self._active_staff_loaded = False
 
     def delete_staff_by_name(self, name):
         """Delete a staff member by name."""
-        self.staff_collection.delete_one({"name": name})
-        
-        
+        staff_data = self.staff_collection.find_one_and_delete({"name": name})
+        if staff_data is not None:
+            # Logs only reference the staff member; keep the name on them now that the reference is gone
+            for collection in self._all_log_collections():
+                collection.update_many({"v": SCHEMA_VERSION, "s": staff_data["_id"]}, {"$set": {"sn": name}})
+            self._staff_names = None
+        if self._active_staff and self._active_staff["name"] == name:
+            self.invalidate_active_staff()
+
     def is_car_checked_in(self, plate_number):
         """Check if the car is currently checked in."""
-        log = self.logs_collection.find_one({"plate_number": plate_number, "action": "check-in", "status": "active"})
-        return log is not None
+        return self.get_presence(plate_number) is not None
 
     def get_last_action(self, plate_number):
         """Get the last action (check-in or check-out) for a car based on the logs."""
-        log = self.logs_collection.find_one({"plate_number": plate_number}, sort=[("timestamp", -1)])  # Get the latest log
-        if log:
-            return log["action"]
+        logs = self._find_logs({"plate_number": plate_key(plate_number)}, None, None, 1)  # Get the latest log
+        if logs:
+            return logs[0]["action"]
         return None
 
     def get_last_log_for_guest(self, plate_number):
         """Retrieve the latest log entry for a non-member (Guest) by plate number."""
-        return self.logs_collection.find_one({"plate_number": plate_number, "type": "Guest"}, sort=[("timestamp", -1)])
+        logs = self._find_logs({"plate_number": plate_key(plate_number), "type": "Guest"}, None, None, 1)
+        return logs[0] if logs else None
 
     def log_action(self, plate_number, owner, house_number, action, timestamp, car_type, staff):
-        """Log the check-in or check-out action in the logs."""
+        """Log the check-in or check-out action and update the presence of the car.
+
+        Raises AlreadyCheckedInError or NotCheckedInError when another gate got there first,
+        and ValueError when plate_number cannot be a plate.
+        """
+        plate_number = normalize_plate(plate_number)
+        staff_id, staff_name = self._staff_reference(staff)
         log_data = {
+            "_id": ObjectId(),  # Generated here so a journal replay cannot insert the entry twice
             "plate_number": plate_number,
             "owner": owner,
             "house_number": house_number,
             "action": action,
             "timestamp": timestamp,
             "type": car_type,
-            "staff": staff,
-            "status": "active" if action == "check-in" else "completed"
+            "staff": staff_name,
+            "staff_id": staff_id
+        }
+        # Logs are append-only history; whether the car is inside lives in the presence collection
+        def online():
+            if self.log_flusher is None and self._supports_transactions():
+                # The log insert is a second network write, so commit it together with the presence change
+                with self.db.client.start_session() as session:
+                    session.with_transaction(lambda s: self._record_action(log_data, s))
+            else:
+                self._record_action(log_data)
+            self._log_written(log_data)
+            if self.offline_store:
+                self._apply_offline_presence(log_data)
+
+        def offline():
+            checked_in = self.offline_store.get_presence(plate_number) is not None
+            if action.lower() == "check-in" and checked_in:
+                raise AlreadyCheckedInError(plate_number)
+            if action.lower() != "check-in" and not checked_in:
+                raise NotCheckedInError(plate_number)
+            self.offline_store.queue_log(log_data)
+            self._apply_offline_presence(log_data)
+
+        try:
+            self._gate_call(online, offline)
+        except LogNotStoredError as e:
+            # The car has moved in MongoDB already, so queue only the log; checking presence
+            # again on reconcile would report this gate's own change as a conflict
+            if self.offline_store is None or not self._unreachable(e.error):
+                raise e.error
+            self.offline = True
+            self.offline_store.queue_log(log_data, presence_applied=True)
+            self._apply_offline_presence(log_data)
+
+    def _record_action(self, log_data, session=None):
+        # The presence change is the single atomic step that decides the outcome; the log follows it
+        presence = self._apply_presence(log_data, session)
+        try:
+            self.write_log(log_data, session)
+        except PyMongoError as e:
+            if session is not None:
+                raise  # Aborting the transaction undoes the presence change too
+            raise LogNotStoredError(e) from e
+        if log_data["action"].lower() != "check-in":
+            self._write_visit(self._visit_document(presence, log_data), session)
+
+    def _write_visit(self, visit, session=None):
+        """Store a finished stay; outside a transaction a failure is left for the visit compactor to redo."""
+        try:
+            # Keyed by the check-in log, so a replayed check-out rewrites the same visit
+            self.visits_collection.replace_one({"_id": visit["_id"]}, visit, upsert=True, session=session)
+        except PyMongoError:
+            if session is not None:
+                raise
+            # The check-out log is stored, and compact_visits pairs it with its check-in
+    def _supports_transactions(self):
+        topology_description = getattr(self.db.client, "topology_description", None)
+        return topology_description is not None and topology_description.topology_type_name in ("ReplicaSetWithPrimary", "Sharded")
+
+    def write_log(self, log_data, session=None):
+        """Append a log entry, through the write-behind journal when it is enabled.
+
+        This is the only place log documents are written; they are stored in the compact
+        version 2 format from app/log_schema.py, in the partition for their month.
+        """
+        document = encode_log(log_data)
+        if self.log_flusher:
+            self.log_flusher.journal.append(document)
+            if self.log_flusher.journal.depth() >= self.log_flusher.batch_size:
+                self.log_flusher.notify()
+        else:
+            self.log_partitions.collection_for(log_data["timestamp"]).insert_one(document, session=session)
+            self.rollups_collection.bulk_write(rollup_updates([document]), ordered=False, session=session)
+
+    def _staff_reference(self, staff):
+        """Return (staff _id, name) for a staff document or, as the guest dialog used to pass, a staff name."""
+        if isinstance(staff, dict):
+            return staff.get("_id"), staff.get("name")
+        if isinstance(staff, str):
+            staff_ids = self._staff_ids(staff)
+            return (staff_ids[0] if staff_ids else None), staff
+        return None, None
+
+    # Staff names by _id, for decoding logs that only store the staff reference
+    def _load_staff_names(self):
+        self._staff_names = {staff_data["_id"]: staff_data["name"] for staff_data in self.staff_collection.find({}, {"name": 1})}
+        return self._staff_names
+
+    def _staff_name(self, staff_id):
+        staff_names = self._staff_names
+        if staff_names is None or staff_id not in staff_names:
+            staff_names = self._load_staff_names()
+            staff_names.setdefault(staff_id, None)  # Deleted staff member; do not reload for it again
+        return staff_names[staff_id]
+
+    def _staff_ids(self, name):
+        staff_names = self._staff_names if self._staff_names is not None else self._load_staff_names()
+        return [staff_id for staff_id, staff_name in staff_names.items() if staff_name == name]
+
+    # --- Presence ---
+    def _apply_presence(self, log_data, session=None):
+        """Move the car in or out with one atomic write and return its presence record.
+
+        The presence _id is the plate number, so at most one active session per plate can exist.
+        The visit of a check-out is written once its log is stored, see _record_action.
+        """
+        plate_number = log_data["plate_number"]
+        if log_data["action"].lower() == "check-in":
+            presence = dict(self._presence_document(log_data), _id=plate_number)
+            try:
+                self.presence_collection.insert_one(presence, session=session)
+            except DuplicateKeyError:
+                raise AlreadyCheckedInError(plate_number)
+        else:
+            presence = self.presence_collection.find_one_and_delete({"_id": plate_number}, session=session)
+            if presence is None:
+                raise NotCheckedInError(plate_number)
+        return presence
+
+    def _apply_offline_presence(self, log_data):
+        checking_in = log_data["action"].lower() == "check-in"
+        self.offline_store.set_presence(log_data["plate_number"], self._presence_document(log_data) if checking_in else None)
+
+    @staticmethod
+    def _presence_document(log_data):
+        return {
+            "plate_number": log_data["plate_number"],
+            "owner": log_data["owner"],
+            "house_number": log_data["house_number"],
+            "type": log_data["type"],
+            "staff": log_data["staff"],
+            "staff_id": log_data["staff_id"],
+            "checked_in_at": log_data["timestamp"],
+            "log_id": log_data["_id"]
         }
-        if action == "check-in":
-            # Insert a new check-in log
-            self.logs_collection.insert_one(log_data)
+
+    @staticmethod
+    def _visit_document(presence, log_data):
+        """Build the visit for a stay from its presence record and the check-out entry."""
+        return {
+            "_id": presence["log_id"],  # The check-in log
+            "plate_number": presence["plate_number"],
+            "owner": presence["owner"],
+            "house_number": presence["house_number"],
+            "type": presence["type"],
+            "entered_at": presence["checked_in_at"],
+            "exited_at": log_data["timestamp"],
+            "duration": (log_data["timestamp"] - presence["checked_in_at"]).total_seconds(),
+            "entry_staff": presence["staff"],
+            "entry_staff_id": presence.get("staff_id"),
+            "exit_staff": log_data["staff"],
+            "exit_staff_id": log_data["staff_id"],
+            "exit_log_id": log_data["_id"]
+        }
+
+    def get_presence(self, plate_number):
+        """Retrieve the presence record of a car that is inside, or None if it is not."""
+        plate_number = plate_key(plate_number)
+        return self._gate_call(lambda: self.presence_collection.find_one({"_id": plate_number}),
+                               lambda: self.offline_store.get_presence(plate_number))
+
+    def lookup_plate(self, plate_number):
+        """Resolve a scanned plate to its member record (None for guests) and its presence record."""
+        return self.get_member_by_plate(plate_number), self.get_presence(plate_number)
+
+    def get_vehicles_inside(self):
+        """Retrieve every car that is currently inside, most recent arrival first."""
+        return list(self.presence_collection.find().sort("checked_in_at", -1))
+
+    def rebuild_presence(self):
+        """Regenerate the presence collection from the logs and return the number of cars inside."""
+        pipeline = [
+            # Logs may still be in either schema version until migrate-logs has run
+            # Older logs keep plates as they were typed, so group them the way plates are looked up
+            {"$addFields": {"_plate": {"$toUpper": {"$trim": {"input": {"$ifNull": ["$p", "$plate_number"]}}}},
+                            "_timestamp": {"$ifNull": ["$ts", "$timestamp"]}}},
+            {"$sort": {"_plate": 1, "_timestamp": 1}},
+            {"$group": {"_id": "$_plate", "last": {"$last": "$$ROOT"}}},
+            {"$replaceRoot": {"newRoot": "$last"}},
+            {"$project": {"_plate": 0, "_timestamp": 0}}
+        ]
+        rebuild_collection = self.db[self.presence_collection.name + "_rebuild"]
+        rebuild_collection.drop()
+        inside = 0
+        batch = []
+        for document in self._aggregate_logs(pipeline):
+            log_data = decode_log(document, self._staff_name)
+            log_data["plate_number"] = plate_key(log_data["plate_number"])
+            if log_data["action"] == "check-in":
+                batch.append(dict(self._presence_document(log_data), _id=log_data["plate_number"]))
+            if len(batch) >= 1000:
+                rebuild_collection.insert_many(batch)
+                inside += len(batch)
+                batch = []
+        if batch:
+            rebuild_collection.insert_many(batch)
+            inside += len(batch)
+        if inside:
+            # Swap the rebuilt collection in atomically
+            rebuild_collection.create_indexes(INDEXES["presence"])
+            rebuild_collection.rename(self.presence_collection.name, dropTarget=True)
         else:
-            # For check-out, update the log to mark the check-in as completed
-            self.logs_collection.update_one({"plate_number": plate_number, "action": "check-in", "status": "active"}, {"$set": {"status": "completed"}})
-            self.logs_collection.insert_one(log_data)
-            
-    def get_log_count(self):
-        """Get the total count of logs."""
-        return self.logs_collection.count_documents({})
+            self.presence_collection.delete_many({})
+        self.schema_state_collection.update_one({"_id": "presence"}, {"$set": {"built": True}}, upsert=True)
+        return inside
+
+    def ensure_presence(self):
+        """Build the presence collection on databases from before it existed; safe to run on each startup.
+
+        Without it, every car already inside would be refused at check-out. Returns the
+        number of cars inside after a rebuild, or None when presence was already in use.
+        """
+        if self.schema_state_collection.find_one({"_id": "presence"}):
+            return None
+        if self.presence_collection.find_one({}, {"_id": 1}) is not None:
+            # Check-ins have been recorded since the upgrade; rebuild-presence stays a manual step
+            self.schema_state_collection.update_one({"_id": "presence"}, {"$set": {"built": True}}, upsert=True)
+            return None
+        return self.rebuild_presence()
+
+    # --- Background jobs ---
+    def acquire_lease(self, name, seconds):
+        """Take or renew the lease on a job shared by every terminal, for seconds; False while another process holds it.
+
+        Leases are schema_state documents that expire by the server's clock, so terminal clocks do not matter.
+        """
+        try:
+            self.schema_state_collection.update_one(
+                {"_id": f"lease:{name}", "$or": [{"holder": self.lease_holder}, {"$expr": {"$lt": ["$expires_at", "$$NOW"]}}]},
+                [{"$set": {"holder": self.lease_holder, "expires_at": {"$add": ["$$NOW", int(seconds * 1000)]}}}],
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False  # Held by another process and not expired, so the upsert collided with it
+        return True
+
+    # --- Visits ---
+    # A visit is one finished stay: entry and exit time, staff on each side and the duration
+    # in seconds. Check-outs write them as they happen; compact_visits pairs older logs and
+    # redoes the visits a check-out could not store.
+    def compact_visits(self, batch_size=1000, prune_logs_before=None):
+        """Pair check-in/check-out logs written since the last run into visits and return how many were written.
+
+        With prune_logs_before, the two logs of every visit that ended before that date are
+        deleted once the visit is stored; the log view no longer shows those stays.
+        """
+        state = self.schema_state_collection.find_one({"_id": "visits"}) or {}
+        until = datetime.now()
+        # Stays still open at the last run are paired by looking up their check-in
+        filters = {"start": state.get("compacted_through"), "end": until}
+        compacted = 0
+        requests = []
+        pruned = []
+        check_ins = {}  # Plate -> its latest check-in not yet paired
+        for log_data in self.iter_logs(filters, batch_size):
+            if log_data["action"] == "check-in":
+                check_ins[log_data["plate_number"]] = log_data  # A check-in without a check-out is replaced by the next one
+                continue
+            check_in = check_ins.pop(log_data["plate_number"], None)
+            if check_in is None:
+                # A stay that started before this run; its live visit may not have been stored
+                presence = self._stay_check_in(log_data)
+                if presence is None:
+                    continue
+                visit = self._visit_document(presence, log_data)
+                requests.append(ReplaceOne({"_id": visit["_id"]}, visit, upsert=True))
+                continue
+            visit = self._visit_document(self._presence_document(check_in), log_data)
+            requests.append(ReplaceOne({"_id": visit["_id"]}, visit, upsert=True))
+            if prune_logs_before and visit["exited_at"] < prune_logs_before:
+                pruned.extend((check_in, log_data))
+            if len(requests) >= batch_size:
+                compacted += self._write_visits(requests, pruned)
+                requests, pruned = [], []
+        if requests:
+            compacted += self._write_visits(requests, pruned)
+        self.schema_state_collection.update_one({"_id": "visits"}, {"$set": {"compacted_through": until}}, upsert=True)
+        return compacted
+
+    def _stay_check_in(self, check_out):
+        """The presence record a check-out closed, rebuilt from the plate's log before it, or None."""
+        logs = self.get_logs_before(self.log_anchor(check_out), 1, {"plate_number": check_out["plate_number"]})
+        if logs and logs[0]["action"] == "check-in":
+            return self._presence_document(logs[0])
+        return None
+
+    def _write_visits(self, requests, pruned):
+        self.visits_collection.bulk_write(requests, ordered=False)
+        if pruned:
+            # Only after the visits holding their data are stored
+            self._delete_logs(pruned)
+            self._remove_from_counts([encode_log(log_data) for log_data in pruned], max(log_data["timestamp"] for log_data in pruned) + timedelta(microseconds=1))
+        return len(requests)
+
+    def get_stays(self, plate_number=None, house_number=None, start=None, end=None, limit=100):
+        """Get visits that ended within [start, end], newest first, optionally for one plate or house."""
+        query = {}
+        if plate_number:
+            query["plate_number"] = plate_key(plate_number)
+        if house_number:
+            query["house_number"] = house_number
+        exited_at = {}
+        if start:
+            exited_at["$gte"] = start
+        if end:
+            exited_at["$lte"] = end
+        if exited_at:
+            query["exited_at"] = exited_at
+        return list(self.visits_collection.find(query).sort("exited_at", -1).limit(limit))
+
+    def get_last_stay(self, plate_number):
+        """Get the most recent finished visit of a car, or None."""
+        stays = self.get_stays(plate_number, limit=1)
+        return stays[0] if stays else None
+
+    def get_dwell_times(self, group_by="house_number", start=None, end=None):
+        """Count, average and longest stay in seconds per house_number, plate_number or type, for visits ended within [start, end]."""
+        exited_at = {}
+        if start:
+            exited_at["$gte"] = start
+        if end:
+            exited_at["$lte"] = end
+        pipeline = [
+            {"$match": {"exited_at": exited_at} if exited_at else {}},
+            {"$group": {
+                "_id": "$" + group_by,
+                "stays": {"$sum": 1},
+                "average_duration": {"$avg": "$duration"},
+                "longest_duration": {"$max": "$duration"}
+            }},
+            {"$sort": {"_id": 1}}
+        ]
+        return list(self.visits_collection.aggregate(pipeline))
+
+    # --- Reports ---
+    # Reports read only the traffic rollups, so their cost depends on the length of the
+    # period, not on the number of logs.
+    def get_traffic_report(self, period, dimension="total", start=None, end=None):
+        """Get entries and exits per hour, day or month, split by type, house or staff.
+
+        Returns dicts with start, key, entries and exits, oldest first. Staff keys are names.
+        Every hour that overlaps start to end is counted, so a day or month cut by start or
+        end only counts its hours inside the range.
+        """
+        first_hour = period_start(start, "hour") if start else None
+        end_hour = period_start(end, "hour") + timedelta(hours=1) if end else None  # Exclusive
+        if period == "hour":
+            rows = self._rollup_rows("hour", dimension, first_hour, end_hour)
+        else:
+            # Whole days from the daily rollups; the days cut by start or end from the hourly ones,
+            # the same way count_logs counts the hours at the edges of its range
+            first_day = ceil_period(first_hour, "day") if start else None
+            end_day = period_start(end_hour, "day") if end else None
+            if start and end and first_day >= end_day:
+                rows = self._rollup_rows("hour", dimension, first_hour, end_hour)
+            else:
+                rows = self._rollup_rows("day", dimension, first_day, end_day)
+                if start and first_hour < first_day:
+                    rows += self._rollup_rows("hour", dimension, first_hour, first_day)
+                if end and end_day < end_hour:
+                    rows += self._rollup_rows("hour", dimension, end_day, end_hour)
+            # At most 31 days of rollups per month and key
+            rows = self._sum_rollup_rows(rows, lambda row_start: period_start(row_start, "day").replace(day=1) if period == "month"
+                                         else period_start(row_start, "day"))
+        for row in rows:
+            row.setdefault("entries", 0)
+            row.setdefault("exits", 0)
+            if dimension == "staff" and isinstance(row["key"], ObjectId):
+                row["key"] = self._staff_name(row["key"]) or str(row["key"])
+        return rows
+
+    def _rollup_rows(self, period, dimension, first, end):
+        """Rollups of one period and dimension starting in [first, end), oldest first; None leaves that side open."""
+        query = {"period": period, "dimension": dimension}
+        time_range = {}
+        if first:
+            time_range["$gte"] = first
+        if end:
+            time_range["$lt"] = end
+        if time_range:
+            query["start"] = time_range
+        return list(self.rollups_collection.find(query, {"_id": 0, "start": 1, "key": 1, "entries": 1, "exits": 1}).sort([("start", 1), ("key", 1)]))
+
+    @staticmethod
+    def _sum_rollup_rows(rows, bucket_start):
+        """Add up rollup rows per key into the bucket bucket_start(row start) returns, oldest bucket first."""
+        buckets = {}
+        for row in rows:
+            start = bucket_start(row["start"])
+            bucket = buckets.setdefault((start, row["key"]), {"start": start, "key": row["key"], "entries": 0, "exits": 0})
+            bucket["entries"] += row.get("entries", 0)
+            bucket["exits"] += row.get("exits", 0)
+        return sorted(buckets.values(), key=lambda bucket: bucket["start"])
+
+    def rebuild_rollups(self):
+        """Recount the traffic rollups from the stored logs and return the number of rollup documents.
+
+        Hourly and daily rollups from before logs were archived or pruned cannot be recounted
+        and are kept as they are. Check-ins made while it runs may be missing from the result;
+        run it while the gates are quiet.
+        """
+        rebuild_collection = self.db[self.rollups_collection.name + "_rebuild"]
+        rebuild_collection.drop()
+        rebuild_collection.create_indexes(INDEXES[self.rollups_collection.name])
+        for dimension in DIMENSIONS:
+            self._aggregate_logs(backfill_pipeline(dimension, rebuild_collection.name))
+        rebuild_collection.aggregate(summary_pipeline("day", rebuild_collection.name), allowDiskUse=True)
+        rebuild_collection.aggregate(summary_pipeline("all", rebuild_collection.name), allowDiskUse=True)
+        removed_before = self._rollup_state().get("logs_removed_before")
+        if removed_before:
+            self.rollups_collection.aggregate([
+                {"$match": {"period": {"$in": ["hour", "day"]}, "start": {"$lt": removed_before}}},
+                {"$project": {"_id": 0}},
+                {"$merge": {"into": rebuild_collection.name, "on": ["period", "dimension", "start", "key"], "whenMatched": "replace"}},
+            ])
+        rollups = rebuild_collection.count_documents({})
+        if rollups:
+            rebuild_collection.rename(self.rollups_collection.name, dropTarget=True)
+        else:
+            self.rollups_collection.delete_many({})
+        self.schema_state_collection.update_one({"_id": "rollups"}, {"$set": {"complete": True}}, upsert=True)
+        self._rollups_complete = True
+        return rollups
+
+    def _rollup_state(self):
+        return self.schema_state_collection.find_one({"_id": "rollups"}) or {}
+
+    def _remove_from_counts(self, documents, removed_before):
+        """Take removed log documents out of the "all" rollups and remember that logs before removed_before are incomplete."""
+        updates = rollup_updates(documents, periods=("all",), sign=-1)
+        if updates:
+            self.rollups_collection.bulk_write(updates, ordered=False)
+        self.schema_state_collection.update_one({"_id": "rollups"}, {"$max": {"logs_removed_before": removed_before}}, upsert=True)
+
+    # --- Log Counts ---
+    # The log view's totals come from the "all", daily and hourly traffic rollups, which
+    # log_action keeps exact as it writes. Filters the rollups cannot answer fall back to
+    # counting the logs, and until rebuild_rollups has counted the logs from before the
+    # rollups existed, an unfiltered total is estimated from the collection sizes.
+    COUNTED_DIMENSIONS = {"type": "type", "house_number": "house", "staff": "staff"}
+
+    def rollups_complete(self):
+        """Return True once the rollups have been rebuilt from the logs and so cover all of them."""
+        if not self._rollups_complete:
+            self._rollups_complete = bool(self._rollup_state().get("complete"))
+        return self._rollups_complete
+
+    def count_logs(self, filters=None, scan=True):
+        """Count the logs matching the filters as cheaply as possible.
+
+        Returns a dict with count, exact (False for an estimate) and cached (True if the count
+        came from the rollups and is cheap to ask for again). With scan=False, returns None
+        instead of counting the matching logs themselves.
+        """
+        filters = {key: value for key, value in (filters or {}).items() if value}
+        dimensions = [field for field in filters if field in self.COUNTED_DIMENSIONS]
+        other = set(filters) - set(dimensions) - {"action", "start", "end"}
+        if self.rollups_complete() and len(dimensions) <= 1 and not other:
+            count = self._count_from_rollups(filters, dimensions[0] if dimensions else None)
+            if count is not None:
+                return {"count": count, "exact": True, "cached": True}
+        if not filters:
+            estimate = sum(collection.estimated_document_count() for collection in self._all_log_collections())
+            return {"count": estimate, "exact": False, "cached": True}
+        if not scan:
+            return None
+        return {"count": self.get_log_count(filters), "exact": True, "cached": False}
+
+    def _count_from_rollups(self, filters, field):
+        """Sum the rollups covering the filters, or return None if they cannot answer exactly."""
+        query = {"dimension": self.COUNTED_DIMENSIONS[field] if field else "total"}
+        if field == "staff":
+            # Rollups of staff no longer on record are keyed by an _id the name does not lead
+            # back to; their logs keep the name, so the logs are counted instead
+            if any(collection.find_one({"sn": filters[field]}, {"_id": 1}) for collection in self._all_log_collections()):
+                return None
+            # Staff rollups are keyed by the staff _id, or by the name for logs from before staff references
+            query["key"] = {"$in": self._staff_ids(filters[field]) + [filters[field]]}
+        elif field:
+            query["key"] = filters[field]
+        fields = ["entries", "exits"]
+        if filters.get("action"):
+            fields = ["entries"] if filters["action"].lower() == "check-in" else ["exits"]
+        start, end = filters.get("start"), filters.get("end")
+        if not start and not end:
+            return self._sum_rollups(dict(query, period="all"), fields)
+        removed_before = self._rollup_state().get("logs_removed_before")
+        if not start or (removed_before and start < removed_before):
+            return None  # Part of the range has been archived or pruned
+        days, hours, edges = split_range(start, end or datetime.now())
+        count = 0
+        if days:
+            count += self._sum_rollups(dict(query, period="day", start={"$gte": days[0], "$lt": days[1]}), fields)
+        for first, last in hours:
+            if first < last:
+                count += self._sum_rollups(dict(query, period="hour", start={"$gte": first, "$lt": last}), fields)
+        # The partial hours at either end are counted from the logs, at most an hour each
+        for edge_start, edge_end in edges:
+            count += self.get_log_count(dict(filters, start=edge_start, end=edge_end))
+        return count
+
+    def _sum_rollups(self, query, fields):
+        total = 0
+        for rollup in self.rollups_collection.find(query, {field: 1 for field in fields}):
+            total += sum(rollup.get(field, 0) for field in fields)
+        return total
+
+    def add_count_listener(self, listener):
+        """Call listener(log entry) after every log this process stores, so open views can keep their totals current."""
+        self.count_listeners.append(listener)
+
+    def remove_count_listener(self, listener):
+        if listener in self.count_listeners:
+            self.count_listeners.remove(listener)
+
+    def _log_written(self, log_data):
+        if self.count_listeners:
+            log_data = decode_log(encode_log(log_data), self._staff_name)  # Spelled the way the log views filter it
+        for listener in list(self.count_listeners):
+            listener(log_data)
+
+    # --- Log Storage ---
+    # Logs are stored in the compact version 2 format (see app/log_schema.py), one
+    # collection per month (see app/log_partitions.py). A query only visits the partitions
+    # its time range touches. Until partition_logs has emptied the old "logs" collection,
+    # it is queried as well, and until migrate_logs has converted its documents, once per
+    # schema version.
+    def logs_migrated(self):
+        """Return True once every stored log uses the version 2 format."""
+        if not self._logs_migrated:
+            state = self.schema_state_collection.find_one({"_id": "logs"})
+            self._logs_migrated = bool(state and state.get("version") == SCHEMA_VERSION)
+        return self._logs_migrated
+
+    def logs_partitioned(self):
+        """Return True once the logs from before partitioning have been moved into partitions."""
+        if not self._logs_partitioned:
+            state = self.schema_state_collection.find_one({"_id": "logs"})
+            self._logs_partitioned = bool(state and state.get("partitioned"))
+        return self._logs_partitioned
+
+    def _log_versions(self):
+        return (SCHEMA_VERSION,) if self.logs_migrated() else (SCHEMA_VERSION, 1)
+
+    def _legacy_log_versions(self):
+        """Schema versions still to be queried in the unpartitioned logs collection."""
+        return () if self.logs_partitioned() else self._log_versions()
+
+    def _all_log_collections(self):
+        return ([] if self.logs_partitioned() else [self.logs_collection]) + self.log_partitions.collections(newest_first=False)
+
+    def _aggregate_logs(self, pipeline):
+        """Run an aggregation over the logs of every partition."""
+        collections = self._all_log_collections()
+        union = [{"$unionWith": collection.name} for collection in collections[1:]]
+        return collections[0].aggregate(union + pipeline, allowDiskUse=True)
+
+    def _log_exists(self, log_data):
+        if self.log_partitions.collection_for(log_data["timestamp"]).find_one({"_id": log_data["_id"]}, {"_id": 1}):
+            return True
+        return not self.logs_partitioned() and self.logs_collection.find_one({"_id": log_data["_id"]}, {"_id": 1}) is not None
+
+    def _delete_logs(self, logs):
+        ids_by_partition = {}
+        for log_data in logs:
+            ids_by_partition.setdefault(partition_name(log_data["timestamp"]), []).append(log_data["_id"])
+        for name, log_ids in ids_by_partition.items():
+            self.db[name].delete_many({"_id": {"$in": log_ids}})
+        if not self.logs_partitioned():
+            self.logs_collection.delete_many({"_id": {"$in": [log_data["_id"] for log_data in logs]}})
+
+    @staticmethod
+    def _log_field(field, version):
+        return FIELDS[field] if version == SCHEMA_VERSION else field
+
+    @staticmethod
+    def _log_time_range(filters, anchor=None, operator=None):
+        """The (start, end) a query covers, used to pick partitions; either may be None."""
+        start = (filters or {}).get("start")
+        end = (filters or {}).get("end")
+        if anchor and operator == "$lt":
+            end = min(end, anchor[0]) if end else anchor[0]
+        elif anchor:
+            start = max(start, anchor[0]) if start else anchor[0]
+        return start, end
+
+    def _log_cursor(self, collection, filters, anchor, operator, limit, version=SCHEMA_VERSION):
+        """Cursor over one collection's logs of one schema version, in (timestamp, _id) order away from the anchor."""
+        query = self._log_query(filters, version, self._keyset_filter(anchor, operator, version) if anchor else None)
+        direction = 1 if operator == "$gt" else -1
+        timestamp_field = self._log_field("timestamp", version)
+        return collection.find(query).sort([(timestamp_field, direction), ("_id", direction)]).limit(limit)
+
+    def _find_logs(self, filters, anchor, operator, limit):
+        """Decoded logs from every partition and schema version, merged in (timestamp, _id) order."""
+        newest_first = operator != "$gt"
+        logs = {}
+        for version in self._legacy_log_versions():
+            for document in self._log_cursor(self.logs_collection, filters, anchor, operator, limit, version):
+                logs[document["_id"]] = decode_log(document, self._staff_name)
+        # Partitions do not overlap in time, so they are read in order until the page is full
+        found = 0
+        start, end = self._log_time_range(filters, anchor, operator)
+        for collection in self.log_partitions.collections(start, end, newest_first):
+            for document in self._log_cursor(collection, filters, anchor, operator, limit - found):
+                logs[document["_id"]] = decode_log(document, self._staff_name)  # Keyed by _id: partition_logs may be moving it
+                found += 1
+            if found >= limit:
+                break
+        return sorted(logs.values(), key=self.log_anchor, reverse=newest_first)[:limit]
+
+    def _encode_legacy_log(self, document):
+        """Version 2 document for a version 1 log, resolving the staff reference by name if it was not embedded."""
+        log_data = decode_log(document)
+        if log_data["staff_id"] is None and log_data["staff"]:
+            log_data["staff_id"] = self._staff_reference(log_data["staff"])[0]
+        return encode_log(log_data)
+
+    def migrate_logs(self, batch_size=1000, progress=None):
+        """Rewrite version 1 logs in the version 2 format, batch by batch, and return how many were rewritten.
+
+        Resumes from the last finished batch if interrupted. Run it once every terminal has
+        been upgraded and has flushed its write-behind journal.
+        """
+        state = self.schema_state_collection.find_one({"_id": "logs"}) or {}
+        last_id = state.get("migrated_through")
+        migrated = 0
+        while True:
+            query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+            batch = list(self.logs_collection.find(query).sort("_id", 1).limit(batch_size))
+            if not batch:
+                break
+            requests = [ReplaceOne({"_id": document["_id"], "v": {"$exists": False}}, self._encode_legacy_log(document))
+                        for document in batch if document.get("v") != SCHEMA_VERSION]
+            if requests:
+                self.logs_collection.bulk_write(requests, ordered=False)
+            migrated += len(requests)
+            last_id = batch[-1]["_id"]
+            self.schema_state_collection.update_one({"_id": "logs"}, {"$set": {"migrated_through": last_id}}, upsert=True)
+            if progress:
+                progress(migrated)
+        self.schema_state_collection.update_one({"_id": "logs"}, {"$set": {"version": SCHEMA_VERSION}}, upsert=True)
+        self._logs_migrated = True
+        return migrated
+
+    def partition_logs(self, batch_size=1000, progress=None):
+        """Move the logs from before partitioning into their monthly partitions and return how many were moved.
+
+        Version 1 logs are converted on the way. Each batch is inserted before it is deleted,
+        so an interrupted run can simply be started again.
+        """
+        moved = 0
+        while True:
+            batch = list(self.logs_collection.find().sort("_id", 1).limit(batch_size))
+            if not batch:
+                break
+            documents = [document if document.get("v") == SCHEMA_VERSION else self._encode_legacy_log(document) for document in batch]
+            for collection, group in self.log_partitions.group(documents):
+                try:
+                    collection.insert_many(group, ordered=False)
+                except BulkWriteError as e:
+                    if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                        raise  # Duplicates are logs an interrupted run already moved
+            self.logs_collection.delete_many({"_id": {"$in": [document["_id"] for document in batch]}})
+            moved += len(batch)
+            if progress:
+                progress(moved)
+        self.schema_state_collection.update_one({"_id": "logs"}, {"$set": {"partitioned": True}}, upsert=True)
+        self._logs_partitioned = True
+        return moved
+
+    def archive_log_partitions(self, keep_months=12, progress=None):
+        """Move partitions older than the newest keep_months months to the log archive and return their names.
+
+        A partition is dropped only after its archive file holds every one of its logs.
+        Visits and traffic rollups are kept, so stays and reports still cover archived months.
+        """
+        now = datetime.now()
+        oldest_kept = (now.year * 12 + now.month - 1) - (keep_months - 1)
+        archived = []
+        for collection in self.log_partitions.collections(newest_first=False):
+            year, month = partition_month(collection.name)
+            if year * 12 + month - 1 >= oldest_kept:
+                break
+            expected = collection.count_documents({})
+            written = self.log_archive.write(collection.name, collection.find().sort([("ts", 1), ("_id", 1)]))
+            if written != expected:
+                raise RuntimeError(f"{collection.name} changed while it was archived; run the archive again.")
+            next_month = datetime(year + month // 12, month % 12 + 1, 1)
+            self._remove_from_counts(collection.find({}, {"v": 1, "a": 1, "ts": 1, "t": 1, "h": 1, "s": 1, "sn": 1}), next_month)
+            collection.drop()
+            archived.append(collection.name)
+            if progress:
+                progress(collection.name, written)
+        self.log_partitions.refresh()
+        return archived
+
+    def search_log_archive(self, filters=None, limit=None):
+        """Get archived logs matching the filters, oldest first, by reading the archive files their time range touches."""
+        logs = []
+        start, end = self._log_time_range(filters)
+        for name in self.log_archive.names(start, end):
+            for document in self.log_archive.read(name):
+                log_data = decode_log(document, self._staff_name)
+                if log_matches(log_data, filters):
+                    logs.append(log_data)
+                    if limit and len(logs) >= limit:
+                        return logs
+        return logs
+
+    def iter_logs(self, filters=None, batch_size=5000):
+        """Yield every decoded log matching the filters, oldest first, straight from the cursors."""
+        cursors = []
+        for version in self._legacy_log_versions():
+            timestamp_field = self._log_field("timestamp", version)
+            cursor = self.logs_collection.find(self._log_query(filters, version)).sort([(timestamp_field, 1), ("_id", 1)]).batch_size(batch_size)
+            cursors.append(decode_log(document, self._staff_name) for document in cursor)
+        cursors.append(self._iter_partitioned_logs(filters, batch_size))
+        return heapq.merge(*cursors, key=self.log_anchor)
+
+    def _iter_partitioned_logs(self, filters, batch_size):
+        start, end = self._log_time_range(filters)
+        query = self._log_query(filters)
+        for collection in self.log_partitions.collections(start, end, newest_first=False):
+            for document in collection.find(query).sort([("ts", 1), ("_id", 1)]).batch_size(batch_size):
+                yield decode_log(document, self._staff_name)
+
+    def get_log_count(self, filters=None):
+        """Get the total count of logs, or of the logs matching the filters."""
+        count = sum(self.logs_collection.count_documents(self._log_query(filters, version)) for version in self._legacy_log_versions())
+        start, end = self._log_time_range(filters)
+        query = self._log_query(filters)
+        return count + sum(collection.count_documents(query) for collection in self.log_partitions.collections(start, end))
 
     def get_logs_by_page(self, page, logs_per_page):
-        """Get logs for a specific page."""
+        """Get logs for a specific page. Prefer get_logs_before, which does not slow down on deep pages.
+
+        The offset is skipped by the server: whole partitions are counted and passed over, and
+        the partition the page starts in is read with skip, so only the page is sent back.
+        """
         skip = page * logs_per_page
-        return list(self.logs_collection.find().sort("timestamp", -1).skip(skip).limit(logs_per_page))
-            
+        if not self.logs_partitioned():
+            if len(self._log_versions()) == 1 and not self.log_partitions.names():
+                cursor = self._log_cursor(self.logs_collection, None, None, None, logs_per_page).skip(skip)
+                return [decode_log(document, self._staff_name) for document in cursor]
+            # Unpartitioned logs of either version overlap the partitions in time, so the server merges them
+            pipeline = [
+                {"$addFields": {"_timestamp": {"$ifNull": ["$ts", "$timestamp"]}}},
+                {"$sort": {"_timestamp": -1, "_id": -1}},
+                {"$skip": skip},
+                {"$limit": logs_per_page},
+                {"$project": {"_timestamp": 0}}
+            ]
+            return [decode_log(document, self._staff_name) for document in self._aggregate_logs(pipeline)]
+        logs = []
+        for collection in self.log_partitions.collections():
+            if skip:
+                in_partition = collection.count_documents({}, hint="ts_id")  # Counted from the index
+                if in_partition <= skip:
+                    skip -= in_partition
+                    continue
+            for document in self._log_cursor(collection, None, None, None, logs_per_page - len(logs)).skip(skip):
+                logs.append(decode_log(document, self._staff_name))
+            skip = 0
+            if len(logs) >= logs_per_page:
+                break
+        return logs
+
+    # --- Keyset Pagination ---
+    # Pages are addressed by a (timestamp, _id) anchor taken from the first or last row
+    # on screen, so every page is an index seek no matter how far back it is.
+    @staticmethod
+    def log_anchor(log):
+        """Return the (timestamp, _id) anchor of a log entry."""
+        return (log["timestamp"], log["_id"])
+
+    def _keyset_filter(self, anchor, operator, version=SCHEMA_VERSION):
+        timestamp, log_id = anchor
+        timestamp_field = self._log_field("timestamp", version)
+        return {"$or": [
+            {timestamp_field: {operator: timestamp}},
+            {timestamp_field: timestamp, "_id": {operator: log_id}},
+        ]}
+
+    def get_logs_before(self, anchor, limit, filters=None):
+        """Get logs older than the anchor, newest first. A None anchor returns the newest logs."""
+        return self._find_logs(filters, anchor, "$lt", limit)
+
+    def get_logs_after(self, anchor, limit, filters=None):
+        """Get logs newer than the anchor, newest first."""
+        logs = self._find_logs(filters, anchor, "$gt", limit)
+        logs.reverse()
+        return logs
+
+    def get_logs_from_date(self, date, limit, filters=None):
+        """Get logs at or before the given date, newest first."""
+        filters = dict(filters or {})
+        filters["end"] = min(date, filters["end"]) if filters.get("end") else date
+        return self._find_logs(filters, None, None, limit)
+
+    # --- Log Search ---
+    # Filter keys: plate_number, plate_prefix, owner, house_number, action, type, staff (name),
+    # start and end (timestamps, inclusive). Each one has an index ending in (timestamp, _id),
+    # so a filtered page is still a single index range scan. Plates are matched in the
+    # normalized form they are stored in (see app/car.plate_key).
+    def _log_filter_clauses(self, filters, version):
+        clauses = []
+        if not filters:
+            return clauses
+        compact = version == SCHEMA_VERSION
+        if filters.get("plate_number"):
+            clauses.append({self._log_field("plate_number", version): plate_key(filters["plate_number"])})
+        for field in ("owner", "house_number"):
+            if filters.get(field):
+                clauses.append({self._log_field(field, version): filters[field]})
+        if filters.get("type"):
+            clauses.append({"t": type_code(filters["type"])} if compact else {"type": filters["type"]})
+        if filters.get("plate_prefix"):
+            clauses.append({self._log_field("plate_number", version): {"$regex": "^" + re.escape(plate_key(filters["plate_prefix"]))}})
+        if filters.get("action"):
+            action = filters["action"].lower()
+            if compact:
+                clauses.append({"a": action_code(action)})
+            else:
+                # The guest dialog stored "Check-in" while the main window stored "check-in"
+                clauses.append({"action": {"$in": [action, action.capitalize()]}})
+        if filters.get("staff"):
+            if compact:
+                # Logs of staff no longer on record keep the name instead of the _id
+                clauses.append({"$or": [{"s": {"$in": self._staff_ids(filters["staff"])}}, {"sn": filters["staff"]}]})
+            else:
+                # Staff was stored as the staff document or, from the guest dialog, as the name
+                clauses.append({"$or": [{"staff.name": filters["staff"]}, {"staff": filters["staff"]}]})
+        time_range = {}
+        if filters.get("start"):
+            time_range["$gte"] = filters["start"]
+        if filters.get("end"):
+            time_range["$lte"] = filters["end"]
+        if time_range:
+            clauses.append({self._log_field("timestamp", version): time_range})
+        return clauses
+
+    def _log_query(self, filters, version=SCHEMA_VERSION, *extra_clauses):
+        clauses = self._log_filter_clauses(filters, version) + [clause for clause in extra_clauses if clause]
+        if not self.logs_migrated():
+            # Keep each version's query to its own documents while both are stored
+            clauses.insert(0, {"v": SCHEMA_VERSION} if version == SCHEMA_VERSION else {"v": {"$exists": False}})
+        if not clauses:
+            return {}
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def search_logs(self, filters, limit=50):
+        """Get the newest logs matching the filters."""
+        return self.get_logs_before(None, limit, filters)
@@ -0,0 +1,44 @@
+# app/visit_compactor.py
+
+import threading
+
+from pymongo.errors import PyMongoError
+
+
+class VisitCompactor(threading.Thread):
+    """Periodically pair check-in and check-out logs into visit documents in the background.
+
+    Check-outs write their visit as they happen, including those whose log is journaled by
+    write-behind or replayed from an offline gate's queue. This pairs the history written
+    before visits existed, and check-outs whose visit write failed after their log was
+    stored: logs stamped after the last pass's watermark, each check-out paired with the
+    check-in before it. A log that reaches MongoDB stamped before the watermark is not
+    paired here; its visit came from its check-out.
+
+    Every terminal may run one, but a lease lets only one of them work at a time; the
+    others take over once the holder has missed two passes.
+    """
+
+    def __init__(self, system, interval=3600.0, batch_size=1000):
+        super().__init__(daemon=True, name="visit-compactor")
+        self.system = system
+        self.interval = interval
+        self.batch_size = batch_size
+        self.stopping = threading.Event()
+        self.compacted_total = 0
+        self.last_error = None
+
+    def run(self):
+        while not self.stopping.is_set():
+            try:
+                if self.system.acquire_lease("visit-compactor", self.interval * 2):
+                    self.compacted_total += self.system.compact_visits(self.batch_size) or 0
+                self.last_error = None
+            except PyMongoError as e:
+                self.last_error = str(e)  # Try again on the next pass
+            self.stopping.wait(self.interval)
+
+    def stop(self):
+        self.stopping.set()
+        if self.is_alive():
+            self.join()
@@ -0,0 +1,113 @@
+# app/workers.py
+
+import threading
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class WorkerSignals(QObject):
+    """Signals a Worker uses to hand its outcome back to the GUI thread."""
+    result = pyqtSignal(object)
+    error = pyqtSignal(object)
+    finished = pyqtSignal()
+
+
+class Worker(QRunnable):
+    """Run a single callable on the thread pool."""
+
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        self.setAutoDelete(False)  # The TaskRunner owns the worker until it has finished
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            self.signals.error.emit(e)
+        else:
+            self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+
+class TaskRunner(QObject):
+    """Run System calls off the GUI thread and deliver their results back to it through signals.
+
+    Tasks submitted with the same key supersede each other: a queued task is dropped and a
+    running one has its result discarded, so only the newest request reaches the widgets.
+    """
+    busy_changed = pyqtSignal(bool)  # True while any task is pending, for loading indicators
+    failed = pyqtSignal(str)  # Errors of tasks submitted without their own error handler
+
+    def __init__(self, parent=None, pool=None):
+        super().__init__(parent)
+        self.pool = pool or QThreadPool.globalInstance()
+        self.workers = set()  # Workers that have not finished yet
+        self.latest = {}  # Key -> newest worker submitted under that key
+
+    def submit(self, fn, *args, key=None, on_result=None, on_error=None, **kwargs):
+        """Run fn(*args, **kwargs) in the background and pass its return value to on_result."""
+        if key is not None:
+            self.cancel(key)
+
+        worker = Worker(fn, *args, **kwargs)
+        worker.signals.result.connect(lambda result: self._deliver(worker, key, on_result, result))
+        worker.signals.error.connect(lambda error: self._deliver(worker, key, on_error or self._report, error))
+        worker.signals.finished.connect(lambda: self._finish(worker, key))
+
+        was_idle = not self.workers
+        self.workers.add(worker)
+        if key is not None:
+            self.latest[key] = worker
+        if was_idle:
+            self.busy_changed.emit(True)
+        self.pool.start(worker)
+        return worker
+
+    def cancel(self, key):
+        """Drop the task submitted under key, or ignore its result if it is already running."""
+        worker = self.latest.pop(key, None)
+        if worker is not None and self.pool.tryTake(worker):
+            self._finish(worker, None)
+
+    def is_busy(self):
+        return bool(self.workers)
+
+    def _deliver(self, worker, key, callback, value):
+        if key is not None and self.latest.get(key) is not worker:
+            return  # Superseded by a newer request
+        if callback:
+            callback(value)
+
+    def _finish(self, worker, key):
+        if key is not None and self.latest.get(key) is worker:
+            del self.latest[key]
+        if worker in self.workers:
+            self.workers.discard(worker)
+            if not self.workers:
+                self.busy_changed.emit(False)
+
+    def _report(self, error):
+        self.failed.emit(str(error))
+
+
+class ProgressReporter(QObject):
+    """Carries progress from a long-running task to the GUI thread, and a cancel request back to the task."""
+    progress = pyqtSignal(int, int)  # (done, total)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.cancel_requested = threading.Event()
+
+    def report(self, done, total):
+        self.progress.emit(done, total or 0)
+
+    def cancel(self):
+        self.cancel_requested.set()
+
+    def is_cancelled(self):
+        return self.cancel_requested.is_set()
@@ -1,2 +1,81 @@
+import os
+import socket
+
+# Every setting below can be overridden from the environment as VILLAGE_<NAME>, e.g.
+# VILLAGE_MONGO_URI=mongodb://db.example:27017/ or VILLAGE_OFFLINE_MODE=false.
+
 MONGO_URI = 'mongodb://localhost:27017/'
 DATABASE_NAME = 'village_system'
+# Identifies this terminal's shift in the gate_state collection. Defaults to the host name so
+# every terminal keeps its own; set VILLAGE_GATE_ID when one host runs more than one gate.
+GATE_ID = socket.gethostname()
+
+# MongoDB client: fail fast on a bad link instead of pymongo's 30 second server selection
+MONGO_MAX_POOL_SIZE = 20
+MONGO_MIN_POOL_SIZE = 0
+MONGO_CONNECT_TIMEOUT_MS = 3000
+MONGO_SOCKET_TIMEOUT_MS = 10000
+MONGO_SERVER_SELECTION_TIMEOUT_MS = 3000
+MONGO_WRITE_CONCERN = 'majority'  # "w" value: a number of nodes or 'majority'
+MONGO_READ_CONCERN = 'local'
+MONGO_READ_PREFERENCE = 'primary'
+MONGO_COMPRESSORS = ''  # Comma-separated, e.g. 'zstd,zlib'; zstd and snappy need their Python packages
+MONGO_RETRY_WRITES = True
+MONGO_APP_NAME = 'village-gate'  # Shown in the server's logs and currentOp
+HEALTH_CHECK_INTERVAL = 5.0  # Seconds between connection probes behind the status bar
+
+# Write-behind logging: check-ins are journaled locally and flushed to MongoDB in batches
+WRITE_BEHIND_LOGS = True
+LOG_JOURNAL_PATH = 'data/log_journal.jsonl'
+LOG_FLUSH_BATCH_SIZE = 500
+LOG_FLUSH_INTERVAL = 1.0  # Seconds
+
+# Offline gate mode: a local SQLite replica keeps plate lookups and check-ins working without MongoDB
+OFFLINE_MODE = True
+OFFLINE_STORE_PATH = 'data/offline.sqlite3'
+OFFLINE_CHECK_INTERVAL = 5.0  # Seconds between connection checks
+OFFLINE_TIMEOUT = 2.0  # Seconds a gate call waits for MongoDB before using the local replica
+
+# In-process plate index for member lookups at the gate
+PLATE_INDEX = True
+PLATE_INDEX_MAX_PLATES = 200000
+PLATE_INDEX_POLL_INTERVAL = 1.0  # Seconds between polls when change streams are unavailable
+PLATE_SNAPSHOT_PATH = 'data/plate_snapshot.bin'  # Memory-mapped copy of the index for warm starts; '' to disable
+
+# Visits: check-in/check-out pairs stored as one document per stay
+VISIT_COMPACTOR = True  # Safe on every terminal: a lease in schema_state lets only one process run the passes
+VISIT_COMPACT_INTERVAL = 3600.0  # Seconds between background passes over new logs
+
+# Log retention: monthly log partitions older than this are moved to local archive files
+LOG_HOT_MONTHS = 12  # Months of logs kept in MongoDB, this month included
+LOG_ARCHIVE_DIR = 'data/log_archive'
+
+# Instrumentation: per-call timings of System and the Qt event loop, shown in the Diagnostics window
+INSTRUMENTATION = True
+SLOW_OPERATION_MS = 200  # System calls slower than this go to the slow-operation log
+EVENT_LOOP_STALL_MS = 250  # Qt handlers blocking the event loop longer than this are flagged
+SLOW_OPERATION_LOG_PATH = 'data/slow_operations.log'
+METRICS_PATH = 'data/metrics/village_gate.prom'  # Prometheus textfile for the node exporter's textfile collector
+METRICS_INTERVAL = 15.0  # Seconds between rewrites of the metrics file and appends to the slow-operation log
+
+# Start-up profiling (set through VILLAGE_STARTUP_PROFILE by manage.py profile-startup)
+STARTUP_PROFILE = False  # Report the first paint of the gate window and exit
+STARTUP_BUDGET = 2.0  # Seconds from launch to the gate window's first paint
+
+
+def _apply_environment_overrides(settings, prefix="VILLAGE_"):
+    """Replace settings with VILLAGE_<NAME> environment variables, converted to the type of the default."""
+    for name, default in list(settings.items()):
+        if not name.isupper() or prefix + name not in os.environ:
+            continue
+        value = os.environ[prefix + name]
+        if isinstance(default, bool):
+            value = value.strip().lower() in ("1", "true", "yes", "on")
+        elif isinstance(default, int):
+            value = int(value)
+        elif isinstance(default, float):
+            value = float(value)
+        settings[name] = value
+
+
+_apply_environment_overrides(globals())
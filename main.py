@@ -2,16 +2,55 @@
 
 from PyQt5.QtWidgets import QApplication
 from app.gui import MainMenu
-from app.database import Database
+from app.database import Database, ConnectionHealth
 from app.system import System
+from app.indexes import ensure_indexes
+from config.config import GATE_ID, HEALTH_CHECK_INTERVAL, STARTUP_PROFILE
+from config.config import WRITE_BEHIND_LOGS, LOG_JOURNAL_PATH, LOG_FLUSH_BATCH_SIZE, LOG_FLUSH_INTERVAL
+from config.config import OFFLINE_MODE, OFFLINE_STORE_PATH, OFFLINE_CHECK_INTERVAL, OFFLINE_TIMEOUT
+from config.config import PLATE_INDEX, PLATE_INDEX_MAX_PLATES, PLATE_INDEX_POLL_INTERVAL, PLATE_SNAPSHOT_PATH
+from config.config import VISIT_COMPACTOR, VISIT_COMPACT_INTERVAL
+from config.config import LOG_ARCHIVE_DIR
+from config.config import INSTRUMENTATION, SLOW_OPERATION_MS, EVENT_LOOP_STALL_MS, SLOW_OPERATION_LOG_PATH, METRICS_PATH, METRICS_INTERVAL
+from app.diagnostics_window import StallDetector
 
 if __name__ == "__main__":
-    # Initialize the database
-    db = Database().get_db()
-    system = System(db)
+    # The client connects lazily; the health probe makes first contact once the window is up
+    database = Database()
+    system = System(database.get_db(), GATE_ID)
+
+    def on_connected(db):
+        # Make sure every gate query is index-backed, and that a database upgraded from before
+        # the presence collection knows which cars are inside, as soon as MongoDB answers
+        ensure_indexes(db)
+        system.ensure_presence()
+
+    connection_health = ConnectionHealth(database, HEALTH_CHECK_INTERVAL, on_connected=on_connected)
+    system.enable_log_archive(LOG_ARCHIVE_DIR)
+    if INSTRUMENTATION:
+        system.enable_instrumentation(SLOW_OPERATION_MS / 1000, SLOW_OPERATION_LOG_PATH, METRICS_PATH, METRICS_INTERVAL)
+    if WRITE_BEHIND_LOGS:
+        system.enable_write_behind(LOG_JOURNAL_PATH, LOG_FLUSH_BATCH_SIZE, LOG_FLUSH_INTERVAL)
+    if OFFLINE_MODE:
+        system.enable_offline_mode(OFFLINE_STORE_PATH, OFFLINE_CHECK_INTERVAL, OFFLINE_TIMEOUT)
+    if PLATE_INDEX:
+        system.enable_plate_index(PLATE_INDEX_MAX_PLATES, PLATE_INDEX_POLL_INTERVAL, PLATE_SNAPSHOT_PATH or None)
+    if VISIT_COMPACTOR:
+        system.enable_visit_compactor(VISIT_COMPACT_INTERVAL)
 
     # Start the main application window
     app = QApplication([])
-    main_window = MainMenu(system)
+    if INSTRUMENTATION:
+        stall_detector = StallDetector(system.instrumentation, EVENT_LOOP_STALL_MS / 1000)
+        stall_detector.start()
+    main_window = MainMenu(system, connection_health)
+    if STARTUP_PROFILE:
+        from app.startup_profile import report_first_paint
+        report_first_paint(app, main_window)
     main_window.show()
+    connection_health.start()
     app.exec_()
+    if INSTRUMENTATION:
+        stall_detector.stop()
+    connection_health.stop()
+    system.close()
@@ -0,0 +1,383 @@
+# manage.py
+
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import datetime
+
+from app.database import Database
+from app.system import System
+from app.indexes import ensure_indexes, check_query_plans
+from app.log_journal import LogJournal, LogFlusher
+from app.offline_store import OfflineStore
+from app.log_export import FORMATS, EXPORT_FIELDS, export_logs
+from app.member_import import FORMATS as MEMBER_FORMATS, import_members, export_members
+from app.benchmark import OPERATIONS, seed_dataset, run_benchmarks, compare_reports, write_report
+from app.load_test import synthetic_arrivals, recorded_arrivals, load_test_plates, run_load_test
+from app.startup_profile import profile_startup
+from app.rollups import MIN_SERVER_VERSION as ROLLUP_SERVER_VERSION
+from config.config import GATE_ID, OFFLINE_STORE_PATH, LOG_JOURNAL_PATH, LOG_FLUSH_BATCH_SIZE, LOG_ARCHIVE_DIR, LOG_HOT_MONTHS, STARTUP_BUDGET
+
+
+def ensure_indexes_command(system, args):
+    """Create the indexes System relies on."""
+    for collection_name, names in ensure_indexes(system.db).items():
+        print(f"{collection_name}: {', '.join(names)}")
+    return 0
+
+
+def check_indexes_command(system, args):
+    """Fail if any System query is still answered by a collection scan or a walk of a whole index."""
+    collection_scans, full_index_scans = check_query_plans(system)
+    if collection_scans:
+        print(f"COLLSCAN in: {', '.join(collection_scans)}")
+    if full_index_scans:
+        print(f"Unbounded IXSCAN in: {', '.join(full_index_scans)}")
+    if collection_scans or full_index_scans:
+        return 1
+    print("All System queries are index-bounded.")
+    return 0
+
+
+def rebuild_presence_command(system, args):
+    """Regenerate the presence collection from the logs."""
+    inside = system.rebuild_presence()
+    print(f"{inside} cars are inside.")
+    return 0
+
+
+def normalize_plates_command(system, args):
+    """Rewrite member plates and presence records stored before plates were normalized."""
+    result = system.normalize_stored_plates()
+    print(f"{result['members']} members and {result['presence']} presence records rewritten.")
+    for name, plate_number in result["invalid"]:
+        print(f"Invalid plate {plate_number!r} of member {name}; correct it in the member form.")
+    return 0
+
+
+def offline_conflicts_command(system, args):
+    """Print the offline check-ins and check-outs that reconciliation rejected on this terminal."""
+    store = OfflineStore(args.store)
+    conflicts = store.conflicts()
+    for reason, log_data in conflicts:
+        print(f"{log_data['timestamp']:%Y-%m-%d %H:%M:%S} {log_data['action']} {log_data['plate_number']} "
+              f"({log_data['owner']}, house {log_data['house_number']}, staff {log_data['staff']}): {reason}")
+    if args.clear:
+        store.clear_conflicts()
+    store.close()
+    print(f"{len(conflicts)} conflicts" + (", cleared." if args.clear and conflicts else "."))
+    return 0
+
+
+def flush_log_journal_command(system, args):
+    """Write journaled log entries left behind by a stopped terminal to MongoDB."""
+    flusher = LogFlusher(LogJournal(args.journal), system.log_partitions, LOG_FLUSH_BATCH_SIZE,
+                         rollups_collection=system.rollups_collection)
+    written = flusher.flush()
+    left = flusher.journal.depth()
+    flusher.journal.close()
+    print(f"Flushed {written} journaled log entries, {left} left.")
+    if flusher.last_error:
+        print(flusher.last_error)
+    return 1 if left else 0
+
+
+def migrate_logs_command(system, args):
+    """Rewrite stored logs in the compact version 2 format, then drop the old log indexes."""
+    migrated = system.migrate_logs(args.batch_size, progress=lambda count: print(f"{count} logs rewritten...", end="\r"))
+    ensure_indexes(system.db)
+    print(f"Rewrote {migrated} logs; every log now uses the version 2 format.")
+    return 0
+
+
+def compact_visits_command(system, args):
+    """Pair check-in and check-out logs into visit documents."""
+    prune_logs_before = datetime.strptime(args.prune_logs_before, "%Y-%m-%d") if args.prune_logs_before else None
+    compacted = system.compact_visits(args.batch_size, prune_logs_before)
+    print(f"Wrote {compacted} visits.")
+    return 0
+
+
+def rebuild_rollups_command(system, args):
+    """Recount the traffic rollups from the logs."""
+    server_version = tuple(system.db.client.server_info()["versionArray"][:2])
+    if server_version < ROLLUP_SERVER_VERSION:
+        print(f"rebuild-rollups needs MongoDB {'.'.join(map(str, ROLLUP_SERVER_VERSION))} or later; "
+              f"this server runs {'.'.join(map(str, server_version))}. The rollups are left as they are.")
+        return 1
+    rollups = system.rebuild_rollups()
+    print(f"Rebuilt {rollups} rollup documents.")
+    return 0
+
+
+def export_logs_command(system, args):
+    """Stream the logs matching the filters to a CSV, JSON Lines or Parquet file."""
+    filters = {
+        "plate_number": args.plate,
+        "house_number": args.house,
+        "start": datetime.strptime(args.start, "%Y-%m-%d") if args.start else None,
+        "end": datetime.strptime(args.end, "%Y-%m-%d").replace(hour=23, minute=59, second=59, microsecond=999999) if args.end else None,
+    }
+    filters = {key: value for key, value in filters.items() if value}
+    file_format = args.format or os.path.splitext(args.output)[1].lstrip(".")
+    if file_format not in FORMATS:
+        print(f"Unknown export format {file_format!r}; use --format with one of {', '.join(FORMATS)}.")
+        return 1
+    try:
+        written = export_logs(system, args.output, file_format, filters, args.batch_size,
+                              progress=lambda done, total: print(f"{done}/{total} logs exported..." if total else f"{done} logs exported...", end="\r"))
+    except KeyboardInterrupt:
+        print("\nExport cancelled.")
+        return 1
+    print(f"\nExported {written} logs to {args.output}.")
+    return 0
+
+
+def import_members_command(system, args):
+    """Create or replace members from a CSV or JSON Lines file."""
+    file_format = args.format or os.path.splitext(args.input)[1].lstrip(".")
+    if file_format not in MEMBER_FORMATS:
+        print(f"Unknown member file format {file_format!r}; use --format with one of {', '.join(MEMBER_FORMATS)}.")
+        return 1
+    report = import_members(system, args.input, file_format, args.chunk_size,
+                            progress=lambda read: print(f"{read} members read...", end="\r"))
+    print(f"\n{report.inserted} members added, {report.updated} updated, {len(report.errors)} rows rejected.")
+    if report.errors:
+        errors_path = args.errors or os.path.splitext(args.input)[0] + ".errors.csv"
+        report.write_errors(errors_path)
+        print(f"Rejected rows written to {errors_path}.")
+        return 1
+    return 0
+
+
+def export_members_command(system, args):
+    """Write every member to a CSV or JSON Lines file that import-members reads back."""
+    file_format = args.format or os.path.splitext(args.output)[1].lstrip(".")
+    if file_format not in MEMBER_FORMATS:
+        print(f"Unknown member file format {file_format!r}; use --format with one of {', '.join(MEMBER_FORMATS)}.")
+        return 1
+    written = export_members(system, args.output, file_format)
+    print(f"Exported {written} members to {args.output}.")
+    return 0
+
+
+def partition_logs_command(system, args):
+    """Move the logs from before partitioning into monthly partitions."""
+    moved = system.partition_logs(args.batch_size, progress=lambda count: print(f"{count} logs moved...", end="\r"))
+    print(f"\nMoved {moved} logs into monthly partitions.")
+    return 0
+
+
+def archive_logs_command(system, args):
+    """Move log partitions older than the retention period into compressed archive files."""
+    system.enable_log_archive(args.archive_dir)
+    archived = system.archive_log_partitions(args.keep_months, progress=lambda name, count: print(f"Archived {count} logs from {name}."))
+    print(f"Archived {len(archived)} partitions to {args.archive_dir}.")
+    return 0
+
+
+def search_archive_command(system, args):
+    """Print archived logs matching the filters as CSV."""
+    system.enable_log_archive(args.archive_dir)
+    filters = {
+        "plate_number": args.plate,
+        "house_number": args.house,
+        "start": datetime.strptime(args.start, "%Y-%m-%d") if args.start else None,
+        "end": datetime.strptime(args.end, "%Y-%m-%d").replace(hour=23, minute=59, second=59, microsecond=999999) if args.end else None,
+    }
+    writer = csv.writer(sys.stdout)
+    writer.writerow(EXPORT_FIELDS)
+    for log in system.search_log_archive({key: value for key, value in filters.items() if value}, args.limit):
+        writer.writerow([log[field] for field in EXPORT_FIELDS])
+    return 0
+
+
+def seed_benchmark_command(system, args):
+    """Fill the benchmark database with a synthetic village."""
+    if system.members_collection.estimated_document_count():
+        print(f"{system.db.name} already has members; seed an empty database.")
+        return 1
+    seeded = seed_dataset(system, args.members, args.staff, args.logs, args.days, batch_size=args.batch_size,
+                          seed=args.seed, progress=lambda written: print(f"Wrote {written} logs...", file=sys.stderr))
+    print(f"Seeded {seeded['members']} members, {seeded['staff']} staff and {seeded['logs']} logs into {system.db.name}.")
+    return 0
+
+
+def benchmark_command(system, args):
+    """Time the gate's System calls and print the p50/p95/p99 report as JSON."""
+    if args.in_memory:
+        seed_dataset(system, args.members, args.staff, args.logs, args.days, seed=args.seed)
+    report = run_benchmarks(system, args.iterations, seed=args.seed, operations=args.operations or OPERATIONS)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            report["compared_to"] = {"path": args.compare, "changes": compare_reports(json.load(baseline_file), report)}
+    if args.output:
+        write_report(report, args.output)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+def load_test_command(system, args):
+    """Drive several simulated gates against the database and print throughput, latency and violations as JSON."""
+    if args.replay_start:
+        start = datetime.strptime(args.replay_start, "%Y-%m-%d")
+        end = datetime.strptime(args.replay_end, "%Y-%m-%d").replace(hour=23, minute=59, second=59) if args.replay_end else datetime.now()
+        arrivals = recorded_arrivals(system, start, end, args.gates, args.speedup)
+    else:
+        plates = load_test_plates(system, args.plates, seed=args.seed)
+        arrivals = synthetic_arrivals(plates, args.gates, args.duration, args.rate, double_scan_share=args.double_scans, seed=args.seed)
+
+    def configure(gate_system):
+        if args.plate_index:
+            gate_system.enable_plate_index()
+
+    report = run_load_test(system.db, arrivals, args.gates, configure)
+    if args.output:
+        write_report(report, args.output)
+    print(json.dumps(report, indent=2))
+    return 1 if report["violations"] else 0
+
+
+def profile_startup_command(system, args):
+    """Time the gate's start-up to first paint and fail if it is over budget."""
+    report = profile_startup(args.timeout, args.top)
+    print(json.dumps(report, indent=2))
+    if report["first_paint_s"] is None:
+        print("The gate window never painted.", file=sys.stderr)
+        return 1
+    if report["first_paint_s"] > args.budget:
+        print(f"Start-up took {report['first_paint_s']} s, over the {args.budget} s budget.", file=sys.stderr)
+        return 1
+    return 0
+
+
+def benchmark_database(args):
+    """The database a benchmark command runs against: a scratch one, never the gate's own."""
+    if getattr(args, "in_memory", False):
+        try:
+            import mongomock
+        except ImportError:
+            raise SystemExit("--in-memory needs the mongomock package.")
+        return mongomock.MongoClient()[args.database]
+    return Database(db_name=args.database).get_db()
+
+
+COMMANDS = {
+    "ensure-indexes": ensure_indexes_command,
+    "check-indexes": check_indexes_command,
+    "rebuild-presence": rebuild_presence_command,
+    "offline-conflicts": offline_conflicts_command,
+    "normalize-plates": normalize_plates_command,
+    "flush-log-journal": flush_log_journal_command,
+    "migrate-logs": migrate_logs_command,
+    "compact-visits": compact_visits_command,
+    "rebuild-rollups": rebuild_rollups_command,
+    "export-logs": export_logs_command,
+    "import-members": import_members_command,
+    "export-members": export_members_command,
+    "partition-logs": partition_logs_command,
+    "archive-logs": archive_logs_command,
+    "search-archive": search_archive_command,
+    "seed-benchmark": seed_benchmark_command,
+    "benchmark": benchmark_command,
+    "load-test": load_test_command,
+    "profile-startup": profile_startup_command,
+}
+
+# Commands that run against a benchmark database rather than the gate's
+BENCHMARK_COMMANDS = ("seed-benchmark", "benchmark", "load-test")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Village gate maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("ensure-indexes", help="Create the indexes System relies on")
+    subparsers.add_parser("check-indexes", help="Explain every System query and fail on COLLSCAN or an unbounded IXSCAN")
+    subparsers.add_parser("rebuild-presence", help="Regenerate the presence collection from the logs")
+    subparsers.add_parser("normalize-plates", help="Upper-case the plates of members and cars inside, as they are now looked up")
+    conflicts_parser = subparsers.add_parser("offline-conflicts", help="List offline check-ins and check-outs rejected on reconnect")
+    conflicts_parser.add_argument("--store", default=OFFLINE_STORE_PATH, help="Path of this terminal's offline store")
+    conflicts_parser.add_argument("--clear", action="store_true", help="Forget the listed conflicts")
+    flush_parser = subparsers.add_parser("flush-log-journal", help="Write journaled log entries to MongoDB")
+    flush_parser.add_argument("--journal", default=LOG_JOURNAL_PATH, help="Path of the write-behind journal")
+    migrate_parser = subparsers.add_parser("migrate-logs", help="Rewrite stored logs in the compact format (resumable)")
+    migrate_parser.add_argument("--batch-size", type=int, default=1000, help="Logs rewritten per bulk write")
+    compact_parser = subparsers.add_parser("compact-visits", help="Pair check-in and check-out logs into visits")
+    compact_parser.add_argument("--batch-size", type=int, default=1000, help="Visits written per bulk write")
+    compact_parser.add_argument("--prune-logs-before", metavar="YYYY-MM-DD",
+                                help="Delete the logs of visits that ended before this date once the visits are stored")
+    subparsers.add_parser("rebuild-rollups", help="Recount the traffic rollups and log totals from the logs (MongoDB 5.0 or later)")
+    export_parser = subparsers.add_parser("export-logs", help="Stream logs to a CSV, JSON Lines or Parquet file")
+    export_parser.add_argument("output", help="File to write; the format follows the extension unless --format is given")
+    export_parser.add_argument("--format", choices=FORMATS)
+    export_parser.add_argument("--plate", help="Only logs of this plate number")
+    export_parser.add_argument("--house", help="Only logs of this house number")
+    export_parser.add_argument("--start", metavar="YYYY-MM-DD", help="Only logs from this date on")
+    export_parser.add_argument("--end", metavar="YYYY-MM-DD", help="Only logs up to this date")
+    export_parser.add_argument("--batch-size", type=int, default=5000, help="Logs fetched and written per batch")
+    import_parser = subparsers.add_parser("import-members", help="Create or replace members from a CSV or JSON Lines file")
+    import_parser.add_argument("input", help="File to read; the format follows the extension unless --format is given")
+    import_parser.add_argument("--format", choices=MEMBER_FORMATS)
+    import_parser.add_argument("--chunk-size", type=int, default=500, help="Members checked and written per bulk write")
+    import_parser.add_argument("--errors", help="Where to write rejected rows (default: <input>.errors.csv)")
+    export_members_parser = subparsers.add_parser("export-members", help="Write every member to a CSV or JSON Lines file")
+    export_members_parser.add_argument("output", help="File to write; the format follows the extension unless --format is given")
+    export_members_parser.add_argument("--format", choices=MEMBER_FORMATS)
+    partition_parser = subparsers.add_parser("partition-logs", help="Move unpartitioned logs into monthly partitions (resumable)")
+    partition_parser.add_argument("--batch-size", type=int, default=1000, help="Logs moved per batch")
+    archive_parser = subparsers.add_parser("archive-logs", help="Archive log partitions older than the retention period")
+    archive_parser.add_argument("--keep-months", type=int, default=LOG_HOT_MONTHS, help="Months of logs kept in MongoDB, this month included")
+    archive_parser.add_argument("--archive-dir", default=LOG_ARCHIVE_DIR, help="Directory of the archive files")
+    search_archive_parser = subparsers.add_parser("search-archive", help="Print archived logs matching the filters as CSV")
+    search_archive_parser.add_argument("--archive-dir", default=LOG_ARCHIVE_DIR, help="Directory of the archive files")
+    search_archive_parser.add_argument("--plate", help="Only logs of this plate number")
+    search_archive_parser.add_argument("--house", help="Only logs of this house number")
+    search_archive_parser.add_argument("--start", metavar="YYYY-MM-DD", help="Only logs from this date on")
+    search_archive_parser.add_argument("--end", metavar="YYYY-MM-DD", help="Only logs up to this date")
+    search_archive_parser.add_argument("--limit", type=int, help="Stop after this many logs")
+    seed_parser = subparsers.add_parser("seed-benchmark", help="Fill an empty database with synthetic members, staff and logs")
+    benchmark_parser = subparsers.add_parser("benchmark", help="Time the gate's System calls and report p50/p95/p99 as JSON")
+    for benchmark_subparser in (seed_parser, benchmark_parser):
+        benchmark_subparser.add_argument("--database", default="village_system_bench", help="Database to seed or time")
+        benchmark_subparser.add_argument("--members", type=int, default=20000)
+        benchmark_subparser.add_argument("--staff", type=int, default=50)
+        benchmark_subparser.add_argument("--logs", type=int, default=10000000)
+        benchmark_subparser.add_argument("--days", type=int, default=365, help="Days of history the logs are spread over")
+        benchmark_subparser.add_argument("--seed", type=int, default=0, help="Random seed, so runs see the same data and plates")
+    seed_parser.add_argument("--batch-size", type=int, default=10000, help="Documents inserted per batch")
+    benchmark_parser.add_argument("--in-memory", action="store_true",
+                                  help="Seed and time an in-process mongomock database instead of mongod (use a smaller --logs)")
+    benchmark_parser.add_argument("--iterations", type=int, default=200, help="Calls timed per operation")
+    benchmark_parser.add_argument("--operations", nargs="+", choices=OPERATIONS, help="Only time these operations")
+    benchmark_parser.add_argument("--output", help="Also write the report to this JSON file")
+    benchmark_parser.add_argument("--compare", metavar="REPORT", help="Earlier report to compare p50/p95/p99 against")
+    load_parser = subparsers.add_parser("load-test", help="Simulate several gates at once and report throughput, latency and violations")
+    load_parser.add_argument("--database", default="village_system_bench", help="Database to load; seed it first with seed-benchmark")
+    load_parser.add_argument("--gates", type=int, default=4, help="Simulated gate terminals")
+    load_parser.add_argument("--duration", type=float, default=60.0, help="Seconds a synthetic day of traffic is compressed into")
+    load_parser.add_argument("--rate", type=float, default=20.0, help="Average synthetic arrivals per second, across all gates")
+    load_parser.add_argument("--plates", type=int, default=2000, help="Distinct plates in the synthetic traffic")
+    load_parser.add_argument("--double-scans", type=float, default=0.05, help="Share of arrivals also scanned at a second gate")
+    load_parser.add_argument("--seed", type=int, default=0)
+    load_parser.add_argument("--replay-start", metavar="YYYY-MM-DD", help="Replay the stored logs from this date instead of synthetic traffic")
+    load_parser.add_argument("--replay-end", metavar="YYYY-MM-DD", help="Last day of logs replayed (default: today)")
+    load_parser.add_argument("--speedup", type=float, default=60.0, help="How many times faster than recorded the logs are replayed")
+    load_parser.add_argument("--plate-index", action="store_true", help="Give each simulated gate the in-process plate index")
+    load_parser.add_argument("--output", help="Also write the report to this JSON file")
+    profile_parser = subparsers.add_parser("profile-startup", help="Time main.py to first paint with -X importtime; fail over budget")
+    profile_parser.add_argument("--budget", type=float, default=STARTUP_BUDGET, help="Seconds allowed from launch to first paint")
+    profile_parser.add_argument("--timeout", type=float, default=60.0, help="Give up on the child process after this many seconds")
+    profile_parser.add_argument("--top", type=int, default=15, help="Slowest top-level imports listed")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    system = System(benchmark_database(args) if args.command in BENCHMARK_COMMANDS else Database().get_db(), GATE_ID)
+    return COMMANDS[args.command](system, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
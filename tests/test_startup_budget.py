@@ -0,0 +1,40 @@
+# tests/test_startup_budget.py
+
+import pytest
+
+from app.startup_profile import profile_startup
+from config.config import STARTUP_BUDGET
+
+pytest.importorskip("PyQt5")
+
+
+@pytest.fixture
+def isolated_gate(monkeypatch, tmp_path):
+    """Start the gate headless, with its files in tmp_path, its background services off and no MongoDB to reach."""
+    settings = {
+        "QT_QPA_PLATFORM": "offscreen",
+        "VILLAGE_MONGO_URI": "mongodb://127.0.0.1:1/",  # Nothing listens there, so no database is touched
+        "VILLAGE_DATABASE_NAME": "village_startup_test",
+        "VILLAGE_MONGO_CONNECT_TIMEOUT_MS": "200",
+        "VILLAGE_MONGO_SERVER_SELECTION_TIMEOUT_MS": "200",
+        "VILLAGE_WRITE_BEHIND_LOGS": "false",
+        "VILLAGE_OFFLINE_MODE": "false",
+        "VILLAGE_PLATE_INDEX": "false",
+        "VILLAGE_VISIT_COMPACTOR": "false",
+        "VILLAGE_LOG_JOURNAL_PATH": str(tmp_path / "log_journal.jsonl"),
+        "VILLAGE_OFFLINE_STORE_PATH": str(tmp_path / "offline.sqlite3"),
+        "VILLAGE_PLATE_SNAPSHOT_PATH": "",
+        "VILLAGE_LOG_ARCHIVE_DIR": str(tmp_path / "log_archive"),
+        "VILLAGE_SLOW_OPERATION_LOG_PATH": str(tmp_path / "slow_operations.log"),
+        "VILLAGE_METRICS_PATH": str(tmp_path / "metrics" / "village_gate.prom"),
+    }
+    for name, value in settings.items():
+        monkeypatch.setenv(name, value)
+
+
+def test_first_paint_within_budget(isolated_gate):
+    report = profile_startup()
+    assert report["first_paint_s"] is not None, "The gate window never painted: " + "\n".join(report["errors"])
+    assert report["first_paint_s"] <= STARTUP_BUDGET, (
+        f"Start-up took {report['first_paint_s']} s, over the {STARTUP_BUDGET} s budget; "
+        f"slowest imports: {report['slowest_imports'][:5]}")